@@ -3,13 +3,117 @@ programmer: Richie Delgado
 -------------------------------------------------------
 Shared discovery logic used by Windows and Linux adapters.
 SSDP (UDP M-SEARCH) discovery is OS-agnostic.
+Neighbor (ARP) table output from Windows `arp -a`, macOS `arp -a` and Linux
+`ip neigh` is parsed here too, with one precompiled pattern per format.
 """
+import ipaddress
+import re
 import socket
+import struct
 import time
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple, NamedTuple
 from urllib.parse import urlparse
 
 from base import Device
+from rate_governor import RateGovernor, get_governor
+
+# Hosts per ARP batch for each unit of the governor window (window 2 -> 32 hosts per srp call)
+ARP_BATCH_HOSTS = 16
+
+_IPV4 = r"\d{1,3}(?:\.\d{1,3}){3}"
+
+# Windows `arp -a`: "Interface: 192.168.1.5 --- 0x7" headers, then
+# "  192.168.1.1           aa-bb-cc-dd-ee-ff     dynamic" rows
+WINDOWS_NEIGHBOR_PATTERN = re.compile(
+    rf"^Interface:\s*({_IPV4})"
+    rf"|^[ \t]*({_IPV4})[ \t]+([0-9a-f]{{2}}(?:[-:][0-9a-f]{{2}}){{5}})[ \t]+(\w+)",
+    re.IGNORECASE | re.MULTILINE,
+)
+# macOS `arp -a`: "? (192.168.1.1) at 0:11:22:33:44:55 on en0 ifscope [ethernet]";
+# octets may be a single digit, "(incomplete)" rows do not match
+MAC_NEIGHBOR_PATTERN = re.compile(
+    rf"\(({_IPV4})\) at ([0-9a-f]{{1,2}}(?::[0-9a-f]{{1,2}}){{5}}) on (\S+)(?: ifscope)?( permanent)?",
+    re.IGNORECASE,
+)
+# Linux `ip neigh`: "192.168.1.1 dev eth0 lladdr aa:bb:cc:dd:ee:ff router REACHABLE";
+# FAILED / INCOMPLETE rows have no lladdr and IPv6 rows no dotted quad, so neither matches
+LINUX_NEIGHBOR_PATTERN = re.compile(
+    rf"^({_IPV4}) dev (\S+) lladdr ([0-9a-f]{{2}}(?::[0-9a-f]{{2}}){{5}})(?: router)?(?: proxy)? ([A-Z]+)[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+_ip_to_int = struct.Struct("!I").unpack
+
+
+class NeighborEntry(NamedTuple):
+    """One row of a neighbor table; mac is lower-case with colons and two digits per octet."""
+    ip: str
+    mac: str
+    iface: Optional[str] = None
+    state: Optional[str] = None
+
+
+def neighbor_table_format(text: str) -> str:
+    """Guess which tool produced the output: "windows", "mac" or "linux"."""
+    if "Interface:" in text or "Internet Address" in text:
+        return "windows"
+    if " lladdr " in text or " dev " in text:
+        return "linux"
+    return "mac"
+
+
+def _windows_rows(text: str):
+    iface = None
+    for m in WINDOWS_NEIGHBOR_PATTERN.finditer(text):
+        header, ip, mac, state = m.groups()
+        if header:
+            iface = header
+            continue
+        yield ip, mac.replace("-", ":").lower(), iface, state.lower()
+
+
+def _mac_rows(text: str):
+    for ip, mac, iface, permanent in MAC_NEIGHBOR_PATTERN.findall(text):
+        if len(mac) != 17:
+            mac = ":".join(octet.zfill(2) for octet in mac.split(":"))
+        yield ip, mac.lower(), iface, "permanent" if permanent else "dynamic"
+
+
+def _linux_rows(text: str):
+    for ip, iface, mac, state in LINUX_NEIGHBOR_PATTERN.findall(text):
+        yield ip, mac.lower(), iface, state.lower()
+
+
+_NEIGHBOR_ROWS = {"windows": _windows_rows, "mac": _mac_rows, "linux": _linux_rows}
+
+
+def parse_neighbor_table(
+    text: str,
+    network: Optional[str] = None,
+    fmt: Optional[str] = None,
+) -> List[NeighborEntry]:
+    """
+    Parse neighbor table output in one pass over the text.
+    Broadcast, multicast and all-zero MACs are dropped, as are rows outside
+    network (a CIDR) when one is given; the first row for an IP wins.
+    """
+    rows = _NEIGHBOR_ROWS[fmt or neighbor_table_format(text)]
+    if network:
+        net = ipaddress.ip_network(network, strict=False)
+        base, mask = int(net.network_address), int(net.netmask)
+    table: Dict[str, NeighborEntry] = {}
+    for ip, mac, iface, state in rows(text):
+        # the group bit of the first octet marks broadcast and multicast addresses
+        if int(mac[:2], 16) & 1 or mac == "00:00:00:00:00:00" or ip in table:
+            continue
+        if network:
+            try:
+                if _ip_to_int(socket.inet_aton(ip))[0] & mask != base:
+                    continue
+            except OSError:
+                continue
+        table[ip] = NeighborEntry(ip, mac, iface, state)
+    return list(table.values())
 
 
 def ipv4_strings_from_zeroconf_addresses(addresses: Any) -> List[str]:
@@ -233,3 +337,59 @@ def discover_ssdp(
         raise
 
     return devices
+
+
+def arp_sweep(
+    network: str,
+    timeout: float = 2,
+    governor: Optional[RateGovernor] = None,
+    verbose: bool = True,
+) -> List[Tuple[str, str]]:
+    """
+    Active ARP sweep of a CIDR in governor-sized batches instead of one burst.
+    Each reply's RTT is recorded per device (seeding later nmap/credential timing),
+    and previously seen hosts that stop answering count as loss for the segment,
+    which shrinks the batch size and widens the gap between batches.
+    Returns [(ip, mac)]. Raises PermissionError like srp when raw sockets are denied.
+    """
+    from scapy.all import ARP, Ether, srp
+
+    governor = governor or get_governor()
+    net_key = f"arp:{network}"
+    hosts = [str(h) for h in ipaddress.ip_network(network, strict=False).hosts()]
+    known = set(governor.known_targets())
+    found: Dict[str, str] = {}
+
+    pos = 0
+    while pos < len(hosts):
+        batch = hosts[pos:pos + governor.window_for(net_key) * ARP_BATCH_HOSTS]
+        pos += len(batch)
+        with governor.slot(net_key):
+            answered, _unanswered = srp(
+                Ether(dst="ff:ff:ff:ff:ff:ff") / ARP(pdst=batch),
+                timeout=min(timeout, governor.timeout_for(net_key)),
+                verbose=False,
+                retry=governor.retries_for(net_key),
+            )
+
+        for sent, received in answered:
+            ip = received.psrc
+            found[ip] = received.hwsrc
+            rtt = received.time - sent.sent_time if getattr(sent, "sent_time", None) else None
+            governor.record(ip, rtt, ok=True)
+            governor.record(net_key, rtt, ok=True)
+
+        missed = [ip for ip in batch if ip in known and ip not in found]
+        for ip in missed:
+            governor.record(ip, ok=False)
+            governor.record(net_key, ok=False)
+        if not answered and not missed:
+            governor.record(net_key, ok=True)
+
+    if verbose:
+        state = governor.snapshot(net_key)
+        print(
+            f"  ARP sweep: {len(found)} of {len(hosts)} hosts answered "
+            f"(batch window {int(state['window'])}, timeout {state['timeout']:.2f}s)"
+        )
+    return list(found.items())
@@ -12,7 +12,7 @@ import socket
 from typing import List, Dict, Optional
 
 try:
-    from scapy.all import ARP, Ether, srp, conf
+    from scapy.all import conf
     SCAPY_AVAILABLE = True
 except ImportError:
     SCAPY_AVAILABLE = False
@@ -30,7 +30,8 @@ except ImportError:
 
 from base import DeviceDiscoveryAdapter, Device
 from discovery_store import DiscoveryStore
-from discovery_common import discover_ssdp, ipv4_strings_from_zeroconf_addresses
+from discovery_common import discover_ssdp, ipv4_strings_from_zeroconf_addresses, arp_sweep
+from rate_governor import get_governor, GOVERNOR_STATE_FILE, GOVERNOR_STATE_PATH
 
 
 class LinuxAdapter(DeviceDiscoveryAdapter):
@@ -110,20 +111,10 @@ class LinuxAdapter(DeviceDiscoveryAdapter):
                     except Exception:
                         pass
                 print(f"  Attempting active ARP scan (may require root/cap_net_raw)...")
-                arp_request = ARP(pdst=network)
-                broadcast = Ether(dst="ff:ff:ff:ff:ff:ff")
-                arp_request_broadcast = broadcast / arp_request
-                answered_list, _unanswered = srp(
-                    arp_request_broadcast,
-                    timeout=timeout,
-                    verbose=False,
-                    retry=2,
-                )
+                answered_list = arp_sweep(network, timeout=timeout)
                 print(f"  Active scan: {len(answered_list)} devices responded")
 
-                for element in answered_list:
-                    ip = element[1].psrc
-                    mac = element[1].hwsrc
+                for ip, mac in answered_list:
                     vendor = self._get_vendor_from_mac(mac)
                     hostname = self._get_hostname(ip)
                     device = Device(
@@ -216,6 +207,8 @@ class LinuxAdapter(DeviceDiscoveryAdapter):
         all_devices: Dict[str, Device] = {}
 
         print("\n=== Starting Device Discovery (Linux) ===\n")
+        # Hosts answered in earlier runs: ones that stop answering count as loss in the ARP sweep
+        get_governor().load(GOVERNOR_STATE_PATH)
         interfaces = self.get_local_network_interfaces()
 
         if not interfaces:
@@ -286,6 +279,12 @@ class LinuxAdapter(DeviceDiscoveryAdapter):
         except Exception as e:
             print(f"WARNING: could not save discovery.json: {e}")
 
+        # Persist per-device RTT/loss so the vulnerability scan starts from measured timing
+        try:
+            get_governor().save(GOVERNOR_STATE_PATH)
+        except Exception as e:
+            print(f"WARNING: could not save {GOVERNOR_STATE_FILE}: {e}")
+
         return list(all_devices.values())
 
     def get_device_info(self, ip_address: str) -> Optional[Device]:
@@ -14,7 +14,7 @@ import time
 from typing import List, Dict, Optional
 
 try:
-    from scapy.all import ARP, Ether, srp, conf
+    from scapy.all import conf
     SCAPY_AVAILABLE = True
 except ImportError:
     SCAPY_AVAILABLE = False
@@ -32,7 +32,8 @@ except ImportError:
 
 from base import DeviceDiscoveryAdapter, Device
 from discovery_store import DiscoveryStore
-from discovery_common import discover_ssdp, ipv4_strings_from_zeroconf_addresses
+from discovery_common import discover_ssdp, ipv4_strings_from_zeroconf_addresses, arp_sweep, parse_neighbor_table
+from rate_governor import get_governor, GOVERNOR_STATE_FILE, GOVERNOR_STATE_PATH
 
 
 class MacAdapter(DeviceDiscoveryAdapter):
@@ -124,23 +125,10 @@ class MacAdapter(DeviceDiscoveryAdapter):
                     except Exception:
                         pass
                 print(f"  Attempting active ARP scan (may require elevated permissions)...")
-                arp_request = ARP(pdst=network)
-                broadcast = Ether(dst="ff:ff:ff:ff:ff:ff")
-                arp_request_broadcast = broadcast / arp_request
-                answered_list, unanswered_list = srp(
-                    arp_request_broadcast,
-                    timeout=timeout,
-                    verbose=False,
-                    retry=2,
-                )
-                print(
-                    f"  Active scan: {len(answered_list)} devices responded, "
-                    f"{len(unanswered_list)} did not respond"
-                )
+                answered_list = arp_sweep(network, timeout=timeout)
+                print(f"  Active scan: {len(answered_list)} devices responded")
 
-                for element in answered_list:
-                    ip = element[1].psrc
-                    mac = element[1].hwsrc
+                for ip, mac in answered_list:
                     vendor = self._get_vendor_from_mac(mac)
                     hostname = self._get_hostname(ip)
                     device = Device(
@@ -174,11 +162,6 @@ class MacAdapter(DeviceDiscoveryAdapter):
 
         return self._scan_network_arp_table(network, iface_name=iface_name)
 
-    def _normalize_mac_colons(self, mac: str) -> str:
-        """Normalize macOS arp single-digit octets (e.g. 0:11:22:...) to aa:bb:cc:..."""
-        parts = mac.split(":")
-        return ":".join(p.zfill(2) for p in parts)
-
     def _scan_network_arp_table(self, network: str, iface_name: Optional[str] = None) -> List[Device]:
         """Parse macOS `arp -a` output for IPs in the target CIDR."""
         devices: List[Device] = []
@@ -198,52 +181,20 @@ class MacAdapter(DeviceDiscoveryAdapter):
                     print(f"  Error output: {result.stderr}")
                 return devices
 
-            arp_lines = result.stdout.split("\n")
-            print(f"  ARP table contains {len(arp_lines)} lines")
-
-            network_obj = IPNetwork(network)
-            print(f"  Looking for devices in network: {network_obj} (input: {network})")
-
-            for line in result.stdout.split("\n"):
-                line = line.strip()
-                if not line or "incomplete" in line.lower():
-                    continue
-
-                match = re.search(
-                    r"\((\d+\.\d+\.\d+\.\d+)\)\s+at\s+([0-9a-f:]+)\s+on\s+(\S+)",
-                    line,
-                    re.IGNORECASE,
-                )
-                if not match:
-                    continue
-
-                ip = match.group(1)
-                mac_raw = match.group(2)
-                mac = self._normalize_mac_colons(mac_raw)
-
-                if mac == "00:00:00:00:00:00" or mac.startswith("ff:ff:ff") or mac.startswith("01:00:5e"):
-                    continue
-
-                try:
-                    if IPAddress(ip) not in network_obj:
-                        continue
-                except Exception:
-                    continue
-
-                print(f"    Found device (ARP table): {ip} ({mac})")
-                vendor = self._get_vendor_from_mac(mac)
-                hostname = self._get_hostname(ip)
+            for entry in parse_neighbor_table(result.stdout, network=network, fmt="mac"):
+                vendor = self._get_vendor_from_mac(entry.mac)
+                hostname = self._get_hostname(entry.ip)
                 device = Device(
-                    ip_address=ip,
-                    mac_address=mac,
+                    ip_address=entry.ip,
+                    mac_address=entry.mac,
                     hostname=hostname,
                     vendor=vendor,
                 )
                 devices.append(device)
                 self.store.upsert_device(
-                    ip=ip,
+                    ip=entry.ip,
                     hostname=hostname,
-                    mac=mac,
+                    mac=entry.mac,
                     vendor=vendor,
                     iface=iface_name,
                     discovered_via=["ARP"],
@@ -263,6 +214,8 @@ class MacAdapter(DeviceDiscoveryAdapter):
         all_devices: Dict[str, Device] = {}
 
         print("\n=== Starting Device Discovery ===\n")
+        # Hosts answered in earlier runs: ones that stop answering count as loss in the ARP sweep
+        get_governor().load(GOVERNOR_STATE_PATH)
 
         interfaces = self.get_local_network_interfaces()
 
@@ -335,6 +288,12 @@ class MacAdapter(DeviceDiscoveryAdapter):
         except Exception as e:
             print(f"WARNING: could not save discovery.json: {e}")
 
+        # Persist per-device RTT/loss so the vulnerability scan starts from measured timing
+        try:
+            get_governor().save(GOVERNOR_STATE_PATH)
+        except Exception as e:
+            print(f"WARNING: could not save {GOVERNOR_STATE_FILE}: {e}")
+
         return list(all_devices.values())
 
     def get_device_info(self, ip_address: str) -> Optional[Device]:
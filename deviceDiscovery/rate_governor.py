@@ -0,0 +1,270 @@
+"""
+-------------------------------------------------------
+Per-target adaptive probe rate governor shared by the ARP sweeper, the nmap
+wrapper and the weak-credential checker.
+
+Each target (an IP, or a network CIDR for sweeps) gets an RFC 6298 style RTT
+estimate, a loss estimate, and an AIMD-controlled window (concurrent probes)
+and pacing interval (minimum gap between probe starts). Healthy targets ramp
+up additively; timeouts and drops halve the window and double the gap.
+State can be saved to JSON so RTTs measured during discovery seed the
+vulnerability scan that runs in a separate process.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+
+
+INITIAL_WINDOW = 2.0
+MIN_WINDOW = 1.0
+MAX_WINDOW = 32.0
+ADDITIVE_STEP = 1.0      # window growth per window's worth of successes (~one RTT)
+BACKOFF_FACTOR = 0.5     # multiplicative decrease on loss
+MIN_INTERVAL = 0.0       # seconds between probe starts on a healthy target
+BASE_INTERVAL = 0.05     # first interval applied once a target shows loss
+MAX_INTERVAL = 2.0
+INITIAL_TIMEOUT = 3.0    # used until a target has an RTT sample
+MIN_TIMEOUT = 0.3
+MAX_TIMEOUT = 10.0
+LOSS_ALPHA = 0.2         # EWMA weight for the loss estimate
+FRAGILE_LOSS = 0.2       # above this loss rate a target is treated as fragile
+
+GOVERNOR_STATE_FILE = "rate_governor.json"  # written next to discovery.json
+# one absolute path, so discovery (run from any cwd) and the vulnerability scan share the state
+GOVERNOR_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), GOVERNOR_STATE_FILE)
+
+
+@dataclass
+class TargetState:
+    """Congestion-control state for one probe target."""
+    srtt: Optional[float] = None
+    rttvar: float = 0.0
+    loss: float = 0.0
+    window: float = INITIAL_WINDOW
+    interval: float = MIN_INTERVAL
+    in_flight: int = 0
+    last_start: float = 0.0
+    successes: int = 0
+    failures: int = 0
+
+
+class RateGovernor:
+    """Thread-safe AIMD governor keyed on probe target."""
+
+    def __init__(
+        self,
+        initial_window: float = INITIAL_WINDOW,
+        min_window: float = MIN_WINDOW,
+        max_window: float = MAX_WINDOW,
+        min_timeout: float = MIN_TIMEOUT,
+        max_timeout: float = MAX_TIMEOUT,
+        max_interval: float = MAX_INTERVAL,
+    ):
+        self.initial_window = initial_window
+        self.min_window = min_window
+        self.max_window = max_window
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.max_interval = max_interval
+        self._targets: Dict[str, TargetState] = {}
+        self._cond = threading.Condition()
+
+    # --------- state ----------
+    def _state(self, key: str) -> TargetState:
+        state = self._targets.get(key)
+        if state is None:
+            state = TargetState(window=self.initial_window)
+            self._targets[key] = state
+        return state
+
+    def known_targets(self):
+        with self._cond:
+            return [k for k, s in self._targets.items() if s.srtt is not None]
+
+    def snapshot(self, key: str) -> Dict:
+        with self._cond:
+            data = asdict(self._state(key))
+        data["timeout"] = self.timeout_for(key)
+        return data
+
+    # --------- derived limits ----------
+    def timeout_for(self, key: str) -> float:
+        """Retransmission timeout: srtt + 4 * rttvar, clamped."""
+        with self._cond:
+            state = self._state(key)
+            if state.srtt is None:
+                return INITIAL_TIMEOUT
+            rto = state.srtt + 4 * state.rttvar
+            return min(self.max_timeout, max(self.min_timeout, rto))
+
+    def window_for(self, key: str) -> int:
+        with self._cond:
+            return int(self._state(key).window)
+
+    def interval_for(self, key: str) -> float:
+        with self._cond:
+            return self._state(key).interval
+
+    def retries_for(self, key: str) -> int:
+        """Lossy targets get one extra retransmission instead of a flood of them."""
+        with self._cond:
+            return 2 if self._state(key).loss > FRAGILE_LOSS else 1
+
+    def is_fragile(self, key: str) -> bool:
+        with self._cond:
+            return self._state(key).loss > FRAGILE_LOSS
+
+    # --------- feedback ----------
+    def record(self, key: str, rtt: Optional[float] = None, ok: bool = True) -> None:
+        """Feed one probe outcome back: successes grow the window, losses cut it."""
+        with self._cond:
+            state = self._state(key)
+            if ok:
+                state.successes += 1
+                if rtt is not None and rtt >= 0:
+                    if state.srtt is None:
+                        state.srtt = rtt
+                        state.rttvar = rtt / 2
+                    else:
+                        state.rttvar = 0.75 * state.rttvar + 0.25 * abs(state.srtt - rtt)
+                        state.srtt = 0.875 * state.srtt + 0.125 * rtt
+                state.loss *= (1 - LOSS_ALPHA)
+                state.window = min(self.max_window, state.window + ADDITIVE_STEP / max(state.window, 1.0))
+                state.interval = state.interval * 0.9 if state.interval > BASE_INTERVAL / 4 else MIN_INTERVAL
+            else:
+                state.failures += 1
+                if state.srtt is not None:
+                    # back the timeout off too, so a slow device is not mistaken for a dead one
+                    state.rttvar = max(state.rttvar * 2, state.srtt / 2)
+                state.loss = state.loss * (1 - LOSS_ALPHA) + LOSS_ALPHA
+                state.window = max(self.min_window, state.window * BACKOFF_FACTOR)
+                state.interval = min(self.max_interval, max(BASE_INTERVAL, state.interval * 2))
+            self._cond.notify_all()
+
+    # --------- admission ----------
+    def _try_start(self, key: str) -> float:
+        """Start a probe if the window and pacing allow it; else return seconds to wait."""
+        state = self._state(key)
+        if state.in_flight >= int(state.window):
+            return -1.0
+        now = time.monotonic()
+        wait = state.last_start + state.interval - now
+        if wait > 0:
+            return wait
+        state.in_flight += 1
+        state.last_start = now
+        return 0.0
+
+    def _release(self, key: str) -> None:
+        with self._cond:
+            state = self._state(key)
+            state.in_flight = max(0, state.in_flight - 1)
+            self._cond.notify_all()
+
+    def acquire(self, key: str) -> None:
+        with self._cond:
+            while True:
+                wait = self._try_start(key)
+                if wait == 0.0:
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    @contextmanager
+    def slot(self, key: str):
+        """Hold one of the target's probe slots for the duration of the block."""
+        self.acquire(key)
+        try:
+            yield
+        finally:
+            self._release(key)
+
+    @asynccontextmanager
+    async def async_slot(self, key: str):
+        """asyncio flavour of slot(); polls instead of blocking the event loop."""
+        while True:
+            with self._cond:
+                wait = self._try_start(key)
+            if wait == 0.0:
+                break
+            await asyncio.sleep(wait if wait > 0 else max(0.01, self.interval_for(key)))
+        try:
+            yield
+        finally:
+            self._release(key)
+
+    # --------- nmap ----------
+    def nmap_timing_args(self, key: str) -> str:
+        """Translate the target's state into explicit nmap timing flags (replaces -T2)."""
+        timeout_ms = int(self.timeout_for(key) * 1000)
+        with self._cond:
+            state = self._state(key)
+            initial_ms = int((state.srtt if state.srtt is not None else INITIAL_TIMEOUT / 3) * 2000)
+            delay_ms = int(state.interval * 1000)
+            parallelism = max(1, int(state.window))
+        args = (
+            f"--initial-rtt-timeout {max(100, min(initial_ms, timeout_ms))}ms "
+            f"--max-rtt-timeout {max(100, timeout_ms)}ms "
+            f"--max-retries {self.retries_for(key)} "
+            f"--max-parallelism {parallelism}"
+        )
+        if delay_ms:
+            args += f" --scan-delay {delay_ms}ms"
+        return args
+
+    # --------- persistence ----------
+    def save(self, path: str) -> None:
+        with self._cond:
+            data = {}
+            for key, state in self._targets.items():
+                entry = asdict(state)
+                entry["in_flight"] = 0
+                entry["last_start"] = 0.0
+                data[key] = entry
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": time.time(), "targets": data}, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> None:
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        targets = data.get("targets") if isinstance(data, dict) else None
+        if not isinstance(targets, dict):
+            return
+        fields = set(TargetState.__dataclass_fields__)
+        with self._cond:
+            for key, entry in targets.items():
+                # files written by an older layout may miss or add fields; skip what cannot be rebuilt
+                if not isinstance(entry, dict):
+                    continue
+                try:
+                    state = TargetState(**{k: v for k, v in entry.items() if k in fields})
+                except (TypeError, ValueError):
+                    continue
+                values = [v for k, v in asdict(state).items() if not (k == "srtt" and v is None)]
+                if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                    continue
+                state.in_flight = 0
+                state.last_start = 0.0
+                self._targets[key] = state
+
+
+_default_governor: Optional[RateGovernor] = None
+
+
+def get_governor() -> RateGovernor:
+    """Process-wide governor so every scanning stage sees the same per-device state."""
+    global _default_governor
+    if _default_governor is None:
+        _default_governor = RateGovernor()
+    return _default_governor
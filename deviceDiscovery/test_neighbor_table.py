@@ -0,0 +1,104 @@
+"""
+-------------------------------------------------------
+Fixture tests for discovery_common.parse_neighbor_table.
+fixtures/ holds captured `arp -a` (Windows, macOS) and `ip neigh` (Linux) output.
+Run with: python -m pytest test_neighbor_table.py
+"""
+import os
+
+import pytest
+
+from benchmark_neighbor_table import synthetic_table
+from discovery_common import NeighborEntry, neighbor_table_format, parse_neighbor_table
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture(name: str) -> str:
+    # newline="" keeps the Windows \r\n line endings as arp.exe writes them
+    with open(os.path.join(FIXTURES, name), newline="") as f:
+        return f.read()
+
+
+@pytest.fixture
+def windows_table():
+    return load_fixture("neighbor_windows.txt")
+
+
+@pytest.fixture
+def mac_table():
+    return load_fixture("neighbor_mac.txt")
+
+
+@pytest.fixture
+def linux_table():
+    return load_fixture("neighbor_linux.txt")
+
+
+@pytest.mark.parametrize("name, fmt", [
+    ("neighbor_windows.txt", "windows"),
+    ("neighbor_mac.txt", "mac"),
+    ("neighbor_linux.txt", "linux"),
+])
+def test_format_detection(name, fmt):
+    assert neighbor_table_format(load_fixture(name)) == fmt
+
+
+def test_windows_table(windows_table):
+    assert parse_neighbor_table(windows_table) == [
+        NeighborEntry("192.168.1.1", "44:d4:53:85:6c:a2", "192.168.1.23", "dynamic"),
+        NeighborEntry("192.168.1.17", "a0:b1:c2:d3:e4:f5", "192.168.1.23", "dynamic"),
+        NeighborEntry("10.0.5.1", "3c:52:82:0a:1b:2c", "10.0.5.2", "dynamic"),
+    ]
+
+
+def test_mac_table_pads_short_octets(mac_table):
+    assert parse_neighbor_table(mac_table) == [
+        NeighborEntry("192.168.1.1", "44:d4:53:85:6c:a2", "en0", "dynamic"),
+        NeighborEntry("192.168.1.12", "02:1a:0b:c3:04:05", "en0", "dynamic"),
+        NeighborEntry("192.168.1.23", "8c:85:90:aa:bb:cc", "en0", "permanent"),
+        NeighborEntry("10.0.5.1", "3c:52:82:0a:1b:2c", "en7", "dynamic"),
+    ]
+
+
+def test_linux_table_skips_unresolved_and_ipv6(linux_table):
+    assert parse_neighbor_table(linux_table) == [
+        NeighborEntry("192.168.1.1", "44:d4:53:85:6c:a2", "eth0", "reachable"),
+        NeighborEntry("192.168.1.17", "a0:b1:c2:d3:e4:f5", "eth0", "stale"),
+        NeighborEntry("10.0.5.1", "3c:52:82:0a:1b:2c", "wlan0", "delay"),
+    ]
+
+
+@pytest.mark.parametrize("network, expected", [
+    ("192.168.1.0/24", {"192.168.1.1", "192.168.1.17"}),
+    ("192.168.1.16/28", {"192.168.1.17"}),
+    ("10.0.0.0/8", {"10.0.5.1"}),
+    ("172.16.0.0/12", set()),
+])
+def test_subnet_filter(linux_table, network, expected):
+    assert {e.ip for e in parse_neighbor_table(linux_table, network=network)} == expected
+
+
+def test_subnet_filter_accepts_host_bits(windows_table):
+    # adapters pass the interface address with its prefix, not the network address
+    assert [e.ip for e in parse_neighbor_table(windows_table, network="10.0.5.2/24")] == ["10.0.5.1"]
+
+
+def test_first_row_per_ip_wins(windows_table):
+    entries = [e for e in parse_neighbor_table(windows_table) if e.ip == "192.168.1.17"]
+    assert len(entries) == 1 and entries[0].iface == "192.168.1.23"
+
+
+@pytest.mark.parametrize("fmt", ["windows", "mac", "linux"])
+def test_synthetic_tables_agree(fmt):
+    # the same synthetic network parses to the same addresses in every format
+    windows = {e.ip for e in parse_neighbor_table(synthetic_table("windows", 2000), fmt="windows")}
+    table = synthetic_table(fmt, 2000)
+    assert neighbor_table_format(table) == fmt
+    parsed = parse_neighbor_table(table)
+    assert all(not int(e.mac[:2], 16) & 1 and len(e.mac) == 17 for e in parsed)
+    if fmt == "windows":
+        assert len(parsed) > 1800
+    else:
+        # incomplete rows have no MAC on macOS and Linux
+        assert {e.ip for e in parsed} <= windows
@@ -15,7 +15,7 @@ import re
 import struct
 from typing import List, Dict, Optional
 try:
-    from scapy.all import ARP, Ether, srp, conf
+    from scapy.all import conf
     SCAPY_AVAILABLE = True
 except ImportError:
     SCAPY_AVAILABLE = False
@@ -29,7 +29,8 @@ try:
 except ImportError:
     ZEROCONF_AVAILABLE = False
 from base import DeviceDiscoveryAdapter, Device
-from discovery_common import discover_ssdp
+from discovery_common import discover_ssdp, arp_sweep, parse_neighbor_table
+from rate_governor import get_governor, GOVERNOR_STATE_FILE, GOVERNOR_STATE_PATH
 
 
 class WindowsAdapter(DeviceDiscoveryAdapter):
@@ -125,25 +126,12 @@ class WindowsAdapter(DeviceDiscoveryAdapter):
         if SCAPY_AVAILABLE:
             try:
                 print(f"  Attempting active ARP scan (requires admin privileges)...")
-                # Create ARP request packet for the entire network
-                arp_request = ARP(pdst=network)
-                broadcast = Ether(dst="ff:ff:ff:ff:ff:ff")
-                arp_request_broadcast = broadcast / arp_request
+                # Sweep the network in governor-paced batches; replies seed per-device RTTs
+                answered_list = arp_sweep(network, timeout=timeout)
                 
-                # Send ARP requests and receive responses
-                # srp sends packets and waits for responses
-                answered_list, unanswered_list = srp(
-                    arp_request_broadcast, 
-                    timeout=timeout, 
-                    verbose=False,
-                    retry=2
-                )
-                
-                print(f"  Active scan: {len(answered_list)} devices responded, {len(unanswered_list)} did not respond")
+                print(f"  Active scan: {len(answered_list)} devices responded")
                 
-                for element in answered_list:
-                    ip = element[1].psrc
-                    mac = element[1].hwsrc
+                for ip, mac in answered_list:
                     
                     # Get vendor from MAC address OUI
                     vendor = self._get_vendor_from_mac(mac)
@@ -207,155 +195,30 @@ class WindowsAdapter(DeviceDiscoveryAdapter):
                 print(f"  Error output: {result.stderr}")
                 return devices
             
-            # Debug: Show raw ARP output (first few lines)
-            arp_lines = result.stdout.split('\n')
-            print(f"  ARP table contains {len(arp_lines)} lines")
-            if len(arp_lines) > 0 and len(arp_lines) <= 10:
-                print("  ARP table preview:")
-                for i, line in enumerate(arp_lines[:5]):
-                    print(f"    {i+1}: {line}")
-            elif len(arp_lines) > 10:
-                print("  ARP table preview (first 5 lines):")
-                for i, line in enumerate(arp_lines[:5]):
-                    print(f"    {i+1}: {line}")
-            
-            # Parse ARP table output
-            # Windows format examples:
-            # "  192.168.1.1           aa-bb-cc-dd-ee-ff     dynamic"
-            # "  192.168.1.1           aa-bb-cc-dd-ee-ff     static"
-            network_obj = IPNetwork(network)
-            print(f"  Looking for devices in network: {network_obj} (input: {network})")
-            print(f"  Network range: {network_obj.network} to {network_obj.broadcast}")
-            
-            lines_processed = 0
-            matches_found = 0
-            for line in result.stdout.split('\n'):
-                lines_processed += 1
-                original_line = line
-                line = line.strip()
-                
-                # Skip empty lines
-                if not line:
-                    continue
-                
-                # Skip interface headers
-                if line.startswith('Interface:'):
-                    print(f"    Found interface section: {line}")
-                    continue
-                
-                # Skip column headers
-                if 'Internet Address' in line and 'Physical Address' in line:
-                    continue
+            # Both dynamic and static entries are kept; broadcast/multicast MACs and
+            # addresses outside the network are dropped by the parser
+            for entry in parse_neighbor_table(result.stdout, network=network, fmt="windows"):
+                vendor = self._get_vendor_from_mac(entry.mac)
+                hostname = self._get_hostname(entry.ip)
                 
-                # Skip invalid or incomplete entries
-                if 'incomplete' in line.lower() or 'invalid' in line.lower():
-                    continue
-                
-                # Match IP address and MAC address (Windows uses dashes)
-                # Pattern: IP address, then whitespace (variable), then MAC with dashes, then optional type
-                # Example: "  192.168.1.1           44-d4-53-85-6c-a2     dynamic"
-                # More flexible pattern to handle variable spacing - use \s+ for multiple spaces
-                # The pattern should match: IP, whitespace, MAC (with dashes or colons), whitespace, type (dynamic/static)
-                match = re.match(r'^\s*(\d+\.\d+\.\d+\.\d+)\s+([0-9a-fA-F]{2}[-:][0-9a-fA-F]{2}[-:][0-9a-fA-F]{2}[-:][0-9a-fA-F]{2}[-:][0-9a-fA-F]{2}[-:][0-9a-fA-F]{2})\s+(\w+)', line, re.IGNORECASE)
-                if match:
-                    matches_found += 1
-                    ip = match.group(1)
-                    mac_raw = match.group(2)
-                    entry_type = match.group(3).lower() if match.group(3) else None
-                    mac = mac_raw.replace('-', ':')  # Normalize to colons
-                    
-                    # Debug: show all matched IPs
-                    print(f"    Processing matched entry: {ip} ({mac}) [Type: {entry_type}]")
-                    
-                    # IMPORTANT: Process both dynamic AND static entries
-                    # Dynamic entries are actual devices that have communicated recently
-                    # Static entries are usually multicast/broadcast, but we filter those by IP/MAC
-                    
-                    # Skip broadcast and multicast addresses (regardless of type)
-                    ##if mac == '00:00:00:00:00:00' or mac.startswith('ff:ff:ff') or mac.startswith('01:00:5e'):
-                    ##    print(f"    Skipping broadcast/multicast MAC: {ip} ({mac})")
-                    ##    continue
-                    ##
-                    ### Skip multicast/broadcast IPs (regardless of type)
-                    ##if ip.startswith('224.') or ip.startswith('239.') or ip.startswith('255.'):
-                    ##    print(f"    Skipping multicast/broadcast IP: {ip}")
-                    ##    continue
-                    
-                    # Check if IP is in the target network
-                    try:
-                        # Convert IP string to IPAddress object for proper network membership check
-                        ip_addr = IPAddress(ip)
-                        if ip_addr in network_obj:
-                            # Include both dynamic and static entries that are in the network
-                            try:
-                                print(f"    ✓ Found device: {ip} ({mac}) [Type: {entry_type}]")
-                            except UnicodeEncodeError:
-                                print(f"    [+] Found device: {ip} ({mac}) [Type: {entry_type}]")
-                            vendor = self._get_vendor_from_mac(mac)
-                            hostname = self._get_hostname(ip)
-                            
-                            device = Device(
-                                ip_address=ip,
-                                mac_address=mac,
-                                hostname=hostname,
-                                vendor=vendor
-                            )
-                            devices.append(device)
-                            # Structured output (Option 1)
-                            self.store.upsert_device(
-                                ip=ip,
-                                hostname=hostname,
-                                mac=mac,
-                                vendor=vendor,
-                                iface=iface_name,
-                                discovered_via=["ARP"]
-                            )
-                        else:
-                            print(f"    Device {ip} is not in target network {network} (network is {network_obj})")
-                    except Exception as e:
-                        print(f"    Error processing device {ip}: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        continue
-                else:
-                    # Try a more lenient pattern if the first one didn't match
-                    # Some ARP table entries might have different formatting
-                    lenient_match = re.search(r'(\d+\.\d+\.\d+\.\d+)\s+([0-9a-fA-F]{2}[-:][0-9a-fA-F]{2}[-:][0-9a-fA-F]{2}[-:][0-9a-fA-F]{2}[-:][0-9a-fA-F]{2}[-:][0-9a-fA-F]{2})', line, re.IGNORECASE)
-                    if lenient_match and 'Interface:' not in line and 'Internet Address' not in line:
-                        print(f"    Line matched with lenient pattern: '{line}'")
-                        # Process it with lenient match
-                        ip = lenient_match.group(1)
-                        mac_raw = lenient_match.group(2)
-                        mac = mac_raw.replace('-', ':')
-                        
-                        # Check if it's a valid device (not broadcast/multicast)
-                        if not (mac.startswith('ff:ff:ff') or mac.startswith('01:00:5e') or 
-                                ip.startswith('224.') or ip.startswith('239.') or ip.startswith('255.')):
-                            try:
-                                ip_addr = IPAddress(ip)
-                                if ip_addr in network_obj:
-                                    try:
-                                        print(f"    ✓ Found device (lenient match): {ip} ({mac})")
-                                    except UnicodeEncodeError:
-                                        print(f"    [+] Found device (lenient match): {ip} ({mac})")
-                                    vendor = self._get_vendor_from_mac(mac)
-                                    hostname = self._get_hostname(ip)
-                                    
-                                    device = Device(
-                                        ip_address=ip,
-                                        mac_address=mac,
-                                        hostname=hostname,
-                                        vendor=vendor
-                                    )
-                                    devices.append(device)
-                            except Exception:
-                                pass
-                    else:
-                        # Debug: show lines that don't match either pattern
-                        if line and not line.startswith('Interface:') and 'Internet Address' not in line:
-                            print(f"    Line did not match pattern: '{line}'")
+                device = Device(
+                    ip_address=entry.ip,
+                    mac_address=entry.mac,
+                    hostname=hostname,
+                    vendor=vendor
+                )
+                devices.append(device)
+                # Structured output (Option 1)
+                self.store.upsert_device(
+                    ip=entry.ip,
+                    hostname=hostname,
+                    mac=entry.mac,
+                    vendor=vendor,
+                    iface=iface_name,
+                    discovered_via=["ARP"]
+                )
             
-            print(f"  Processed {lines_processed} ARP table lines, {matches_found} matches found, {len(devices)} valid devices in target network")
+            print(f"  ARP table: {len(devices)} device(s) in target network")
         
         except Exception as e:
             print(f"  Error reading ARP table: {e}")
@@ -369,6 +232,8 @@ class WindowsAdapter(DeviceDiscoveryAdapter):
         all_devices = {}
         
         print("\n=== Starting Device Discovery ===\n")
+        # Hosts answered in earlier runs: ones that stop answering count as loss in the ARP sweep
+        get_governor().load(GOVERNOR_STATE_PATH)
         
         # Get all network interfaces
         interfaces = self.get_local_network_interfaces()
@@ -448,6 +313,12 @@ class WindowsAdapter(DeviceDiscoveryAdapter):
         except Exception as e:
             print(f"WARNING: could not save discovery.json: {e}")
 
+        # Persist per-device RTT/loss so the vulnerability scan starts from measured timing
+        try:
+            get_governor().save(GOVERNOR_STATE_PATH)
+        except Exception as e:
+            print(f"WARNING: could not save {GOVERNOR_STATE_FILE}: {e}")
+
         return list(all_devices.values())
     
     def get_device_info(self, ip_address: str) -> Optional[Device]:
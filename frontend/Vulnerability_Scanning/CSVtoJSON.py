@@ -1,16 +1,36 @@
-#This file is meant to convert results 
+#This file is meant to convert results
 #from anomalies.csv to JSON format in front-end
+#
+#anomalies.csv is read in chunks, so the log can be any size. Alerts are grouped
+#per source device and, within a device, into incidents: all alerts from the
+#device in the same INCIDENT_BUCKET seconds. Each incident becomes one finding
+#(alert count, first/last seen, worst score), and each real device gets one
+#entry with its totals and highest severity. The report grows with the number
+#of devices and incidents, not with the number of alerts. The explanations for
+#every listed incident are fetched in one llm_helper.explain_many call.
 
 import pandas as pd
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from llm_helper import analyze_anomaly
+from llm_helper import explain_many
 import socket
 import os
 
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 json_path = os.path.join(project_root, "anomaly_scan_result.json")
 
+# CONFIG
+ANOMALY_CSV = "anomalies.csv"
+CHUNK_ROWS = 50000 # rows of anomalies.csv in memory at a time
+INCIDENT_BUCKET = 300 # seconds; a device's alerts in one bucket are one incident
+MAX_FINDINGS_PER_DEVICE = 50 # most recent incidents listed per device (all are counted)
+MAX_DESTINATIONS = 20 # destination IPs remembered per incident
+HOSTNAME_WORKERS = 16 # reverse lookups run in parallel, one per device
+
+EPOCH = pd.Timestamp(0) # anomalies.csv timestamps are naive local time; buckets count from here
+REQUIRED_COLUMNS = ["timestamp", "src_ip", "dst_ip", "packet_size", "packet_frequency", "score"]
+
 def get_hostname(ip):
     try:
         return socket.gethostbyaddr(ip)[0]
@@ -26,84 +46,181 @@ def get_severity(score):
 		return "MEDIUM"
 	else:
 		return "LOW"
-		
+
 def severity_rank(sev):
 	order = {"LOW":1, "MEDIUM":2, "HIGH":3, "CRITICAL":4}
-	return order.get(sev, 0)		
+	return order.get(sev, 0)
 #def enrich_with_llm(packet_size, packet_frequency, score):
 	#prompt = f""
-	
+
 	#response = llm_api_call(prompt)
-	
+
 	#return response
 
-def get_device_details():
-	try:
-		df = pd.read_csv("anomalies.csv")
-		df = df.dropna()
-		df = df.sort_values ("timestamp", ascending = False)
-		df = df.tail(50) # limit reuslts
-	except:
-		return {"error": "No anomalies found"}
-	
-	findings = []
-	
-	for i, row in df.iterrows():
-		severity = get_severity(row["score"])
-		
-		llm_data = analyze_anomaly(
-			row["packet_size"],
-			row["packet_frequency"],
-			row["score"]
-		)
-		
-		
-		finding = {
-			"findingId": f"{row['src_ip']}-{row['timestamp']}",
-			"type": "ANOMALY",
-			"title": "Network Traffic Anomaly",
-			"severity": llm_data["severity"],
-			"description": llm_data["description"], #filled later
-			"impact": llm_data["impact"],
-			"recommendation": llm_data["recommendation"],
-			"source": "ml",
-			"evidence": {
-			        "timestamp": row["timestamp"],
-				"sourceIp": row["src_ip"],
-				"destinationIp": row["dst_ip"],
-				"packetSize": row["packet_size"],
-				"frequency": row["packet_frequency"],
-				"score": row["score"]
-			}
+class _Incident:
+	__slots__ = ("ip", "bucket", "count", "first", "last", "worst", "destinations")
+
+	def __init__(self, ip, bucket):
+		self.ip = ip
+		self.bucket = bucket
+		self.count = 0
+		self.first = self.last = None
+		self.worst = None # the row with the lowest score
+		self.destinations = set()
+
+	def merge(self, count, first, last, worst, destinations):
+		self.count += count
+		self.first = first if self.first is None else min(self.first, first)
+		self.last = last if self.last is None else max(self.last, last)
+		if self.worst is None or worst["score"] < self.worst["score"]:
+			self.worst = worst
+		for dst in destinations:
+			if len(self.destinations) >= MAX_DESTINATIONS:
+				break
+			self.destinations.add(dst)
+
+def read_incidents(path = ANOMALY_CSV, chunk_rows = CHUNK_ROWS, bucket_seconds = INCIDENT_BUCKET):
+	"""Stream anomalies.csv and fold its rows into {(src_ip, bucket): _Incident}."""
+	incidents = {}
+	bucket = pd.Timedelta(seconds = bucket_seconds)
+	for chunk in pd.read_csv(path, chunksize = chunk_rows, on_bad_lines = "skip"):
+		chunk = chunk.dropna(subset = REQUIRED_COLUMNS)
+		if chunk.empty:
+			continue
+		chunk = chunk.assign(ts = pd.to_datetime(chunk["timestamp"], format = "ISO8601", errors = "coerce"))
+		chunk = chunk.dropna(subset = ["ts"])
+		chunk = chunk.assign(bucket = (chunk["ts"] - EPOCH) // bucket)
+		groups = chunk.groupby(["src_ip", "bucket"], sort = False)
+		summary = groups.agg(count = ("ts", "size"), first = ("ts", "min"), last = ("ts", "max"),
+		                     worst = ("score", "idxmin"))
+		# distinct (device, bucket, destination) triples are few; collect them without a per-group apply
+		pairs = chunk.drop_duplicates(["src_ip", "bucket", "dst_ip"])
+		destinations = {}
+		for ip, b, dst in zip(pairs["src_ip"].tolist(), pairs["bucket"].tolist(), pairs["dst_ip"].tolist()):
+			destinations.setdefault((ip, b), []).append(dst)
+		worst_rows = chunk.loc[summary["worst"], REQUIRED_COLUMNS].to_dict("records")
+		for key, count, first, last, worst in zip(summary.index.tolist(), summary["count"].tolist(),
+		                                          summary["first"].tolist(), summary["last"].tolist(), worst_rows):
+			incident = incidents.get(key)
+			if incident is None:
+				incident = incidents[key] = _Incident(*key)
+			incident.merge(count, first, last, worst, destinations[key])
+	return incidents
+
+def incident_finding(incident, llm_data, bucket_seconds = INCIDENT_BUCKET):
+	"""llm_data is the explanation of the incident's worst alert."""
+	worst = incident.worst
+	bucket_start = (EPOCH + pd.Timedelta(seconds = incident.bucket * bucket_seconds)).isoformat()
+	return {
+		"findingId": f"{incident.ip}-{bucket_start}",
+		"type": "ANOMALY",
+		"title": "Network Traffic Anomaly",
+		"severity": llm_data["severity"],
+		"description": llm_data["description"],
+		"impact": llm_data["impact"],
+		"recommendation": llm_data["recommendation"],
+		"source": "ml",
+		"evidence": {
+			"timestamp": worst["timestamp"],
+			"firstSeen": incident.first.isoformat(),
+			"lastSeen": incident.last.isoformat(),
+			"alertCount": incident.count,
+			"sourceIp": incident.ip,
+			"destinationIp": worst["dst_ip"],
+			"destinationCount": len(incident.destinations),
+			"packetSize": worst["packet_size"],
+			"frequency": worst["packet_frequency"],
+			"score": worst["score"]
 		}
-		findings.append(finding)
-	
-	response = {
-		"schemaVersion": "1.0.0",
-		"scanDetailsResponse": {
-			"scanId": "scan-001",
-			"deviceId": "device-001",
-			"ip": df.iloc[0]["src_ip"] if not df.empty else "unknown",
-			"hostname": get_hostname(df.iloc[0]["src_ip"] if not df.empty else ""),
+	}
+
+def build_devices(incidents, max_findings = MAX_FINDINGS_PER_DEVICE):
+	"""One entry per source device, most severe (then noisiest) first."""
+	per_device = {}
+	for incident in incidents.values():
+		per_device.setdefault(incident.ip, []).append(incident)
+
+	ips = list(per_device)
+	with ThreadPoolExecutor(max_workers = max(1, min(HOSTNAME_WORKERS, len(ips)))) as pool:
+		hostnames = dict(zip(ips, pool.map(get_hostname, ips)))
+
+	listed = {}
+	for ip, device_incidents in per_device.items():
+		device_incidents.sort(key = lambda incident: incident.bucket)
+		# oldest first, like anomalies.csv; the newest incidents are the ones kept
+		listed[ip] = device_incidents[-max_findings:]
+
+	# one explanation per listed incident, from its worst alert, all in one batch
+	kept = [incident for incidents in listed.values() for incident in incidents]
+	explanations = iter(explain_many([(i.worst["packet_size"], i.worst["packet_frequency"], i.worst["score"], i.ip)
+	                                  for i in kept]))
+
+	devices = []
+	for ip, device_incidents in per_device.items():
+		findings = [incident_finding(incident, next(explanations)) for incident in listed[ip]]
+		# scored over every incident, not just the listed ones, so an older critical one still counts
+		risk_level = get_severity(min(incident.worst["score"] for incident in device_incidents))
+		devices.append({
+			"deviceId": ip,
+			"ip": ip,
+			"hostname": hostnames[ip],
 			"vendor": None,
 			"type": "IoT Monitor",
-			"riskLevel": max([f["severity"] for f in findings], key = severity_rank, default = "LOW"),
+			"riskLevel": max([f["severity"] for f in findings] + [risk_level], key = severity_rank),
 			"findingCount": len(findings),
+			# every incident, including the older ones not listed in findings
+			"incidentCount": len(device_incidents),
+			"omittedFindings": len(device_incidents) - len(findings),
+			"anomalyCount": sum(incident.count for incident in device_incidents),
+			"firstSeen": min(incident.first for incident in device_incidents).isoformat(),
+			"lastSeen": max(incident.last for incident in device_incidents).isoformat(),
+			"status": "COMPLETE",
 			"findings": findings
+		})
+	devices.sort(key = lambda d: (severity_rank(d["riskLevel"]), d["anomalyCount"]), reverse = True)
+	return devices
+
+def build_report(devices):
+	# top-level fields describe the riskiest device, as the single-device report did;
+	# findings lists every device's, oldest first
+	top = devices[0] if devices else {}
+	findings = sorted((f for d in devices for f in d["findings"]), key = lambda f: f["evidence"]["lastSeen"])
+	now = datetime.now()
+	return {
+		"schemaVersion": "1.1.0",
+		"scanDetailsResponse": {
+			"scanId": f"anomaly-{now:%Y%m%d%H%M%S}",
+			"scanName": "Anomaly Scan",
+			"scannedAt": now.isoformat(),
+			"status": "COMPLETE",
+			"deviceId": top.get("deviceId", "unknown"),
+			"ip": top.get("ip", "unknown"),
+			"hostname": top.get("hostname"),
+			"vendor": None,
+			"type": "IoT Monitor",
+			"riskLevel": max([d["riskLevel"] for d in devices], key = severity_rank, default = "LOW"),
+			"findingCount": sum(d["findingCount"] for d in devices),
+			"incidentCount": sum(d["incidentCount"] for d in devices),
+			"omittedFindings": sum(d["omittedFindings"] for d in devices),
+			"anomalyCount": sum(d["anomalyCount"] for d in devices),
+			"findings": findings,
+			"devices": devices
 		}
 	}
 
+def get_device_details(path = ANOMALY_CSV):
+	try:
+		incidents = read_incidents(path)
+	except (FileNotFoundError, pd.errors.EmptyDataError):
+		return {"error": "No anomalies found"}
+
+	response = build_report(build_devices(incidents))
+
 	with open(json_path, "w") as f:
 		json.dump(response, f, indent = 2)
-    
-	return response
 	print(f"JSON written to: {json_path}")
-	#with open("output.json", "w") as f:
-		#json.dump(response, f, indent = 2)
-		
-	#print("JSON report generated.")
+	return response
+
 if __name__ == "__main__":
     print("Running CSV + JSON conversion...")
-    get_device_details()	
-	
-
+    get_device_details()
@@ -61,6 +61,15 @@ class ServiceVersionAnalyzer:
                 		"potential_cves": cves
 			})
 
+			#carry banner fingerprint through when the fingerprint stage found one
+			if entry.get("product"):
+				findings[-1].update({
+					"vendor": entry.get("vendor"),
+					"product": entry.get("product"),
+					"version": entry.get("version"),
+					"cpe": entry.get("cpe")
+				})
+
 		return findings
         
         #Re-runs Nmap module for udp protocols to check open ports and attaches CVEs
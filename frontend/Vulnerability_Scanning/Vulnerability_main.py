@@ -1,11 +1,17 @@
+import argparse
+import contextlib
 import json
 import os
-from datetime import datetime, timezone
+import sys
 import uuid
 
 from frontend.Vulnerability_Scanning.minimal_nmap_wrapper import NmapScanner
 from frontend.Vulnerability_Scanning.Metasploit import ServiceVersionAnalyzer
 from frontend.Vulnerability_Scanning.Metasploit import KNOWN_SERVICE_CVES
+from frontend.Vulnerability_Scanning.service_fingerprint import fingerprint_services
+from frontend.Vulnerability_Scanning.scan_checkpoint import ScanCheckpoint
+from frontend.Vulnerability_Scanning.scan_stream import NdjsonReportWriter
+from deviceDiscovery.rate_governor import get_governor, GOVERNOR_STATE_PATH
 #from frontend.Vulnerability_Scanning.weak_credentials import WeakCredentialChecker
 
 #retrieves discoveres ips from file
@@ -49,6 +55,12 @@ def run_scans_on_device(ip, device_info):
     results["scans"]["nmap_tcp"] = {ip: tcp_results}
     results["scans"]["nmap_udp"] = {ip: udp_results}
 
+    # SERVICE FINGERPRINTING (adds vendor/product/version to open tcp entries)
+    try:
+        results["scans"]["fingerprints"] = fingerprint_services(ip, tcp_results, mac = device_info.get("mac"))
+    except Exception as e:
+        results["scans"]["fingerprints"] = {"error": str(e)}
+
     # METASPLOIT MODULE 
     try:
         msf = ServiceVersionAnalyzer()
@@ -136,6 +148,12 @@ def get_severity(cve):
 def get_impact(cve):
         return "Potential unauthorized access, service disruption, or data exposure."
         
+#the same device gets the same id in the NDJSON stream, the report and any later run
+def device_id(device):
+        mac = (device.get("mac") or "").strip().lower()
+        key = f"mac:{mac}" if mac else f"ip:{device.get('ip')}"
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
 def build_device_details(scan_results):
         devices_out = []
         
@@ -163,14 +181,17 @@ def build_device_details(scan_results):
                                                "protocol": service["protocol"],
                                                "port": service["port"],
                                                "service": service["service"],
-                                               "state": "unknown"
+                                               "state": "unknown",
+                                               "product": service.get("product"),
+                                               "version": service.get("version"),
+                                               "cpe": service.get("cpe")
                                        }
                                })
 
                 risk_level = compute_risk(findings)
 
                 devices_out.append({
-                        "deviceId": str(uuid.uuid4()),
+                        "deviceId": device_id(device),
                         "ip": ip,
                         "hostname": device.get("hostname"),
                         "vendor": device.get("vendor"),
@@ -183,17 +204,26 @@ def build_device_details(scan_results):
 
         return devices_out
 
-def main():
-	devices = load_discovered_devices()
-	if not devices:
-		print("No devices found.")
-		return
-        
-	#for dev in devices:
-		#print(f"IP={dev.get('ip')}, Hostname={dev.get('hostname')}, MAC={dev.get('mac')}")
-		
+def parse_args():
+	parser = argparse.ArgumentParser(description="Run vulnerability scans on discovered devices.")
+	parser.add_argument(
+		"--run-id",
+		default=None,
+		help="Resume the checkpointed run with this id instead of starting a new one."
+	)
+	parser.add_argument(
+		"--ndjson",
+		default=None,
+		metavar="PATH",
+		help="Also stream one JSON record per finished device to PATH ('-' for stdout)."
+	)
+	return parser.parse_args()
 
-	all_results = []
+def scan_devices(devices, checkpoint, stream = None):
+	#devices finished in an earlier attempt are replayed first so the stream is complete
+	if stream is not None:
+		for result in checkpoint.results():
+			stream.device(build_device_details([result])[0])
 
 	for dev in devices:
 		ip = dev.get("ip")
@@ -203,12 +233,49 @@ def main():
 			
 			continue
 
+		if checkpoint.is_done(dev):
+			continue
+
 		#print(f"\nScanning {ip}")
 		
 		scan_result = run_scans_on_device(ip, dev)
 		
-		all_results.append(scan_result)
-		
+		checkpoint.record_device(dev, scan_result)
+		if stream is not None:
+			stream.device(build_device_details([scan_result])[0])
+
+def main(run_id = None, ndjson = None):
+	devices = load_discovered_devices()
+	if not devices:
+		print("No devices found.")
+		return
+
+	#start from the RTT/loss discovery measured for each device
+	get_governor().load(GOVERNOR_STATE_PATH)
+
+	#every finished device is appended to scan_runs/<run id>.jsonl, so a restart
+	#with the same id only scans what is left
+	checkpoint = ScanCheckpoint(run_id)
+
+	#with '-' the NDJSON owns stdout, so progress prints from every module go to stderr
+	with contextlib.redirect_stdout(sys.stderr if ndjson == "-" else sys.stdout):
+		if checkpoint.resumed:
+			print(f"Resuming run {checkpoint.run_id}: {len(checkpoint.completed)} device(s) already done")
+		else:
+			print(f"Starting run {checkpoint.run_id} (pass --run-id {checkpoint.run_id} to resume)")
+		checkpoint.start()
+
+		#for dev in devices:
+			#print(f"IP={dev.get('ip')}, Hostname={dev.get('hostname')}, MAC={dev.get('mac')}")
+
+		if ndjson:
+			with NdjsonReportWriter(ndjson, checkpoint.run_id, scanned_at = checkpoint.started_at) as stream:
+				scan_devices(devices, checkpoint, stream)
+				stream.summary()
+		else:
+			scan_devices(devices, checkpoint)
+
+	checkpoint.finish()
 
 	#print("\n\n FINAL RESULTS")
 	
@@ -219,11 +286,11 @@ def main():
 	output = {
                 "schemaVersion": "1.0.0",
                 "scanDetailsResponse": {
-                        "scanId": "scan_" + uuid.uuid4().hex[:8], #datetime.now(timezone.utc).isoformat(),
+                        "scanId": checkpoint.run_id,
                         "scanName": "Static Scan",
-                        "scannedAt": datetime.now(timezone.utc).isoformat(),
+                        "scannedAt": checkpoint.started_at,
                         "status": "COMPLETE",
-                        "devices": build_device_details(all_results)
+                        "devices": build_device_details(checkpoint.results())
                 }
         }
         
@@ -233,4 +300,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(args.run_id, args.ndjson)
@@ -4,51 +4,78 @@
 # Raspberry Pi as its testing and training data
 
 #------------ Imports ----------
+import numpy as np
 import pandas as pd
 import time
+from datetime import datetime
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 import os
-import csv
+import argparse
+
+from record_writer import RecordWriter
+from flow_aggregator import FLOW_FEATURES, FLOW_WINDOW
+from model_registry import ModelRegistry
+from model_retrainer import Retrainer
+from detectors import DETECTORS, EwmaDetector, ForestDetector
+from packet_store import STORE_DIR, PacketStore
 
 # CONFIG
-TRAIN_WINDOW = 30 # the number of previous rows to use for training from packet_data.csv
+TRAIN_WINDOW = 30 # minimum rows the live pipeline collects before fitting a first model when none is saved
 CONTAMINATION = 0.1 # 10%
 CHECK_INTERVAL = 1 # seconds to wait between checks
 COOLDOWN = 2 # prevent anomaly log spams
 #THRESHOLD = -0.05
-RETRAIN_INTERVAL = 10
-new_rows_count = 0
+RETRAIN_INTERVAL = 600 # seconds between background refits of the per-device baselines (sooner on drift)
+
+# packet rows live in packet_store.py's rolling store (retention by age/size) or packet_data.csv
+PACKET_CSV = 'packet_data.csv'
+PACKET_SOURCES = ("auto", "store", "csv") # auto: whichever of the two was written last
 
-MAX_ROWS = 5000 # to keep packet file lightweight
+FEATURES = ['packet_size', 'packet_frequency']
+MIN_PACKET_SIZE = 40 # smaller rows are runts, not worth scoring
+THRESHOLD = -0.03 #closer to zero so anomaly findings surface more readily during normal traffic
 
 # INIT
 processed_rows = 0 # Keep trakc of rows already processed
 last_anomaly_time = 0 # Keep track of last anomaly alert reported
 last_anomaly_per_ip = {}
-ANOMALY_WINDOW = 10
+ANOMALY_WINDOW = 10 # seconds of event time between alerts for one IP
+MAX_COOLDOWN_IPS = 4096 # cooldown entries kept before expired ones are pruned
+ANOMALY_FLUSH_INTERVAL = 0.25 # seconds an alert may wait in the anomalies.csv buffer
 
 stop_flag = False
 
-#Create anomalies.csv if DNE
-if not os.path.exists("anomalies.csv"):
-	with open("anomalies.csv", "w", newline = "") as f:
-		writer = csv.writer(f)
-		writer.writerow([
-		    "timestamp", 
-		    "src_ip",
-		    "dst_ip", 
-		    "packet_size", 
-		    "packet_frequency", 
-		    "score", 
-		    "anomaly"
-		])
+ANOMALY_HEADER = [
+    "timestamp", 
+    "src_ip",
+    "dst_ip", 
+    "packet_size", 
+    "packet_frequency", 
+    "score", 
+    "anomaly"
+]
+
+#Create anomalies.csv if DNE; rows are appended through one buffered writer
+anomaly_writer = None
+
+def get_anomaly_writer():
+	global anomaly_writer
+	if anomaly_writer is None:
+		#anomalies are rare and wanted quickly, so flush on a short timer
+		anomaly_writer = RecordWriter("anomalies.csv", ANOMALY_HEADER, flush_interval = ANOMALY_FLUSH_INTERVAL)
+	return anomaly_writer
+
+get_anomaly_writer()
 		
 #Log anomalies function
 def log_anomaly (row, score):
-	with open("anomalies.csv", "a", newline = "") as f:
-		writer = csv.writer(f)
-		writer.writerow([
+	log_anomalies([row], [score])
+
+#Write a batch of anomalies through the buffered writer
+def log_anomalies(rows, scores):
+	get_anomaly_writer().write_rows(
+		[
 			row['timestamp'],
 			row['src_ip'],
 			row['dst_ip'],
@@ -56,14 +83,34 @@ def log_anomaly (row, score):
 			row['packet_frequency'],
 			score,
 			1
-		])
+		]
+		for row, score in zip(rows, scores)
+	)
 
-def trim_packet_data():
-    global packet_data
-    
-    if len(packet_data) > MAX_ROWS:
-        packet_data = packet_data.iloc[-MAX_ROWS:]
-        packet_data.to_csv("packet_data.csv", index = False)
+def load_packets(since = None, source = "auto"):
+    """
+    Packet rows from the columnar store (only the last `since` seconds if given;
+    typed arrays, no parsing) or from packet_data.csv. source picks one; auto
+    takes whichever was written more recently.
+    """
+    if source not in PACKET_SOURCES:
+        raise ValueError(f"unknown packet source {source!r} (choose from {', '.join(PACKET_SOURCES)})")
+    store = PacketStore(STORE_DIR, readonly = True) if source != "csv" and os.path.isdir(STORE_DIR) else None
+    if source == "auto" and store is not None and len(store) and os.path.exists(PACKET_CSV):
+        if os.path.getmtime(PACKET_CSV) > (store.last_modified() or 0):
+            store = None
+    if store is not None and (len(store) or source == "store"):
+        start = time.time() - since if since else None
+        return store.read(start, timestamps = False)
+    if source == "store":
+        raise FileNotFoundError(f"no packet store at {STORE_DIR}")
+    return pd.read_csv(PACKET_CSV)
+
+def with_timestamps(rows):
+    """Add the ISO timestamp column (store rows carry only the numeric ts)."""
+    if 'timestamp' in rows or rows.empty:
+        return rows
+    return rows.assign(timestamp = [datetime.fromtimestamp(ts).isoformat() for ts in rows['ts']])
 
 # Load initial data for training
 #packet_data = pd.read_csv('packet_data.csv')
@@ -82,109 +129,165 @@ def trim_packet_data():
 
 
 
-def run_ml():
-    global packet_data, train_data, scaler, model, processed_rows
-    
-    # Reload CSV
-    packet_data = pd.read_csv('packet_data.csv')
-    
-    # Initial training window
-    initial_window = min(TRAIN_WINDOW, len(packet_data))
-    train_data = packet_data.iloc[-initial_window:][['packet_size', 'packet_frequency']]
-    
-    # Scale features
+def fit_model(train_data, features = FEATURES):
+    """Fit the scaler and Isolation Forest on a block of training rows."""
     scaler = StandardScaler()
-    X_train = scaler.fit_transform(
-        train_data[['packet_size', 'packet_frequency']]
-    )
-  
-    # Train model Isolation Forest
+    X_train = scaler.fit_transform(train_data[features].to_numpy(dtype = float))
+
     model = IsolationForest(
 	n_estimators = 100, 
 	contamination = CONTAMINATION, 
 	random_state = 42
     )
-
     model.fit(X_train)
+    return scaler, model
+
+def filter_packets(data):
+    """Vectorized version of the per-row skips: drop runts and rows without a rate yet."""
+    mask = (data['packet_size'].to_numpy() >= MIN_PACKET_SIZE) & (data['packet_frequency'].to_numpy() > 0)
+    return data[mask]
+
+def score_batch(scaler, model, data, features = FEATURES):
+    """Scale and score a whole block in one call; returns a NumPy array of decision scores."""
+    if data.empty:
+        return np.empty(0)
+    return model.decision_function(scaler.transform(data[features].to_numpy(dtype = float)))
+
+def get_registry(flows = False):
+    """Saved per-device baselines for packet or flow rows; models load lazily on first score."""
+    if flows:
+        return ModelRegistry.load("flow", FLOW_FEATURES)
+    return ModelRegistry.load("packet", FEATURES)
+
+def get_retrainer(registry):
+    """Background refits of registry from rows scored normal; see model_retrainer.py."""
+    return Retrainer(registry, fit_model, THRESHOLD, RETRAIN_INTERVAL)
+
+def get_detector(name = "forest", flows = False):
+    """Detector for packet or flow rows: forest (saved Isolation Forests) or ewma (streaming z-scores)."""
+    if name == "ewma":
+        return EwmaDetector(FLOW_FEATURES if flows else FEATURES)
+    if name != "forest":
+        raise ValueError(f"unknown detector {name!r} (choose from {', '.join(DETECTORS)})")
+    registry = get_registry(flows)
+    return ForestDetector(registry, fit_model, THRESHOLD, get_retrainer(registry))
+
+def flows_as_packets(flows, window = FLOW_WINDOW):
+    """Map flow rows onto the packet columns anomalies.csv and CSVtoJSON expect."""
+    return flows.assign(
+        timestamp = [datetime.fromtimestamp(ts).isoformat() for ts in flows['window_start']],
+        packet_size = flows['mean_size'],
+        packet_frequency = flows['packets'] / window,
+    )
+
+def event_times(rows):
+    """Packet (event) time of each row: the numeric ts, else the ISO timestamp from packet_data.csv."""
+    if 'ts' in rows:
+        return rows['ts'].to_numpy(dtype = float)
+    return pd.to_datetime(rows['timestamp']).map(datetime.timestamp).to_numpy(dtype = float)
+
+def apply_cooldown(anomalies):
+    """
+    Per-IP cooldown over a block of anomalous rows, in event time: a row passes if
+    its IP has not alerted within ANOMALY_WINDOW seconds of the row's own timestamp.
+    A backlog scored in one block therefore alerts once per incident, not once in total.
+    """
+    if anomalies.empty:
+        return anomalies
+    ts = event_times(anomalies)
+    order = np.argsort(ts, kind = 'stable')
+    keep = np.zeros(len(anomalies), dtype = bool)
+    for i, ip in zip(order.tolist(), anomalies['src_ip'].to_numpy()[order].tolist()):
+        last = last_anomaly_per_ip.get(ip)
+        if last is None or abs(ts[i] - last) > ANOMALY_WINDOW:
+            keep[i] = True
+            last_anomaly_per_ip[ip] = ts[i] if last is None else max(last, ts[i])
+    if len(last_anomaly_per_ip) > MAX_COOLDOWN_IPS:
+        # forget IPs whose cooldown ended well before this block
+        horizon = ts.max() - ANOMALY_WINDOW
+        for ip in [ip for ip, last in last_anomaly_per_ip.items() if last < horizon]:
+            del last_anomaly_per_ip[ip]
+    return anomalies[keep]
+
+def run_ml(retrain = False, detector = "forest", since = None, source = "auto"):
+    global packet_data, processed_rows
+    
+    # Reload packet rows (just the recent range when since is set)
+    detector = get_detector(detector)
+    if retrain or not detector.ready:
+        # Saved per-device baselines; train them once from the whole retained history if there are none yet
+        detector.fit(filter_packets(load_packets(source = source)))
+    packet_data = load_packets(since, source)
     
-    THRESHOLD =  -0.03 #closer to zero so anomaly findings surface more readily during normal traffic
     processed_rows = 0 #len(packet_data)
     
     print("ML running on full dataset...")
     
-    # trim packet data file
-    #trim_packet_data()
+    # retention is the store's job now (packet_store.RETENTION_SECONDS / MAX_BYTES)
 
     # Check for new rows
-    new_data = packet_data.iloc[processed_rows:]
+    new_data = filter_packets(packet_data.iloc[processed_rows:])
     
     #if new_data.empty:
      #   time.sleep(CHECK_INTERVAL)
       #  continue
 
-    for _, row in new_data.iterrows(): #index
-    
-    
-        if row['packet_size'] < 40:
-            continue
-        if row['packet_frequency'] <= 0:
-            continue
-        # Prepare single packet for prediction
-        test_df = pd.DataFrame([{
-        	'packet_size': row['packet_size'],
-        	'packet_frequency': row['packet_frequency']
-        }])
-        
-        X_test = scaler.transform(test_df)
-        
-        #Prediction + Score
-        #pred = model.predict(X_test)
-        score = model.decision_function(X_test)[0]
-        #THRESHOLD = min(scores) * 0.8
-        current_time = time.time()
-		
-        ip = row['src_ip']
-		
-        if score < THRESHOLD: #and ((current_time - last_anomaly_time) > COOLDOWN):
-            last_time = last_anomaly_per_ip.get(ip, 0)
-        
-            if (current_time - last_time) > ANOMALY_WINDOW:
-                #print(f"Anomaly detected at {row['timestamp']}: "
-            	    #f"packet_size={row['packet_size']}, "
-            	    #f"freq={row['packet_frequency']},"
-            	    #f"score = {score}")
-                #print("Anomaly: ", row.to_dict())
-                log_anomaly(row, score)
-                
-                last_anomaly_per_ip[ip] = current_time
-                
-                #last_anomaly_time = current_time
-            
-        #Only train on normal data. prevents model corruption
-        #if score >= THRESHOLD: #normal data
-		    # Optionally, update rolling training window with new packet
-        #    train_data = pd.concat([
-        #        train_data, 
-        #        row[['packet_size','packet_frequency']].to_frame().T
-        #    ])
-		    
-        #    if len(train_data) > TRAIN_WINDOW:
-        #        train_data = train_data.iloc[-TRAIN_WINDOW:]
+    # Prediction + Score for the whole block at once, each row against its device's baseline
+    scores = detector.score(new_data)
+    flagged = scores < detector.threshold
+
+    anomalies = new_data[flagged].assign(score = scores[flagged])
+    alerts = with_timestamps(apply_cooldown(anomalies))
+
+    if not alerts.empty:
+        log_anomalies(alerts.to_dict('records'), alerts['score'].tolist())
 
     # Update processed rows counter
     #processed_rows += len(new_data)
 
-    #print(train_data.head()) ######
+    #Only train on normal data. prevents model corruption; refit when due or drifting
+    detector.observe(new_data, scores)
+    detector.close()
 
+    return alerts
 
-    # Retrain model periodically (optional)
-    #new_rows_count += len(new_data)
-    
-    #if new_rows_count >= RETRAIN_INTERVAL:
-    	
-    #	X_train = scaler.fit_transform(train_data)
-    #	model.fit(X_train)
-    #	new_rows_count = 0
+def run_flow_ml(retrain = False, detector = "forest"):
+    """Flow mode: score flow_data.csv (one row per flow per window) instead of packet rows."""
+    flows = pd.read_csv('flow_data.csv')
+    if flows.empty:
+        return flows
+
+    detector = get_detector(detector, flows = True)
+    if retrain or not detector.ready:
+        detector.fit(flows)
+    print(f"ML running on {len(flows)} flows...")
+
+    scores = detector.score(flows)
+    flagged = scores < detector.threshold
+    # a flow row's event time is the end of its window
+    anomalies = flows_as_packets(flows[flagged]).assign(score = scores[flagged])
+    alerts = apply_cooldown(anomalies.assign(ts = anomalies['window_start'] + FLOW_WINDOW))
+
+    if not alerts.empty:
+        log_anomalies(alerts.to_dict('records'), alerts['score'].tolist())
+
+    detector.observe(flows, scores)
+    detector.close()
+    return alerts
         
 if __name__ == "__main__":
-    run_ml()
+    parser = argparse.ArgumentParser(description = "Isolation Forest anomaly detection over captured traffic.")
+    parser.add_argument("--flows", action = "store_true", help = "Score flow_data.csv instead of packet_data.csv.")
+    parser.add_argument("--retrain", action = "store_true",
+                        help = "Refit the saved per-device baselines from the whole CSV before scoring.")
+    parser.add_argument("--detector", choices = DETECTORS, default = "forest",
+                        help = "forest: per-device Isolation Forests. ewma: O(1) streaming z-scores for small hardware.")
+    parser.add_argument("--since", type = float, default = None,
+                        help = "Score only the last SINCE seconds of stored packets (default: everything retained).")
+    parser.add_argument("--source", choices = PACKET_SOURCES, default = "auto",
+                        help = "Read packets from packet_store/ or packet_data.csv (auto: whichever was written last).")
+    args = parser.parse_args()
+    if args.flows:
+        run_flow_ml(args.retrain, args.detector)
+    else:
+        run_ml(args.retrain, args.detector, args.since, args.source)
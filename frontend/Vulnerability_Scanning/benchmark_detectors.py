@@ -0,0 +1,155 @@
+# This file compares the detectors in detectors.py on the same synthetic traffic:
+# scoring throughput in streaming-sized batches, memory (peak allocation while
+# scoring, plus the size of the saved / in-memory state) and detection quality
+# against labelled anomalies.
+#
+# Traffic: every device has its own packet size and rate profile. Two kinds of
+# anomaly are injected: network-wide bursts (jumbo packets at a flood rate) and
+# device-relative ones (sizes and rates normal for the network, but far outside
+# that device's own profile).
+#
+# Usage: python benchmark_detectors.py --rows 20000
+
+#------------ Imports ----------
+import argparse
+import copy
+import os
+import pickle
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+BATCH_ROWS = 256 # same as streaming_pipeline.BATCH_PACKETS
+TRAIN_SHARE = 0.3 # leading share of the traffic used to fit / warm up
+MEMORY_BATCHES = 10 # batches scored under tracemalloc
+
+
+def make_traffic(rows, devices = 40, anomaly_rate = 0.01, seed = 11):
+    """Per-device traffic in time order, plus a label column (1 = injected anomaly)."""
+    rng = np.random.default_rng(seed)
+    ips = np.array([f"192.168.0.{i}" for i in range(2, devices + 2)])
+    size_mean = rng.uniform(100, 1300, size = devices)
+    rate_mean = rng.uniform(1, 30, size = devices)
+    device = rng.integers(0, devices, size = rows)
+    size = np.clip(rng.normal(size_mean[device], size_mean[device] * 0.05), 60, 1514)
+    rate = np.clip(rng.normal(rate_mean[device], rate_mean[device] * 0.1), 0.1, None)
+    label = np.zeros(rows, dtype = int)
+
+    start = int(rows * TRAIN_SHARE)
+    burst = rng.random(rows) < anomaly_rate / 2
+    burst[:start] = False
+    size[burst] = 9000
+    rate[burst] = 500
+    label[burst] = 1
+
+    # inside the network's overall range, outside this device's own
+    shifted = (rng.random(rows) < anomaly_rate / 2) & ~burst
+    shifted[:start] = False
+    size[shifted] = np.where(size_mean[device[shifted]] > 700, size_mean[device[shifted]] - 500,
+                             size_mean[device[shifted]] + 500)
+    rate[shifted] = rate_mean[device[shifted]] * 3
+    label[shifted] = 1
+
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2026-01-01', periods = rows, freq = '10ms').astype(str),
+        'src_ip': ips[device],
+        'dst_ip': '10.0.0.1',
+        'packet_size': np.round(size).astype(int),
+        'packet_frequency': np.round(rate, 1),
+        'label': label,
+    })
+
+
+def dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def run_detector(name, alg, train, test):
+    from detectors import EwmaDetector, ForestDetector
+    from model_registry import ModelRegistry
+
+    model_dir = tempfile.mkdtemp(prefix = "vigil-models-")
+    if name == "forest":
+        # no retrainer: this measures the scoring path only
+        detector = ForestDetector(ModelRegistry("packet", alg.FEATURES, root = model_dir), alg.fit_model, alg.THRESHOLD)
+    else:
+        detector = EwmaDetector(alg.FEATURES)
+
+    start = time.perf_counter()
+    detector.fit(train)
+    fit_seconds = time.perf_counter() - start
+
+    # memory over a few batches (tracing slows the forest's per-tree Python loop badly);
+    # ewma learns while it scores, so it is probed on a copy
+    probe = detector if name == "forest" else copy.deepcopy(detector)
+    tracemalloc.start()
+    for i in range(0, min(len(test), MEMORY_BATCHES * BATCH_ROWS), BATCH_ROWS):
+        probe.score(test.iloc[i:i + BATCH_ROWS])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    scores = []
+    start = time.perf_counter()
+    for i in range(0, len(test), BATCH_ROWS):
+        scores.append(detector.score(test.iloc[i:i + BATCH_ROWS]))
+    seconds = time.perf_counter() - start
+
+    scores = np.concatenate(scores)
+    state = dir_bytes(model_dir) if name == "forest" else len(pickle.dumps(detector._devices))
+    labels = test['label'].to_numpy()
+    flagged = scores < detector.threshold
+    known = ~np.isnan(scores)
+    tp = int((flagged & (labels == 1)).sum())
+    precision = tp / max(1, int(flagged.sum()))
+    recall = tp / max(1, int(labels.sum()))
+    return {
+        "fit_seconds": fit_seconds,
+        "rows": len(test),
+        "rows_per_sec": len(test) / seconds,
+        "batch_ms": 1000 * seconds / max(1, -(-len(test) // BATCH_ROWS)),
+        "peak_kib": peak / 1024,
+        "state_kib": state / 1024,
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        # lower score = more anomalous, so negate for AUC
+        "auc": roc_auc_score(labels[known], -scores[known]) if labels[known].any() else float("nan"),
+    }
+
+
+def run(rows, detectors):
+    # anomaly_detection_alg creates anomalies.csv in the cwd on import
+    os.chdir(tempfile.mkdtemp(prefix = "vigil-bench-"))
+    import anomaly_detection_alg as alg
+
+    data = alg.filter_packets(make_traffic(rows))
+    split = int(len(data) * TRAIN_SHARE)
+    train, test = data.iloc[:split], data.iloc[split:]
+
+    results = {name: run_detector(name, alg, train, test) for name in detectors}
+    print(f"{'detector':8s} {'rows/s':>12s} {'batch ms':>9s} {'peak KiB':>9s} {'state KiB':>10s} "
+          f"{'precision':>9s} {'recall':>7s} {'f1':>6s} {'auc':>6s} {'fit s':>7s}")
+    for name, r in results.items():
+        print(f"{name:8s} {r['rows_per_sec']:>12,.0f} {r['batch_ms']:>9.2f} {r['peak_kib']:>9.0f} {r['state_kib']:>10.0f} "
+              f"{r['precision']:>9.3f} {r['recall']:>7.3f} {r['f1']:>6.3f} {r['auc']:>6.3f} {r['fit_seconds']:>7.2f}")
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Compare anomaly detectors on the same synthetic traffic.")
+    parser.add_argument("--rows", type = int, default = 20000, help = "Packets of synthetic traffic.")
+    parser.add_argument("--detectors", nargs = "+", default = ["forest", "ewma"], choices = ["forest", "ewma"])
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.rows, args.detectors)
@@ -0,0 +1,213 @@
+# This file benchmarks the whole packet path on synthetic IoT traffic with
+# labelled incidents (generate_packets.py): pcap replay -> sniffer feature
+# extraction -> detector -> anomalies.csv -> JSON report, for each detector.
+#
+# It reports end-to-end throughput, p50/p99 scoring latency per micro-batch,
+# peak memory, how long the report takes, and detection quality. Quality is
+# counted per incident: recall is the share of incidents with an alert from
+# their device while they ran (plus SLACK_SECONDS, since rates stay high for
+# one rate window afterwards); precision is the share of alerts that fall
+# inside an incident. Alerts from the warmup share of the trace (training time,
+# before any incident) are left out of both. Every detector runs in a fresh
+# process, so peak RSS is its own. --json writes the results for tracking
+# regressions between commits.
+#
+# Usage: python benchmark_pipeline.py --devices 20 --duration 300 --json bench.json
+
+#------------ Imports ----------
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import generate_packets
+
+SLACK_SECONDS = 10 # alerts this long after an incident still belong to it (network_sniffer.TIME_WINDOW)
+
+
+def warmup_rows(traffic, flows, cutoff):
+    """Feature rows the pipeline sees before the first incident can start; the forest trains on them."""
+    if not flows:
+        rows = generate_packets.packet_features(traffic)
+        return int((rows["ts"] < cutoff).sum())
+    from flow_aggregator import FlowAggregator
+    aggregator = FlowAggregator()
+    head = traffic[traffic["ts"] < cutoff]
+    closed = 0
+    for packet in zip(head["ts"].tolist(), head["src_ip"].tolist(), head["dst_ip"].tolist(),
+                      head["packet_size"].tolist(), head["protocol"].tolist(),
+                      head["src_port"].tolist(), head["dst_port"].tolist()):
+        closed += len(aggregator.add(*packet))
+    return closed
+
+
+def evaluate(alerts, labels, cutoff, slack = SLACK_SECONDS):
+    """Alert precision, incident recall (overall and per kind) and the delay to the first alert."""
+    alerts = alerts[alerts["ts"].to_numpy(dtype = float) >= cutoff]
+    ts = alerts["ts"].to_numpy(dtype = float)
+    src = alerts["src_ip"].to_numpy()
+    inside = np.zeros(len(alerts), dtype = bool)
+    delays = []
+    found = {}
+    for incident in labels.itertuples():
+        match = (src == incident.src_ip) & (ts >= incident.start) & (ts <= incident.end + slack)
+        inside |= match
+        found.setdefault(incident.kind, []).append(bool(match.any()))
+        if match.any():
+            delays.append(float(ts[match].min() - incident.start))
+    detected = sum(sum(hits) for hits in found.values())
+    return {
+        "alerts": len(alerts),
+        "precision": float(inside.mean()) if len(alerts) else 0.0,
+        "recall": detected / max(1, len(labels)),
+        "recall_by_kind": {kind: sum(hits) / len(hits) for kind, hits in found.items()},
+        "detection_delay_s": float(np.mean(delays)) if delays else None,
+    }
+
+
+def run_detector(name, pcap, labels, flows, warmup, cutoff):
+    """One pipeline run in this (fresh) process; returns its metrics."""
+    workdir = tempfile.mkdtemp(prefix = f"vigil-bench-{name}-")
+    # anomaly_detection_alg creates anomalies.csv in the cwd on import
+    os.chdir(workdir)
+    import anomaly_detection_alg as alg
+    import CSVtoJSON
+    import llm_helper
+    from detectors import ForestDetector
+    from flow_aggregator import FLOW_FEATURES
+    from model_registry import ModelRegistry
+    from streaming_pipeline import StreamingPipeline
+
+    alerts = []
+    batch_seconds = []
+
+    def collect(block):
+        alg.log_anomalies(block.to_dict('records'), block['score'].tolist())
+        alerts.append(block[['ts', 'src_ip', 'score']])
+
+    class TimedPipeline(StreamingPipeline):
+        def _score_frame(self, data):
+            ready = self.detector.ready
+            start = time.perf_counter()
+            super()._score_frame(data)
+            if ready:
+                # the one-off warmup fit is reported separately, not as a scoring batch
+                batch_seconds.append(time.perf_counter() - start)
+
+    pipeline = TimedPipeline(flows = flows, detector = name, on_alerts = collect, warmup_rows = warmup,
+                             replay = [pcap])
+    if name == "forest":
+        # baselines in the scratch dir, not the real model store; no retrainer, so this is the scoring path
+        kind, features = ("flow", FLOW_FEATURES) if flows else ("packet", alg.FEATURES)
+        pipeline.detector = ForestDetector(ModelRegistry(kind, features, root = os.path.join(workdir, "models")),
+                                           alg.fit_model, alg.THRESHOLD)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    stats = pipeline.run()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    alg.get_anomaly_writer().flush()
+    CSVtoJSON.json_path = os.path.join(workdir, "anomaly_scan_result.json")
+    # a cold explanation cache, so report_ms includes the backend batch
+    llm_helper.set_default_cache(llm_helper.ExplanationCache(os.path.join(workdir, "explanation_cache.json")))
+    start = time.perf_counter()
+    CSVtoJSON.get_device_details()
+    report_seconds = time.perf_counter() - start
+
+    batches = np.array(batch_seconds) * 1000
+    scoring = float(batches.sum()) / 1000
+    found = pd.concat(alerts, ignore_index = True) if alerts else pd.DataFrame(columns = ['ts', 'src_ip', 'score'])
+    result = {
+        "packets": stats["captured"],
+        "dropped": stats["dropped"],
+        "feature_rows": stats["features"],
+        "scored_rows": stats["scored"],
+        "elapsed_s": stats["elapsed_s"],
+        "packets_per_sec": stats["packets_per_sec"],
+        "scored_rows_per_sec": stats["scored"] / scoring if scoring else 0.0,
+        "batches": len(batches),
+        "batch_ms_p50": float(np.percentile(batches, 50)) if len(batches) else None,
+        "batch_ms_p99": float(np.percentile(batches, 99)) if len(batches) else None,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mib": peak_rss / 1024,
+        "rss_growth_mib": (peak_rss - rss_before) / 1024,
+        "report_ms": report_seconds * 1000,
+    }
+    result.update(evaluate(found, labels, cutoff))
+    return result
+
+
+def run(devices, duration, rate, incidents, seed, detectors, flows = False, json_path = None):
+    workdir = tempfile.mkdtemp(prefix = "vigil-bench-")
+    start = time.time() - duration
+    traffic, labels = generate_packets.make_traffic(devices, duration, rate, incidents, seed, start)
+    pcap = os.path.join(workdir, "traffic.pcap")
+    generate_packets.write_pcap(pcap, traffic)
+    cutoff = start + duration * generate_packets.WARMUP_SHARE
+    warmup = warmup_rows(traffic, flows, cutoff)
+    print(f"{len(traffic)} packets from {devices} devices over {duration:.0f}s, "
+          f"{len(labels)} incidents ({int(traffic['label'].sum())} packets); warmup {warmup} rows.")
+
+    results = {}
+    for name in detectors:
+        # a fresh interpreter per detector keeps peak memory and module state separate
+        with ProcessPoolExecutor(max_workers = 1, mp_context = mp.get_context("spawn")) as pool:
+            results[name] = pool.submit(run_detector, name, pcap, labels, flows, warmup, cutoff).result()
+
+    print(f"{'detector':8s} {'pkt/s':>9s} {'p50 ms':>7s} {'p99 ms':>7s} {'RSS MiB':>8s} {'alerts':>6s} "
+          f"{'precision':>9s} {'recall':>6s} {'delay s':>7s} {'report ms':>9s}")
+    for name, r in results.items():
+        delay = f"{r['detection_delay_s']:.1f}" if r['detection_delay_s'] is not None else "-"
+        print(f"{name:8s} {r['packets_per_sec']:>9,.0f} {r['batch_ms_p50'] or 0:>7.2f} {r['batch_ms_p99'] or 0:>7.2f} "
+              f"{r['peak_rss_mib']:>8.0f} {r['alerts']:>6d} {r['precision']:>9.3f} {r['recall']:>6.3f} "
+              f"{delay:>7s} {r['report_ms']:>9.1f}")
+
+    output = {
+        "benchmark": "pipeline",
+        "run_at": datetime.now().isoformat(),
+        "config": {
+            "devices": devices,
+            "duration_s": duration,
+            "rate": rate,
+            "incidents": incidents,
+            "seed": seed,
+            "flows": flows,
+            "packets": len(traffic),
+            "anomalous_packets": int(traffic["label"].sum()),
+        },
+        "results": results,
+    }
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(output, f, indent = 2)
+        print(f"Results written to {json_path}")
+    return output
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Benchmark the replay -> detector -> report pipeline on synthetic traffic.")
+    parser.add_argument("--devices", type = int, default = 20, help = "Simulated devices.")
+    parser.add_argument("--duration", type = float, default = 300, help = "Seconds of generated traffic.")
+    parser.add_argument("--rate", type = float, default = 1.0, help = "Multiplier on every packet rate (load).")
+    parser.add_argument("--incidents", type = int, default = 6, help = "Injected scans / floods / exfil bursts.")
+    parser.add_argument("--seed", type = int, default = 7)
+    parser.add_argument("--detectors", nargs = "+", default = ["forest", "ewma"], choices = ["forest", "ewma"])
+    parser.add_argument("--flows", action = "store_true", help = "Score per-flow rows instead of packets.")
+    parser.add_argument("--json", default = None, metavar = "PATH", help = "Write the results as JSON.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.devices, args.duration, args.rate, args.incidents, args.seed, args.detectors, args.flows, args.json)
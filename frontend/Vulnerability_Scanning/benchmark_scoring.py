@@ -0,0 +1,95 @@
+# This file benchmarks anomaly scoring throughput:
+# the old per-row loop (one DataFrame + transform + decision_function per packet)
+# against the batch path in anomaly_detection_alg (one call per block).
+#
+# Usage: python benchmark_scoring.py --rows 20000
+
+#------------ Imports ----------
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+
+def make_packets(rows, seed = 7):
+    """Synthetic packet_data.csv rows: normal traffic plus a few oversized bursts."""
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame({
+        'timestamp': pd.date_range('2026-01-01', periods = rows, freq = '10ms').astype(str),
+        'src_ip': rng.choice([f"192.168.0.{i}" for i in range(2, 40)], size = rows),
+        'dst_ip': rng.choice([f"10.0.0.{i}" for i in range(1, 10)], size = rows),
+        'packet_size': rng.integers(60, 1500, size = rows),
+        'packet_frequency': np.round(rng.uniform(0.1, 20, size = rows), 1),
+    })
+    burst = rng.random(rows) < 0.01
+    data.loc[burst, 'packet_size'] = 9000
+    data.loc[burst, 'packet_frequency'] = 500
+    return data
+
+
+def score_rowwise(alg, scaler, model, data):
+    """The pre-batch scoring loop, kept here only as the baseline."""
+    scores = []
+    for _, row in data.iterrows():
+        if row['packet_size'] < 40:
+            continue
+        if row['packet_frequency'] <= 0:
+            continue
+        test_df = pd.DataFrame([{
+            'packet_size': row['packet_size'],
+            'packet_frequency': row['packet_frequency']
+        }])
+        scores.append(model.decision_function(scaler.transform(test_df.to_numpy(dtype = float)))[0])
+    return np.array(scores)
+
+
+def score_batched(alg, scaler, model, data):
+    return alg.score_batch(scaler, model, alg.filter_packets(data))
+
+
+def run(rows, rowwise_rows):
+    # anomaly_detection_alg creates anomalies.csv in the cwd on import
+    os.chdir(tempfile.mkdtemp(prefix = "vigil-bench-"))
+    import anomaly_detection_alg as alg
+
+    data = make_packets(rows)
+    scaler, model = alg.fit_model(data.iloc[:alg.TRAIN_WINDOW])
+
+    results = {}
+    for name, fn, block in (
+        ("rowwise", score_rowwise, data.iloc[:rowwise_rows]),
+        ("batched", score_batched, data),
+    ):
+        start = time.perf_counter()
+        scores = fn(alg, scaler, model, block)
+        elapsed = time.perf_counter() - start
+        results[name] = {"rows": len(block), "seconds": elapsed, "rows_per_sec": len(block) / elapsed, "scores": scores}
+
+    # both paths must agree on the rows they share
+    shared = len(results["rowwise"]["scores"])
+    assert np.allclose(results["rowwise"]["scores"], results["batched"]["scores"][:shared])
+
+    for name in ("rowwise", "batched"):
+        r = results[name]
+        print(f"{name:8s} {r['rows']:>8d} rows  {r['seconds']:8.3f}s  {r['rows_per_sec']:>12,.0f} rows/s")
+    print(f"speedup  {results['batched']['rows_per_sec'] / results['rowwise']['rows_per_sec']:.1f}x")
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Benchmark per-row vs batch anomaly scoring.")
+    parser.add_argument("--rows", type = int, default = 20000, help = "Rows scored by the batch path.")
+    parser.add_argument("--rowwise-rows", type = int, default = 2000, help = "Rows scored by the (slow) per-row path.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.rows, min(args.rowwise_rows, args.rows))
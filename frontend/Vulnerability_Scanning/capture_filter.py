@@ -0,0 +1,287 @@
+# This file builds kernel-side capture filters for the sniffer.
+# A filter is a classic BPF program attached to the capture socket with
+# SO_ATTACH_FILTER, so traffic we never score (non-IP, runts, broadcast and
+# multicast chatter, the Pi's own management sessions) is dropped in the kernel
+# before it is copied to userspace.
+#
+# Expressions are tcpdump syntax. They are compiled with libpcap (via ctypes),
+# or `tcpdump -ddd` if libpcap is not loadable. The ip and default profiles also
+# have hand-assembled programs, so they work on a bare Pi image with neither.
+# run_filter() evaluates a program in userspace, for replayed captures that
+# have no socket to attach it to.
+
+#------------ Imports ----------
+import ctypes
+import ctypes.util
+import shutil
+import socket
+import struct
+import subprocess
+
+SO_ATTACH_FILTER = 26
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+DLT_EN10MB = 1
+SNAPLEN = 65535
+
+MIN_PACKET_SIZE = 60 # matches network_sniffer.MIN_PACKET_SIZE
+MANAGEMENT_PORTS = (22, 443) # ssh and the dashboard backend on this host
+
+FILTER_PROFILES = {
+    "all": "",
+    "ip": "ip",
+    "default": f"ip and len >= {MIN_PACKET_SIZE} and not ether multicast",
+    "no-mgmt": (
+        f"ip and len >= {MIN_PACKET_SIZE} and not ether multicast"
+        " and not (host {self_ip} and (" + " or ".join(f"port {p}" for p in MANAGEMENT_PORTS) + "))"
+    ),
+}
+DEFAULT_PROFILE = "default"
+
+# (code, jt, jf, k) for FILTER_PROFILES["default"] on Ethernet frames
+DEFAULT_PROGRAM = [
+    (0x28, 0, 0, 12),           # ldh [12]              ethertype
+    (0x15, 0, 5, 0x0800),       # jeq #0x800            else drop
+    (0x80, 0, 0, 0),            # ld #len               wire length
+    (0x35, 0, 3, MIN_PACKET_SIZE),  # jge #60           else drop
+    (0x30, 0, 0, 0),            # ldb [0]               first byte of dst mac
+    (0x45, 1, 0, 0x01),         # jset #1               group bit: multicast/broadcast -> drop
+    (0x06, 0, 0, 0x40000),      # ret #262144           accept
+    (0x06, 0, 0, 0),            # ret #0                drop
+]
+
+IP_PROGRAM = [
+    (0x28, 0, 0, 12),           # ldh [12]
+    (0x15, 0, 1, 0x0800),       # jeq #0x800            else drop
+    (0x06, 0, 0, 0x40000),      # ret #262144
+    (0x06, 0, 0, 0),            # ret #0
+]
+
+BUILTIN_PROGRAMS = {
+    FILTER_PROFILES["ip"]: IP_PROGRAM,
+    FILTER_PROFILES["default"]: DEFAULT_PROGRAM,
+}
+
+_insn = struct.Struct("HBBI")
+
+
+class FilterError(Exception):
+    pass
+
+
+def local_ip():
+    """Address this host uses for outbound traffic (no packet is actually sent)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect(("192.0.2.1", 9))
+        return sock.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+    finally:
+        sock.close()
+
+
+def build_expression(profile = DEFAULT_PROFILE, extra = None):
+    """Profile expression, optionally narrowed further by a user expression."""
+    if profile not in FILTER_PROFILES:
+        raise FilterError(f"unknown filter profile {profile!r} (choose from {', '.join(FILTER_PROFILES)})")
+    expression = FILTER_PROFILES[profile]
+    if "{self_ip}" in expression:
+        expression = expression.format(self_ip = local_ip())
+    if extra:
+        expression = f"({expression}) and ({extra})" if expression else extra
+    return expression
+
+
+# --------- compilers ----------
+class _BpfInsn(ctypes.Structure):
+    _fields_ = [("code", ctypes.c_ushort), ("jt", ctypes.c_ubyte), ("jf", ctypes.c_ubyte), ("k", ctypes.c_uint32)]
+
+
+class _BpfProgram(ctypes.Structure):
+    _fields_ = [("bf_len", ctypes.c_uint), ("bf_insns", ctypes.POINTER(_BpfInsn))]
+
+
+def _compile_libpcap(expression):
+    path = ctypes.util.find_library("pcap")
+    if not path:
+        return None
+    pcap = ctypes.CDLL(path)
+    pcap.pcap_open_dead.restype = ctypes.c_void_p
+    pcap.pcap_open_dead.argtypes = [ctypes.c_int, ctypes.c_int]
+    pcap.pcap_compile.argtypes = [ctypes.c_void_p, ctypes.POINTER(_BpfProgram), ctypes.c_char_p, ctypes.c_int, ctypes.c_uint32]
+    pcap.pcap_geterr.restype = ctypes.c_char_p
+    pcap.pcap_geterr.argtypes = [ctypes.c_void_p]
+    pcap.pcap_freecode.argtypes = [ctypes.POINTER(_BpfProgram)]
+    pcap.pcap_close.argtypes = [ctypes.c_void_p]
+
+    handle = pcap.pcap_open_dead(DLT_EN10MB, SNAPLEN)
+    program = _BpfProgram()
+    try:
+        if pcap.pcap_compile(handle, ctypes.byref(program), expression.encode(), 1, 0xFFFFFFFF) != 0:
+            raise FilterError(f"bad filter {expression!r}: {pcap.pcap_geterr(handle).decode()}")
+        insns = [(i.code, i.jt, i.jf, i.k) for i in program.bf_insns[:program.bf_len]]
+        pcap.pcap_freecode(ctypes.byref(program))
+        return insns
+    finally:
+        pcap.pcap_close(handle)
+
+
+def _compile_tcpdump(expression, interface = None):
+    tcpdump = shutil.which("tcpdump")
+    if not tcpdump:
+        return None
+    cmd = [tcpdump, "-ddd"] + (["-i", interface] if interface else []) + [expression]
+    proc = subprocess.run(cmd, capture_output = True, text = True)
+    if proc.returncode != 0:
+        raise FilterError(f"bad filter {expression!r}: {proc.stderr.strip()}")
+    lines = proc.stdout.split("\n")
+    count = int(lines[0])
+    return [tuple(int(v) for v in line.split()) for line in lines[1:count + 1]]
+
+
+def compile_filter(expression, interface = None):
+    """Compile a tcpdump expression to [(code, jt, jf, k)]; None means capture everything."""
+    if not expression:
+        return None
+    for compiler in (_compile_libpcap, lambda e: _compile_tcpdump(e, interface)):
+        program = compiler(expression)
+        if program is not None:
+            return program
+    if expression in BUILTIN_PROGRAMS:
+        return list(BUILTIN_PROGRAMS[expression])
+    raise FilterError("compiling a custom filter needs libpcap or tcpdump; only the ip and default profiles are built in")
+
+
+# --------- userspace evaluation ----------
+_load_sizes = {0x00: 4, 0x08: 2, 0x10: 1}
+_alu = {
+    0x00: lambda a, b: a + b,
+    0x10: lambda a, b: a - b,
+    0x20: lambda a, b: a * b,
+    0x30: lambda a, b: a // b if b else None,
+    0x40: lambda a, b: a | b,
+    0x50: lambda a, b: a & b,
+    0x60: lambda a, b: a << b,
+    0x70: lambda a, b: a >> b,
+    0x90: lambda a, b: a % b if b else None,
+    0xA0: lambda a, b: a ^ b,
+}
+
+
+def run_filter(program, frame, wire_len):
+    """
+    Run a classic BPF program over one Ethernet frame in userspace, the way the
+    kernel would on a socket (used for pcap replay). Returns the accept length;
+    0 means drop. Loads past the captured bytes drop the packet, as in the kernel.
+    """
+    if not program:
+        return wire_len
+    a = x = 0
+    mem = [0] * 16
+    pc = 0
+    caplen = len(frame)
+    while pc < len(program):
+        code, jt, jf, k = program[pc]
+        pc += 1
+        cls = code & 0x07
+        if cls in (0x00, 0x01): # ld / ldx
+            mode = code & 0xE0
+            if mode == 0x00:
+                value = k
+            elif mode == 0x80:
+                value = wire_len
+            elif mode == 0x60:
+                value = mem[k & 0x0F]
+            elif mode == 0xA0: # ldx msh: 4 * (P[k] & 0xf)
+                if k >= caplen:
+                    return 0
+                value = (frame[k] & 0x0F) * 4
+            else:
+                offset = k + (x if mode == 0x40 else 0)
+                size = _load_sizes[code & 0x18]
+                if offset >= 0x80000000 or offset + size > caplen:
+                    return 0 # ancillary (SKF_AD_*) loads have no meaning offline either
+                value = int.from_bytes(frame[offset:offset + size], "big")
+            if cls == 0x00:
+                a = value
+            else:
+                x = value
+        elif cls == 0x02: # st
+            mem[k & 0x0F] = a
+        elif cls == 0x03: # stx
+            mem[k & 0x0F] = x
+        elif cls == 0x04: # alu
+            op = code & 0xF0
+            if op == 0x80:
+                a = -a & 0xFFFFFFFF
+                continue
+            value = _alu[op](a, x if code & 0x08 else k)
+            if value is None:
+                return 0 # division by zero
+            a = value & 0xFFFFFFFF
+        elif cls == 0x05: # jmp
+            op = code & 0xF0
+            if op == 0x00:
+                pc += k
+                continue
+            operand = x if code & 0x08 else k
+            if op == 0x10:
+                taken = a == operand
+            elif op == 0x20:
+                taken = a > operand
+            elif op == 0x30:
+                taken = a >= operand
+            else:
+                taken = bool(a & operand)
+            pc += jt if taken else jf
+        elif cls == 0x06: # ret
+            return a if code & 0x18 == 0x10 else k
+        else: # misc: tax / txa
+            if code & 0xF8 == 0x80:
+                a = x
+            else:
+                x = a
+    return 0
+
+
+# --------- socket helpers ----------
+def sock_fprog(program):
+    """
+    struct sock_fprog { unsigned short len; struct sock_filter *filter; } for setsockopt.
+    Returns (fprog, code); keep code referenced until setsockopt returns, the kernel copies it.
+    """
+    code = ctypes.create_string_buffer(b"".join(_insn.pack(*insn) for insn in program))
+    return struct.pack("HP", len(program), ctypes.addressof(code)), code
+
+
+def attach_filter(sock, program):
+    if not program:
+        return
+    fprog, code = sock_fprog(program)
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+class KernelStats:
+    """
+    PACKET_STATISTICS counters for an AF_PACKET socket. The kernel resets them on
+    every read, so they are accumulated here. tp_packets counts frames that passed
+    the filter (dropped ones included); tp_drops counts those lost because the
+    socket buffer or ring was full.
+    """
+
+    def __init__(self):
+        self.packets = 0
+        self.drops = 0
+
+    def poll(self, sock):
+        try:
+            packets, drops = struct.unpack("II", sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8))
+        except OSError:
+            return self
+        self.packets += packets
+        self.drops += drops
+        return self
+
+    def as_dict(self):
+        return {"kernel_packets": self.packets, "kernel_drops": self.drops}
@@ -0,0 +1,205 @@
+# This file defines the detector interface the scoring paths run against, and
+# its two implementations:
+#   forest  the per-device Isolation Forest baselines (model_registry), refit in
+#           the background by model_retrainer
+#   ewma    per-device exponentially weighted mean / variance of each feature;
+#           a row scores -max|z| against its device's running statistics,
+#           scaled onto the forest's decision_function range. Each
+#           sample costs O(features), state is a few floats per device, and it
+#           updates as it scores, so there are no batch refits. Suited to a Pi
+#           where 100-tree forests are too heavy.
+#
+# Scores follow decision_function: lower is more anomalous, and a row is an
+# anomaly when its score is below the detector's threshold.
+
+#------------ Imports ----------
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+# CONFIG
+EWMA_ALPHA = 0.02 # weight of each new sample (~50-sample memory)
+EWMA_Z = 4.0 # |z| beyond this on any feature is an anomaly
+EWMA_SCORE_SCALE = 0.0125 # score per unit of z: |z| 4 / 8 / 16 lands on the -0.05 / -0.1 / -0.2 severity bands
+EWMA_WARMUP = 20 # samples before a device is scored on its own statistics
+EWMA_MAX_DEVICES = 4096 # least recently seen devices are dropped past this
+EWMA_MIN_STD = 0.05 # std floor, as a fraction of |mean|, so constant features do not explode
+
+
+class Detector:
+    """
+    ready: whether score() can run yet (otherwise the caller collects rows for fit()).
+    fit(data): train from a block of history. score(data): scores aligned with rows.
+    observe(data, scores): learn from a scored block. close() / stats() as usual.
+    """
+    name = None
+    threshold = 0.0
+
+    @property
+    def ready(self):
+        return True
+
+    def fit(self, data):
+        pass
+
+    def score(self, data):
+        raise NotImplementedError
+
+    def observe(self, data, scores):
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {"detector": self.name}
+
+
+class ForestDetector(Detector):
+    """Saved per-device Isolation Forests; refits happen in the retrainer's worker process."""
+    name = "forest"
+
+    def __init__(self, registry, fit_model, threshold, retrainer = None):
+        self.registry = registry
+        self.fit_model = fit_model
+        self.threshold = threshold
+        self.retrainer = retrainer
+
+    @property
+    def ready(self):
+        return bool(self.registry)
+
+    def fit(self, data):
+        fitted = self.registry.fit(self.fit_model, data)
+        print(f"Trained {len(fitted)} baselines ({len(self.registry.devices())} devices) on {len(data)} rows.")
+        if self.retrainer is not None:
+            self.retrainer.last_fit = self.registry.last_fitted()
+
+    def score(self, data):
+        return self.registry.score(data)
+
+    def observe(self, data, scores):
+        if self.retrainer is not None:
+            self.retrainer.observe(data, scores)
+            self.retrainer.maybe_retrain()
+
+    def close(self):
+        if self.retrainer is not None:
+            self.retrainer.close()
+
+    def stats(self):
+        stats = {"detector": self.name, "models": self.registry.stats()}
+        if self.retrainer is not None:
+            stats["retraining"] = self.retrainer.stats()
+        return stats
+
+
+class _Moments:
+    __slots__ = ("n", "mean", "var")
+
+    def __init__(self, x):
+        self.n = 1
+        self.mean = list(x)
+        self.var = [0.0] * len(x)
+
+
+class EwmaDetector(Detector):
+    """
+    Per-device EWMA z-scores. Each row is scored against its device's statistics
+    before they are updated with it. A device still warming up is scored against
+    the statistics of all traffic. Updates use the row clipped to +-z standard
+    deviations, so one burst cannot drag the baseline toward itself.
+    """
+    name = "ewma"
+
+    def __init__(self, features, key = "src_ip", alpha = EWMA_ALPHA, z = EWMA_Z, warmup = EWMA_WARMUP,
+                 max_devices = EWMA_MAX_DEVICES):
+        self.features = list(features)
+        self.key = key
+        self.alpha = alpha
+        self.z = z
+        self.warmup = warmup
+        self.max_devices = max_devices
+        self.threshold = -z * EWMA_SCORE_SCALE
+        self._devices = OrderedDict() # device -> _Moments, least recently seen first
+        self._global = None
+        self.samples = 0
+        self.evicted = 0
+
+    def _z(self, state, x):
+        worst = 0.0
+        for value, mean, var in zip(x, state.mean, state.var):
+            std = max(math.sqrt(var), EWMA_MIN_STD * abs(mean), 1e-9)
+            z = abs(value - mean) / std
+            if z > worst:
+                worst = z
+        return worst
+
+    def _update(self, state, x):
+        alpha = self.alpha
+        limit = self.z
+        mean, var = state.mean, state.var
+        for i, value in enumerate(x):
+            std = max(math.sqrt(var[i]), EWMA_MIN_STD * abs(mean[i]), 1e-9)
+            if state.n >= self.warmup:
+                value = min(max(value, mean[i] - limit * std), mean[i] + limit * std)
+            diff = value - mean[i]
+            incr = alpha * diff
+            mean[i] += incr
+            var[i] = (1 - alpha) * (var[i] + diff * incr)
+        state.n += 1
+
+    def learn_one(self, device, x):
+        """Score one sample (-max|z| scaled, or NaN while nothing is known yet), then update with it."""
+        devices = self._devices
+        glob = self._global
+        state = devices.get(device)
+        if state is not None and state.n >= self.warmup:
+            score = -self._z(state, x) * EWMA_SCORE_SCALE
+        elif glob is not None and glob.n >= self.warmup:
+            score = -self._z(glob, x) * EWMA_SCORE_SCALE
+        else:
+            score = math.nan
+
+        if state is None:
+            if len(devices) >= self.max_devices:
+                devices.popitem(last = False)
+                self.evicted += 1
+            devices[device] = _Moments(x)
+        else:
+            devices.move_to_end(device)
+            self._update(state, x)
+        if glob is None:
+            self._global = _Moments(x)
+        else:
+            self._update(glob, x)
+        self.samples += 1
+        return score
+
+    def fit(self, data):
+        self.score(data)
+
+    def score(self, data):
+        scores = np.full(len(data), np.nan)
+        if data.empty:
+            return scores
+        learn_one = self.learn_one
+        X = data[self.features].to_numpy(dtype = float).tolist()
+        for i, (device, x) in enumerate(zip(data[self.key].tolist(), X)):
+            scores[i] = learn_one(device, x)
+        return scores
+
+    def __len__(self):
+        return len(self._devices)
+
+    def stats(self):
+        return {
+            "detector": self.name,
+            "devices": len(self._devices),
+            "samples": self.samples,
+            "evicted": self.evicted,
+        }
+
+
+DETECTORS = ("forest", "ewma")
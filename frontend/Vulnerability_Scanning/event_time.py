@@ -0,0 +1,55 @@
+# This file tracks event time for the windowed parts of the pipeline (flow
+# windows, per-IP alert cooldowns). Event time is the capture timestamp each
+# packet carries, not the clock of the machine scoring it. So a backlog, a
+# buffered batch or a full-speed pcap replay gives the same windows and alerts
+# as the live traffic did, however fast it is processed.
+#
+# A watermark is the point in event time the stream is assumed to have passed:
+# the newest timestamp seen minus an allowed lateness. Capture threads and
+# fanout workers interleave a little, so packets may arrive slightly out of
+# order. A window closes only when the watermark passes its end, and a packet
+# older than the watermark is late.
+#
+# A quiet link produces no timestamps, so the watermark could stall. idle(now)
+# lets it advance with the wall clock while no new events arrive, so windows
+# still close on time during a lull.
+
+# CONFIG
+ALLOWED_LATENESS = 1.0 # seconds a packet may trail the newest one and still count in its window
+
+
+class Watermark:
+    """observe(ts) for every event; value is the current watermark (None before the first event)."""
+
+    def __init__(self, lateness = ALLOWED_LATENESS):
+        self.lateness = lateness
+        self.max_ts = None
+        self.value = None
+        self._idle_from = None # (max_ts, wall time) when the stream was last seen idle
+
+    def observe(self, ts):
+        if self.max_ts is None or ts > self.max_ts:
+            self.max_ts = ts
+            mark = ts - self.lateness
+            if self.value is None or mark > self.value:
+                self.value = mark
+        return self.value
+
+    def is_late(self, ts):
+        return self.value is not None and ts < self.value
+
+    def idle(self, now):
+        """
+        Called periodically with the wall clock. While no newer event arrives, event
+        time is assumed to move on at wall-clock speed from the newest event.
+        """
+        if self.max_ts is None:
+            return self.value
+        if self._idle_from is None or self._idle_from[0] != self.max_ts:
+            # new events since the last call: the idle period starts now
+            self._idle_from = (self.max_ts, now)
+            return self.value
+        mark = self.max_ts + (now - self._idle_from[1]) - self.lateness
+        if mark > self.value:
+            self.value = mark
+        return self.value
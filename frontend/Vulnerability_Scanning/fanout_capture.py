@@ -0,0 +1,202 @@
+# This file spreads capture over several worker processes with PACKET_FANOUT.
+# Every worker opens its own raw/mmap capture socket in one fanout group, and
+# the kernel picks the worker for each frame. A classic BPF fanout program
+# steers on the IPv4 source address, so each worker sees all the packets of its
+# own sources and keeps their packet_frequency state locally, with no locking.
+# Workers send feature rows back in batches; the parent merges them into one
+# stream for the detector (or for packet_data.csv).
+#
+# Kernels without PACKET_FANOUT_CBPF (< 4.3) fall back to the kernel flow hash.
+# That keeps a flow on one worker, but a source talking to several peers can be
+# split, so its frequency is then counted per worker.
+
+#------------ Imports ----------
+import multiprocessing as mp
+import os
+import queue
+import signal
+import threading
+import time
+
+import network_sniffer
+from raw_capture import open_capture
+from flow_aggregator import FlowAggregator
+from capture_filter import KernelStats, SOL_PACKET, sock_fprog
+
+PACKET_FANOUT = 18
+PACKET_FANOUT_DATA = 22
+PACKET_FANOUT_HASH = 0
+PACKET_FANOUT_CBPF = 6
+
+# CONFIG
+WORKER_BATCH_ROWS = 256 # feature rows per message to the parent
+WORKER_BATCH_MS = 50 # ...or sooner if the link is quiet
+RESULT_QUEUE_BATCHES = 1024 # bounded, so a stalled parent sheds load in the workers
+STOP_TIMEOUT = 5 # seconds to wait for workers to flush on stop
+
+_DONE = "done"
+
+
+SKF_AD_PROTOCOL = 0xFFFFF000 # SKF_AD_OFF + SKF_AD_PROTOCOL: skb->protocol
+SKF_NET_OFF = 0xFFF00000 # loads relative to the network header
+
+
+def fanout_program(workers):
+    """
+    CBPF fanout selector: IPv4 source address modulo the worker count (non-IP -> 0).
+    Fanout runs before the kernel pushes the link header back on received frames,
+    so the loads are relative to the network header rather than the frame start.
+    """
+    return [
+        (0x20, 0, 0, SKF_AD_PROTOCOL),  # ld proto
+        (0x15, 0, 3, 0x0800),       # jeq #0x800            else socket 0
+        (0x20, 0, 0, SKF_NET_OFF + 12), # ld [net + 12]     IPv4 source address
+        (0x94, 0, 0, workers),      # mod #workers
+        (0x16, 0, 0, 0),            # ret a
+        (0x06, 0, 0, 0),            # ret #0
+    ]
+
+
+def join_fanout(sock, group_id, workers):
+    """Join the fanout group, steering by source IP where the kernel allows it. Returns the mode used."""
+    try:
+        sock.setsockopt(SOL_PACKET, PACKET_FANOUT, group_id | (PACKET_FANOUT_CBPF << 16))
+        fprog, code = sock_fprog(fanout_program(workers))
+        sock.setsockopt(SOL_PACKET, PACKET_FANOUT_DATA, fprog)
+        return "cbpf"
+    except OSError:
+        pass
+    sock.setsockopt(SOL_PACKET, PACKET_FANOUT, group_id | (PACKET_FANOUT_HASH << 16))
+    return "hash"
+
+
+def _worker(index, group_id, workers, backend, interface, bpf_filter, flows, results, stop_event):
+    # the parent decides when to stop (via stop_event), so Ctrl+C or a SIGTERM to the whole
+    # process group does not lose the rows this worker still holds
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    parent = os.getppid()
+    mode = []
+    capture = open_capture(
+        backend, interface, bpf_filter,
+        fanout = lambda sock: mode.append(join_fanout(sock, group_id, workers))
+    )
+    # the capture loop only checks its own stop flag, so relay the shared one (or the parent's
+    # death). Poll instead of stop_event.wait(): set() blocks on waiters, and a worker killed
+    # mid-wait would hang the parent
+    def relay_stop():
+        while not stop_event.is_set() and os.getppid() == parent:
+            time.sleep(0.2)
+        capture.stop()
+    threading.Thread(target = relay_stop, daemon = True).start()
+
+    batch = []
+    deadline = time.monotonic() + WORKER_BATCH_MS / 1000
+    sent = dropped = 0
+
+    def ship():
+        nonlocal batch, sent, dropped
+        try:
+            results.put_nowait(batch)
+            sent += len(batch)
+        except queue.Full:
+            dropped += len(batch)
+        batch = []
+
+    # source steering keeps a device's flows on one worker, so its device features are complete here
+    aggregator = FlowAggregator() if flows else None
+    try:
+        # None marks WORKER_BATCH_MS without a frame: ship what is held and close ended windows
+        for packet in capture.packets(idle_timeout = WORKER_BATCH_MS / 1000):
+            if packet is None:
+                if aggregator is not None:
+                    batch.extend(aggregator.flush_due(time.time()))
+            elif aggregator is not None:
+                batch.extend(aggregator.add(*packet))
+            else:
+                ts, src_ip, dst_ip, size = packet[:4]
+                features = network_sniffer.extract_features(src_ip, dst_ip, size, ts)
+                if features is not None:
+                    batch.append(features)
+            if len(batch) >= WORKER_BATCH_ROWS or (batch and time.monotonic() >= deadline):
+                ship()
+                deadline = time.monotonic() + WORKER_BATCH_MS / 1000
+        if aggregator is not None:
+            batch.extend(aggregator.flush())
+        if batch:
+            ship()
+    finally:
+        stats = capture.kernel_stats()
+        stats.update(worker = index, mode = mode[0] if mode else None, rows = sent, dropped = dropped)
+        results.put((_DONE, stats))
+
+
+class FanoutCapture:
+    """
+    N capture processes in one PACKET_FANOUT group; rows() yields their merged
+    feature rows (flow rows in FLOW_HEADER order when flows is set).
+    """
+
+    def __init__(self, workers, backend = "mmap", interface = None, bpf_filter = None, flows = False):
+        if backend == "scapy":
+            raise ValueError("fanout capture needs the raw or mmap backend")
+        self.workers = workers
+        self.backend = backend
+        self.interface = interface
+        self.bpf_filter = bpf_filter
+        self.flows = flows
+        self.group_id = os.getpid() & 0xFFFF
+        self.worker_stats = []
+        self._results = mp.Queue(maxsize = RESULT_QUEUE_BATCHES)
+        self._stop_event = mp.Event()
+        self._stopped_at = None
+        self._procs = []
+
+    def start(self):
+        for index in range(self.workers):
+            proc = mp.Process(
+                target = _worker,
+                args = (index, self.group_id, self.workers, self.backend, self.interface,
+                        self.bpf_filter, self.flows, self._results, self._stop_event),
+                daemon = True,
+            )
+            proc.start()
+            self._procs.append(proc)
+        return self
+
+    def stop(self):
+        self._stopped_at = time.monotonic()
+        self._stop_event.set()
+
+    def batches(self):
+        """Yield lists of feature rows until every worker has stopped and flushed."""
+        running = len(self._procs)
+        while running:
+            try:
+                item = self._results.get(timeout = 1)
+            except queue.Empty:
+                if self._stopped_at is not None and time.monotonic() - self._stopped_at > STOP_TIMEOUT:
+                    break
+                # a worker that died without reporting will never send its done marker
+                running = min(running, sum(proc.is_alive() for proc in self._procs))
+                continue
+            if isinstance(item, tuple) and item[0] == _DONE:
+                self.worker_stats.append(item[1])
+                running -= 1
+                continue
+            yield item
+        for proc in self._procs:
+            proc.join(timeout = STOP_TIMEOUT)
+
+    def rows(self):
+        for batch in self.batches():
+            yield from batch
+
+    def kernel_stats(self):
+        total = KernelStats()
+        for stats in self.worker_stats:
+            total.packets += stats.get("kernel_packets", 0)
+            total.drops += stats.get("kernel_drops", 0)
+        result = total.as_dict()
+        result["workers"] = self.worker_stats
+        return result
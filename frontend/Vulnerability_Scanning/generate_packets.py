@@ -1,23 +1,233 @@
-# This file is created to randomly generate exmaple data for ML
+# This file generates synthetic IoT traffic for load and accuracy testing.
+# Every device gets a profile (camera, speaker, hub, plug, sensor) with its own
+# packet rate and size. Labelled incidents are then injected on top:
+#   scan   one device sweeps the LAN with small SYNs to many hosts and ports
+#   flood  one device blasts a single target with full-size packets
+#   exfil  one device streams full-size packets to an outside address
+#
+# The traffic can be written as a pcap (replayed through the real sniffer and
+# pipeline by pcap_replay / benchmark_pipeline.py), or as packet_data.csv rows
+# in the sniffer's column order with frequencies computed the way the sniffer
+# computes them. The incidents go to a labels CSV alongside.
+#
+# Usage: python generate_packets.py --devices 20 --duration 300 --pcap traffic.pcap --labels labels.csv
 
-# ----Imports------
-import csv
+#------------ Imports ----------
+import argparse
+import socket
+import struct
 import time
-import random
 from datetime import datetime
 
-with open("packet_data.csv", "a", newline="") as file:
-    writer = csv.writer(file)
-    writer.writerow(["packet_size", "packet_frequency", "timestamp"])
+import numpy as np
+import pandas as pd
 
-    for i in range(50):  # simulate 50 time steps
-        packet_size = random.randint(64, 1500)
-        packet_frequency = random.randint(5, 20)
+from capture_filter import MIN_PACKET_SIZE
+from rate_tracker import RateTracker
 
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+# CONFIG
+GATEWAY = "192.168.0.1"
+DEVICE_NET = "192.168.0." # devices are .10 upwards
+CLOUD_NET = "198.51.100." # each device's usual server (TEST-NET-2)
+EXFIL_NET = "203.0.113." # where exfiltration goes (TEST-NET-3)
+WARMUP_SHARE = 0.3 # leading share of the trace kept free of incidents (detector training)
+SNAPLEN = 64 # bytes of each frame stored in the pcap; headers only, wire length is kept
 
-        writer.writerow([packet_size, packet_frequency, timestamp])
+# kind: (packets/s range, mean size range, protocol, server port)
+DEVICE_PROFILES = {
+    "camera": ((20, 60), (900, 1350), 17, 554),
+    "speaker": ((3, 15), (300, 1100), 6, 443),
+    "hub": ((1, 6), (120, 500), 6, 8883),
+    "plug": ((0.3, 2), (80, 220), 6, 443),
+    "sensor": ((0.1, 1), (64, 160), 17, 5683),
+}
 
-        time.sleep(1)  # simulate real-time data (1 sec intervals)
+# kind: (seconds, packets/s, size range, protocol)
+ANOMALY_KINDS = {
+    "scan": (5, 200, (60, 60), 6),
+    "flood": (3, 800, (1400, 1514), 17),
+    "exfil": (10, 150, (1400, 1514), 6),
+}
 
-print("Done generating realistic packet stream.")
+COLUMNS = ["ts", "src_ip", "dst_ip", "packet_size", "protocol", "src_port", "dst_port", "label", "incident"]
+CSV_HEADER = ["timestamp", "src_ip", "dst_ip", "packet_size", "packet_frequency"] # network_sniffer.CSV_HEADER
+
+
+def _packets(ts, src, dst, size, protocol, sport, dport, label = 0, incident = -1):
+    n = len(ts)
+    return pd.DataFrame({
+        "ts": ts,
+        "src_ip": np.broadcast_to(np.asarray(src, dtype = object), n),
+        "dst_ip": np.broadcast_to(np.asarray(dst, dtype = object), n),
+        "packet_size": np.broadcast_to(size, n).astype(np.int64),
+        "protocol": np.full(n, protocol, dtype = np.int64),
+        "src_port": np.broadcast_to(sport, n).astype(np.int64),
+        "dst_port": np.broadcast_to(dport, n).astype(np.int64),
+        "label": np.full(n, label, dtype = np.int64),
+        "incident": np.full(n, incident, dtype = np.int64),
+    })
+
+
+def make_devices(devices, rng):
+    """One row per device: ip, profile kind, packets/s, mean size, protocol, server port and server."""
+    kinds = list(DEVICE_PROFILES)
+    rows = []
+    for i in range(devices):
+        kind = kinds[i % len(kinds)]
+        (rate_lo, rate_hi), (size_lo, size_hi), protocol, port = DEVICE_PROFILES[kind]
+        rows.append({
+            "ip": f"{DEVICE_NET}{10 + i}",
+            "kind": kind,
+            "rate": rng.uniform(rate_lo, rate_hi),
+            "size": rng.uniform(size_lo, size_hi),
+            "protocol": protocol,
+            "port": port,
+            "server": f"{CLOUD_NET}{1 + i % 250}",
+        })
+    return pd.DataFrame(rows)
+
+
+def make_incidents(devices, incidents, duration, start, rng):
+    """Incidents spread over the trace after the warmup share, each on its own device where possible."""
+    kinds = list(ANOMALY_KINDS)
+    sources = rng.choice(len(devices), size = incidents, replace = incidents > len(devices))
+    first = start + duration * WARMUP_SHARE
+    longest = max(seconds for seconds, _, _, _ in ANOMALY_KINDS.values())
+    # evenly spaced slots with jitter, so incidents do not overlap each other's cooldowns
+    slot = (duration * (1 - WARMUP_SHARE) - longest) / max(1, incidents)
+    rows = []
+    for i in range(incidents):
+        kind = kinds[i % len(kinds)]
+        seconds = ANOMALY_KINDS[kind][0]
+        begin = first + i * slot + rng.uniform(0, max(0.0, slot - seconds))
+        rows.append({
+            "incident": i,
+            "kind": kind,
+            "src_ip": devices["ip"].iloc[sources[i]],
+            "start": begin,
+            "end": begin + seconds,
+        })
+    return pd.DataFrame(rows, columns = ["incident", "kind", "src_ip", "start", "end"])
+
+
+def make_traffic(devices = 20, duration = 300, rate = 1.0, incidents = 6, seed = 7, start = None):
+    """
+    (traffic, incidents): one packet per row in time order (COLUMNS; label 1 marks
+    injected packets, incident their incident id) and one row per incident.
+    rate scales every packet rate, background and incidents alike.
+    """
+    rng = np.random.default_rng(seed)
+    start = time.time() - duration if start is None else start
+    profiles = make_devices(devices, rng)
+    parts = []
+    for i, device in enumerate(profiles.itertuples()):
+        n = rng.poisson(device.rate * rate * duration)
+        ts = start + np.sort(rng.uniform(0, duration, n))
+        size = np.clip(rng.normal(device.size, device.size * 0.08, n), 60, 1514).round()
+        # most traffic goes to the device's server; the rest is DNS to the gateway
+        dns = rng.random(n) < 0.1
+        parts.append(_packets(ts[~dns], device.ip, device.server, size[~dns], device.protocol, 40000 + i, device.port))
+        parts.append(_packets(ts[dns], device.ip, GATEWAY, rng.integers(70, 110, int(dns.sum())), 17,
+                              50000 + i, 53))
+
+    labels = make_incidents(profiles, incidents, duration, start, rng)
+    lan = np.array([f"{DEVICE_NET}{h}" for h in range(1, 255)], dtype = object)
+    for incident in labels.itertuples():
+        seconds, pps, (size_lo, size_hi), protocol = ANOMALY_KINDS[incident.kind]
+        n = max(1, rng.poisson(pps * rate * seconds))
+        ts = incident.start + np.sort(rng.uniform(0, seconds, n))
+        size = rng.integers(size_lo, size_hi + 1, n)
+        if incident.kind == "scan":
+            dst = lan[np.arange(n) % len(lan)]
+            dport = rng.integers(1, 1025, n)
+        elif incident.kind == "flood":
+            dst, dport = GATEWAY, 80
+        else:
+            dst, dport = f"{EXFIL_NET}{7 + incident.incident % 200}", 443
+        parts.append(_packets(ts, incident.src_ip, dst, size, protocol, 45000 + incident.incident, dport,
+                              label = 1, incident = incident.incident))
+
+    traffic = pd.concat(parts, ignore_index = True)
+    traffic = traffic.sort_values("ts", kind = "mergesort", ignore_index = True)
+    labels["packets"] = traffic["incident"].value_counts().reindex(labels["incident"]).fillna(0).astype(int).to_numpy()
+    return traffic, labels
+
+
+def packet_features(traffic):
+    """The sniffer's packet rows for this traffic: frequency per source, runts left out."""
+    tracker = RateTracker()
+    frequency = [tracker.update(src, ts) for ts, src in zip(traffic["ts"].tolist(), traffic["src_ip"].tolist())]
+    rows = traffic.assign(packet_frequency = frequency)
+    return rows[rows["packet_size"].to_numpy() >= MIN_PACKET_SIZE].reset_index(drop = True)
+
+
+def write_csv(path, traffic):
+    rows = packet_features(traffic)
+    rows.insert(0, "timestamp", [datetime.fromtimestamp(ts).isoformat() for ts in rows["ts"]])
+    rows[CSV_HEADER].to_csv(path, index = False)
+    return len(rows)
+
+
+def _mac(ip):
+    return b"\x02\x00" + socket.inet_aton(ip)
+
+
+def write_pcap(path, traffic, snaplen = SNAPLEN):
+    """Ethernet/IPv4/TCP-or-UDP frames; only the headers are stored, the wire length is the packet size."""
+    pack_ip = struct.Struct("!BBHHHBBH4s4s").pack
+    pack_record = struct.Struct("<IIII").pack
+    gateway_mac = _mac(GATEWAY)
+    macs = {}
+    addrs = {}
+    with open(path, "wb") as f:
+        # pcap-savefile(5) header: microsecond timestamps, Ethernet
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, snaplen, 1))
+        for ts, src, dst, size, protocol, sport, dport in zip(
+                traffic["ts"].tolist(), traffic["src_ip"].tolist(), traffic["dst_ip"].tolist(),
+                traffic["packet_size"].tolist(), traffic["protocol"].tolist(),
+                traffic["src_port"].tolist(), traffic["dst_port"].tolist()):
+            if src not in addrs:
+                addrs[src], macs[src] = socket.inet_aton(src), _mac(src)
+            if dst not in addrs:
+                addrs[dst], macs[dst] = socket.inet_aton(dst), _mac(dst)
+            dst_mac = macs[dst] if dst.startswith(DEVICE_NET) else gateway_mac
+            if protocol == 6:
+                transport = struct.pack("!HHIIBBHHH", sport, dport, 0, 0, 0x50, 0x02, 1024, 0, 0)
+            else:
+                transport = struct.pack("!HHHH", sport, dport, max(8, size - 34), 0)
+            frame = (dst_mac + macs[src] + b"\x08\x00"
+                     + pack_ip(0x45, 0, size - 14, 0, 0, 64, protocol, 0, addrs[src], addrs[dst]) + transport)
+            frame = frame[:snaplen]
+            sec = int(ts)
+            f.write(pack_record(sec, int((ts - sec) * 1e6), len(frame), size) + frame)
+    return len(traffic)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Generate synthetic IoT traffic with labelled anomalies.")
+    parser.add_argument("--devices", type = int, default = 20, help = "Devices on the simulated LAN.")
+    parser.add_argument("--duration", type = float, default = 300, help = "Seconds of traffic.")
+    parser.add_argument("--rate", type = float, default = 1.0, help = "Multiplier on every packet rate (load).")
+    parser.add_argument("--incidents", type = int, default = 6, help = "Injected incidents (scan, flood, exfil in turn).")
+    parser.add_argument("--seed", type = int, default = 7)
+    parser.add_argument("--start", type = float, default = None,
+                        help = "Epoch seconds of the first packet (default: ending now).")
+    parser.add_argument("--csv", default = None, help = "Write sniffer rows here (default packet_data.csv if no --pcap).")
+    parser.add_argument("--pcap", default = None, help = "Write the packets as a pcap for --pcap replay.")
+    parser.add_argument("--labels", default = None, help = "Write the injected incidents here as CSV.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    traffic, labels = make_traffic(args.devices, args.duration, args.rate, args.incidents, args.seed, args.start)
+    if args.pcap:
+        write_pcap(args.pcap, traffic)
+        print(f"Wrote {len(traffic)} packets to {args.pcap}")
+    if args.csv or not args.pcap:
+        path = args.csv or "packet_data.csv"
+        print(f"Wrote {write_csv(path, traffic)} rows to {path}")
+    if args.labels:
+        labels.to_csv(args.labels, index = False)
+        print(f"Wrote {len(labels)} incidents to {args.labels}")
+    print(f"{int(traffic['label'].sum())} of {len(traffic)} packets belong to injected incidents.")
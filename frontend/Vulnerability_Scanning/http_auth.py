@@ -0,0 +1,262 @@
+#This file probes HTTP(S) logins for default credentials over one persistent
+#keep-alive connection. It first checks whether the page needs auth at all
+#(and which scheme/realm), so open pages are skipped instead of "cracked".
+
+import base64
+import hashlib
+import os
+import re
+import socket
+import ssl
+
+# CONFIG
+HTTP_TIMEOUT = 5 # seconds per request
+MAX_BODY = 1024 * 1024 # bodies past this are not worth draining, reconnect instead
+
+HTTPS_PORTS = (443, 8443)
+
+AUTH_PARAM = re.compile(r'(\w+)\s*=\s*(?:"([^"]*)"|([^,\s]*))')
+
+
+class HttpResponse:
+	def __init__(self, status, reason, headers, body):
+		self.status = status
+		self.reason = reason
+		self.headers = headers # lower-cased name -> list of values
+		self.body = body
+
+	def header(self, name, default = None):
+		values = self.headers.get(name.lower())
+		return values[-1] if values else default
+
+
+def parse_challenges(values):
+	"""Parse WWW-Authenticate header values into [(scheme, {param: value})]."""
+	challenges = []
+	for value in values or []:
+		scheme, _, rest = value.strip().partition(" ")
+		params = {}
+		for match in AUTH_PARAM.finditer(rest):
+			params[match.group(1).lower()] = match.group(2) if match.group(2) is not None else match.group(3)
+		challenges.append((scheme.lower(), params))
+	return challenges
+
+
+class HttpAuthProber:
+	"""
+	Keeps one HTTP/1.1 connection (and its TLS session, for https) open to a
+	device and reuses it for the unauthenticated probe and every credential guess.
+	"""
+
+	def __init__(self, ip, port, use_tls = None, timeout = HTTP_TIMEOUT):
+		self.ip = ip
+		self.port = port
+		self.use_tls = port in HTTPS_PORTS if use_tls is None else use_tls
+		self.timeout = timeout
+		self.connections_opened = 0
+		self._sock = None
+		self._file = None
+		self._tls_session = None
+		self._ctx = None
+		self._nonce_count = 0
+
+	def _connect(self):
+		sock = socket.create_connection((self.ip, self.port), timeout = self.timeout)
+		if self.use_tls:
+			if self._ctx is None:
+				self._ctx = ssl.create_default_context()
+				self._ctx.check_hostname = False
+				self._ctx.verify_mode = ssl.CERT_NONE
+			#resuming the previous session skips the full handshake on reconnects
+			sock = self._ctx.wrap_socket(sock, server_hostname = self.ip, session = self._tls_session)
+			self._tls_session = sock.session
+		self._sock = sock
+		self._file = sock.makefile("rb")
+		self.connections_opened += 1
+
+	def close(self):
+		for obj in (self._file, self._sock):
+			if obj is not None:
+				try:
+					obj.close()
+				except OSError:
+					pass
+		self._file = self._sock = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def _read_response(self):
+		status_line = self._file.readline(65537).decode("iso-8859-1").strip()
+		if not status_line:
+			raise ConnectionError("connection closed before response")
+		parts = status_line.split(" ", 2)
+		status = int(parts[1])
+		reason = parts[2] if len(parts) > 2 else ""
+
+		headers = {}
+		while True:
+			line = self._file.readline(65537).decode("iso-8859-1")
+			if line in ("\r\n", "\n", ""):
+				break
+			name, _, value = line.partition(":")
+			headers.setdefault(name.strip().lower(), []).append(value.strip())
+
+		body = b""
+		keep_alive = True
+		length = headers.get("content-length")
+		if "chunked" in ",".join(headers.get("transfer-encoding", [])).lower():
+			chunks = []
+			while True:
+				size = int(self._file.readline().split(b";")[0].strip() or b"0", 16)
+				if size == 0:
+					while self._file.readline() not in (b"\r\n", b"\n", b""):
+						pass
+					break
+				chunks.append(self._file.read(size))
+				self._file.readline()
+			body = b"".join(chunks)
+		elif length:
+			size = int(length[-1])
+			if size > MAX_BODY:
+				keep_alive = False
+			else:
+				body = self._file.read(size)
+		elif status not in (204, 304) and not 100 <= status < 200:
+			#no framing, the body runs until the server closes the connection
+			body = self._file.read(MAX_BODY)
+			keep_alive = False
+
+		if "close" in ",".join(headers.get("connection", [])).lower():
+			keep_alive = False
+		return HttpResponse(status, reason, headers, body), keep_alive
+
+	def request(self, path = "/", headers = None):
+		lines = [
+			f"GET {path} HTTP/1.1",
+			f"Host: {self.ip}:{self.port}",
+			"User-Agent: Vigil-IoT",
+			"Connection: keep-alive",
+		]
+		for name, value in (headers or {}).items():
+			lines.append(f"{name}: {value}")
+		raw = ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+		#a reused connection may have been idled out by the device; retry once on a fresh one
+		for attempt in range(2):
+			reused = self._sock is not None
+			if not reused:
+				self._connect()
+			try:
+				self._sock.sendall(raw)
+				response, keep_alive = self._read_response()
+			except (OSError, ConnectionError, ValueError):
+				self.close()
+				if reused and attempt == 0:
+					continue
+				raise
+			if not keep_alive:
+				self.close()
+			return response
+
+	def detect(self, path = "/"):
+		"""Unauthenticated probe: does this page need auth, and with which scheme/realm?"""
+		response = self.request(path)
+		challenges = parse_challenges(response.headers.get("www-authenticate"))
+		info = {
+			"status": response.status,
+			"auth_required": response.status == 401 and bool(challenges),
+			"scheme": None,
+			"realm": None,
+			"challenge": None,
+		}
+		for scheme, params in challenges:
+			if scheme in ("basic", "digest"):
+				info.update(scheme = scheme, realm = params.get("realm"), challenge = params)
+				break
+		else:
+			if challenges:
+				info.update(scheme = challenges[0][0], realm = challenges[0][1].get("realm"))
+		return info
+
+	def _digest_header(self, user, pwd, params, path):
+		algorithm = params.get("algorithm", "MD5")
+		hash_fn = hashlib.sha256 if algorithm.upper().startswith("SHA-256") else hashlib.md5
+		h = lambda s: hash_fn(s.encode()).hexdigest()
+
+		realm = params.get("realm", "")
+		nonce = params.get("nonce", "")
+		ha1 = h(f"{user}:{realm}:{pwd}")
+		if algorithm.lower().endswith("-sess"):
+			cnonce_sess = os.urandom(8).hex()
+			ha1 = h(f"{ha1}:{nonce}:{cnonce_sess}")
+		ha2 = h(f"GET:{path}")
+
+		fields = [
+			f'username="{user}"', f'realm="{realm}"', f'nonce="{nonce}"',
+			f'uri="{path}"', f"algorithm={algorithm}",
+		]
+		if "auth" in [q.strip() for q in params.get("qop", "").split(",")]:
+			self._nonce_count += 1
+			nc = f"{self._nonce_count:08x}"
+			cnonce = os.urandom(8).hex()
+			response = h(f"{ha1}:{nonce}:{nc}:{cnonce}:auth:{ha2}")
+			fields += ["qop=auth", f"nc={nc}", f'cnonce="{cnonce}"']
+		else:
+			response = h(f"{ha1}:{nonce}:{ha2}")
+		fields.append(f'response="{response}"')
+		if params.get("opaque"):
+			fields.append(f'opaque="{params["opaque"]}"')
+		return "Digest " + ", ".join(fields)
+
+	def try_credentials(self, user, pwd, auth, path = "/"):
+		"""Returns (accepted, auth) where auth may carry a refreshed digest challenge."""
+		if auth["scheme"] == "basic":
+			token = base64.b64encode(f"{user}:{pwd}".encode()).decode()
+			header = f"Basic {token}"
+		else:
+			header = self._digest_header(user, pwd, auth["challenge"], path)
+
+		response = self.request(path, {"Authorization": header})
+		if response.status == 401:
+			#digest servers hand out a fresh nonce with each rejection
+			for scheme, params in parse_challenges(response.headers.get("www-authenticate")):
+				if scheme == auth["scheme"]:
+					auth = dict(auth, challenge = params)
+					break
+			return False, auth
+		return response.status < 400, auth
+
+
+def probe_http_credentials(ip, port, credentials, service = "http", path = "/", timeout = HTTP_TIMEOUT):
+	"""Detect auth once, then try each credential pair over the same connection."""
+	base = {"service": service, "port": port}
+	with HttpAuthProber(ip, port, use_tls = True if service.startswith("https") else None, timeout = timeout) as prober:
+		try:
+			auth = prober.detect(path)
+		except (OSError, ConnectionError, ValueError):
+			return dict(base, result = "connection_failed")
+
+		if not auth["auth_required"]:
+			return dict(base, result = "no_auth_required", status = auth["status"])
+		if auth["scheme"] not in ("basic", "digest"):
+			return dict(base, result = "unsupported_auth_scheme", scheme = auth["scheme"], realm = auth["realm"])
+
+		base.update(scheme = auth["scheme"], realm = auth["realm"])
+		for user, pwd in credentials:
+			try:
+				accepted, auth = prober.try_credentials(user, pwd, auth, path)
+			except (OSError, ConnectionError, ValueError):
+				return dict(base, result = "connection_failed", connections = prober.connections_opened)
+			if accepted:
+				return dict(
+					base,
+					weak_credential = (user, pwd),
+					result = "login_success",
+					connections = prober.connections_opened
+				)
+
+		return dict(base, result = "no_weak_credentials", connections = prober.connections_opened)
@@ -1,3 +1,35 @@
+#This file explains anomalies for the JSON report.
+#
+#An explanation depends on the bucket an alert falls in (score band, packet size
+#band, frequency band and source device), not on its exact numbers, so alerts
+#in the same bucket share one. Explanations are cached on disk (least recently
+#used entries go first, and each expires after CACHE_TTL), and every cache miss
+#of a report goes to the backend in one batch. So a report costs at most one
+#backend request, however many anomalies it covers.
+#
+#The backend is swappable with set_backend(): anything with a name and an
+#explain(items) method that returns one explanation dict per item. The default
+#FallbackBackend is local and rule-based, so it doubles as the stand-in for tests.
+
+import json
+import os
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CACHE_FILE = os.path.join(BASE_DIR, "explanation_cache.json")
+
+# CONFIG
+CACHE_TTL = 7 * 24 * 60 * 60 # seconds before a cached explanation is asked for again
+CACHE_MAX_ENTRIES = 4096 # least recently used explanations are dropped past this
+SCORE_BANDS = (-0.3, -0.2, -0.15, -0.1, -0.05, 0.0) # band edges; -0.2 / -0.1 / -0.05 are the severity cut-offs
+SIZE_BANDS = (128, 512, 1024, 1500) # bytes
+FREQUENCY_BANDS = (1, 10, 50, 200, 1000) # packets/s
+
+EXPLANATION_FIELDS = ("severity", "description", "impact", "recommendation")
+
+
 def fallback_analysis(packet_size, packet_frequency, score):
 	if score < -0.2:
 		return {
@@ -21,12 +53,159 @@ def fallback_analysis(packet_size, packet_frequency, score):
 			"recommendation": "Monitor device for further anomalies."
 		}
 
-def analyze_anomaly(packet_size, packet_frequency, score):
-	
-	return fallback_analysis(packet_size, packet_frequency, score)
-	
-	
-	
-		
-	
-			
+
+def explanation_key(packet_size, packet_frequency, score, device = None):
+	"""The bucket an alert falls in; alerts with the same key share an explanation."""
+	return "|".join((
+		str(device or "*"),
+		f"s{bisect_right(SCORE_BANDS, float(score))}",
+		f"z{bisect_right(SIZE_BANDS, float(packet_size))}",
+		f"f{bisect_right(FREQUENCY_BANDS, float(packet_frequency))}",
+	))
+
+
+class FallbackBackend:
+	"""Rule-based explanations computed locally; no model, no network."""
+
+	name = "fallback"
+
+	def explain(self, items):
+		return [fallback_analysis(item["packet_size"], item["packet_frequency"], item["score"]) for item in items]
+
+
+class ExplanationCache:
+	"""JSON-backed LRU of explanations keyed on backend and bucket, with a TTL per entry."""
+
+	def __init__(self, path = CACHE_FILE, ttl = CACHE_TTL, max_entries = CACHE_MAX_ENTRIES):
+		self.path = path
+		self.ttl = ttl
+		self.max_entries = max_entries
+		self.entries = OrderedDict() # least recently used first
+		self.dirty = False
+		self._load()
+
+	def _load(self):
+		if not self.path or not os.path.exists(self.path):
+			return
+		try:
+			with open(self.path, "r") as f:
+				self.entries = OrderedDict(json.load(f))
+		except (OSError, ValueError) as e:
+			print(f"[WARN] Ignoring unreadable explanation cache: {e}")
+			self.entries = OrderedDict()
+
+	def get(self, key, now = None):
+		entry = self.entries.get(key)
+		if not entry:
+			return None
+		now = time.time() if now is None else now
+		if now - entry.get("cached_at", 0) > self.ttl:
+			del self.entries[key]
+			self.dirty = True
+			return None
+		# recency alone is not worth a rewrite; it is saved with the next put or expiry
+		self.entries.move_to_end(key)
+		return entry["explanation"]
+
+	def put(self, key, explanation, now = None):
+		self.entries[key] = {
+			"cached_at": time.time() if now is None else now,
+			"explanation": explanation,
+		}
+		self.entries.move_to_end(key)
+		while len(self.entries) > self.max_entries:
+			self.entries.popitem(last = False)
+		self.dirty = True
+
+	def save(self):
+		if not self.dirty or not self.path:
+			return
+		now = time.time()
+		self.entries = OrderedDict((k, v) for k, v in self.entries.items() if now - v.get("cached_at", 0) <= self.ttl)
+		tmp_path = self.path + ".tmp"
+		with open(tmp_path, "w") as f:
+			json.dump(self.entries, f)
+		os.replace(tmp_path, self.path)
+		self.dirty = False
+
+
+_backend = FallbackBackend()
+_default_cache = None
+
+def set_backend(backend):
+	"""Swap the explanation backend; returns the previous one so tests can restore it."""
+	global _backend
+	previous, _backend = _backend, backend
+	return previous
+
+def get_default_cache():
+	global _default_cache
+	if _default_cache is None:
+		_default_cache = ExplanationCache()
+	return _default_cache
+
+def set_default_cache(cache):
+	global _default_cache
+	_default_cache = cache
+
+
+def _valid(explanation):
+	return isinstance(explanation, dict) and all(field in explanation for field in EXPLANATION_FIELDS)
+
+
+def explain_many(items, backend = None, cache = None):
+	"""
+	One explanation per (packet_size, packet_frequency, score, device) item, in order.
+	Cached buckets are answered from the cache; the rest go to the backend together,
+	one representative item per bucket.
+	"""
+	backend = _backend if backend is None else backend
+	cache = get_default_cache() if cache is None else cache
+
+	keys = []
+	found = {}
+	missing = OrderedDict() # key -> representative item
+	for packet_size, packet_frequency, score, device in items:
+		key = f"{backend.name}|{explanation_key(packet_size, packet_frequency, score, device)}"
+		keys.append(key)
+		if key in found or key in missing:
+			continue
+		cached = cache.get(key)
+		if cached is not None:
+			found[key] = cached
+		else:
+			missing[key] = {
+				"packet_size": packet_size,
+				"packet_frequency": packet_frequency,
+				"score": score,
+				"device": device,
+			}
+
+	if missing:
+		batch = list(missing.values())
+		try:
+			explained = list(backend.explain(batch))
+		except Exception as e:
+			print(f"[WARN] Explanation backend {backend.name} failed, using fallback: {e}")
+			explained = []
+		if len(explained) != len(batch):
+			explained = [None] * len(batch)
+		for (key, item), explanation in zip(missing.items(), explained):
+			if _valid(explanation):
+				cache.put(key, explanation)
+			else:
+				# not cached, so the next report asks the backend again
+				explanation = fallback_analysis(item["packet_size"], item["packet_frequency"], item["score"])
+			found[key] = explanation
+
+	try:
+		cache.save()
+	except OSError as e:
+		print(f"[WARN] Could not save explanation cache: {e}")
+
+	# copies, so a caller editing its finding cannot change the cached entry
+	return [dict(found[key]) for key in keys]
+
+
+def analyze_anomaly(packet_size, packet_frequency, score, device = None):
+	return explain_many([(packet_size, packet_frequency, score, device)])[0]
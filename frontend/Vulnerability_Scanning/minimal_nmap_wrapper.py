@@ -2,6 +2,12 @@ import nmap
 from pprint import pprint
 import socket
 import re
+import xml.etree.ElementTree as ET
+
+try:
+	from deviceDiscovery.rate_governor import get_governor
+except ImportError:
+	get_governor = None
 
 COMMON_TCP_PORTS = [22, 23, 80, 443, 554, 502, 8080, 8443, 8000]
 
@@ -10,6 +16,20 @@ COMMON_UDP_PORTS = [53, 67, 68, 123, 161, 1900, 5353, 5683, 47808]
 def is_valid_ip(ip):
 	return bool(re.match(r"^(?:[0-9]{1,3}\.){3}[0-9]{1,3}$", ip)) and all(0 <= int(part) <= 255 for part in ip.split('.'))
 
+def host_srtt(nm, ip):
+	"""nmap's smoothed RTT for ip in seconds, from the <times> element of the last scan's XML."""
+	try:
+		root = ET.fromstring(nm.get_nmap_last_output())
+	except (ET.ParseError, TypeError, ValueError):
+		return None
+	for host in root.iter("host"):
+		if any(address.get("addr") == ip for address in host.iter("address")):
+			times = host.find("times")
+			if times is None or not times.get("srtt", "").isdigit():
+				return None
+			return int(times.get("srtt")) / 1e6 #microseconds
+	return None
+
 def is_valid_port(port):
 	try:
 		port = int(port)
@@ -18,8 +38,25 @@ def is_valid_port(port):
 		return False
 
 class NmapScanner:
-	def __init__(self):
-		pass
+	def __init__(self, governor = None):
+		#per-device timing comes from the shared rate governor; plain -T2 if it is not importable
+		if governor is None and get_governor is not None:
+			governor = get_governor()
+		self.governor = governor
+
+	def _timing_args(self, ip):
+		if self.governor is None:
+			return "-T2"
+		return self.governor.nmap_timing_args(ip)
+
+	def _record(self, ip, entries, lossy_states, nm = None):
+		#a host that vanished, or whose every port timed out, is treated as loss
+		if self.governor is None:
+			return
+		ok = bool(entries) and any(e.get("state") not in lossy_states for e in entries)
+		#nmap's own RTT estimate, so hosts the ARP sweep missed still get a measured timeout
+		rtt = host_srtt(nm, ip) if nm is not None and ok else None
+		self.governor.record(ip, rtt = rtt, ok = ok)
 		
 	def minimal_tcp_scan(self, ip, ports = None, use_syn = False):
 		if ports is None:
@@ -55,13 +92,14 @@ class NmapScanner:
 		
 		nm = nmap.PortScanner()
 		scan_flag = "-sS" if use_syn else "-sT"
-		args = f"{scan_flag} -p {','.join(map(str, ports))} -Pn -T2" #-p {ports}
+		args = f"{scan_flag} -p {','.join(map(str, ports))} -Pn {self._timing_args(ip)}" #-p {ports}
 		print("Running nmap:", args, "on", ip)
 		
 		try:
 			nm.scan(hosts = ip, arguments = args)
 		except Exception as e:
 			print(f"Error scanning {ip}:{e}")
+			self._record(ip, [], ())
 			return {}
 			
 		results = {}
@@ -76,6 +114,7 @@ class NmapScanner:
 						"state": p.get("state"),
 						"service": p.get("name")
 					})
+		self._record(ip, results.get(ip, []), ("filtered",), nm)
 		return results
 	
 	def minimal_udp_scan(self, ip, ports = None):
@@ -106,12 +145,13 @@ class NmapScanner:
 		
 		nm = nmap.PortScanner()
 		scan_flag = "-sU"
-		args = f"{scan_flag} -p {','.join(map(str, ports))} -Pn -T2" 
+		args = f"{scan_flag} -p {','.join(map(str, ports))} -Pn {self._timing_args(ip)}" 
 		print("Running nmap:", args, "on", ip)
 		try:
 			nm.scan(hosts = ip, arguments = args)
 		except Exception as e:
 			print(f"Error scanning {ip}: {e}")
+			self._record(ip, [], ())
 			return {}
 			
 		results = {}
@@ -126,6 +166,7 @@ class NmapScanner:
 						"state": p.get("state"),
 						"service": p.get("name")
 					})
+		self._record(ip, results.get(ip, []), (), nm)
 		return results
 	
 if __name__ == "__main__":
@@ -0,0 +1,206 @@
+# This file keeps one fitted baseline (scaler + Isolation Forest) per device.
+# Every source IP with enough history gets its own model, so a chatty device
+# cannot drown out the baseline of a quiet one. Sources with too little history
+# are scored by a shared fallback model fit on all traffic.
+#
+# Models are saved under models/<kind>/ as versioned joblib files:
+#   manifest.json                   device -> {version, file, rows, fitted_at}
+#   192.168.0.12.v3.joblib          (scaler, model) for that device
+# A new version is written next to the old ones, then the manifest is replaced
+# atomically, so a reader never sees a half-written model. Older versions past
+# KEEP_VERSIONS are removed. Loading reads only the manifest; each device's
+# model is unpickled the first time that device is scored. reload(preload=True)
+# unpickles changed models before swapping the manifest in, which is how a model
+# refit by another process is picked up without stalling the scorer.
+
+#------------ Imports ----------
+import json
+import os
+import re
+import threading
+import time
+
+import joblib
+import numpy as np
+
+# CONFIG
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+HISTORY_ROWS = 2000 # most recent rows per device used to fit its baseline
+MIN_DEVICE_ROWS = 50 # fewer rows than this -> the device is scored by the fallback model
+KEEP_VERSIONS = 3 # model files kept per device
+
+FALLBACK = "*" # manifest key of the shared model
+MANIFEST = "manifest.json"
+
+_unsafe = re.compile(r"[^A-Za-z0-9._-]")
+
+
+def _file_stem(device):
+    return "_fallback" if device == FALLBACK else _unsafe.sub("_", str(device))
+
+
+class ModelRegistry:
+    """
+    fit(fit_model, data) trains and saves every device's baseline; score(data)
+    then only runs decision_function, picking the model by the key column.
+    fit_model(train_rows, features) -> (scaler, model) is supplied by the caller,
+    so the registry does not fix the estimator or its parameters.
+    """
+
+    def __init__(self, kind, features, key = "src_ip", root = MODEL_DIR):
+        self.kind = kind
+        self.features = list(features)
+        self.key = key
+        self.path = os.path.join(root, kind)
+        self._lock = threading.Lock()
+        self._manifest = {}
+        self._loaded = {} # (device, version) -> (scaler, model)
+        self.loads = 0
+
+    # --------- manifest ----------
+    @classmethod
+    def load(cls, kind, features, key = "src_ip", root = MODEL_DIR):
+        """Registry with the saved manifest read; no model file is opened yet."""
+        registry = cls(kind, features, key, root)
+        registry.reload()
+        return registry
+
+    def reload(self, preload = False):
+        """
+        Re-read the manifest. Changed models are unpickled on next use, or, with
+        preload, before the new manifest replaces the old one (scoring keeps using
+        the old models until then). Returns the devices whose version changed.
+        """
+        try:
+            with open(os.path.join(self.path, MANIFEST)) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        if saved.get("features", self.features) != self.features:
+            # trained on other columns: unusable, refit instead of mis-scoring
+            saved = {}
+        devices = saved.get("devices", {})
+        changed = [device for device, entry in devices.items()
+                   if entry["version"] != self._manifest.get(device, {}).get("version")]
+        if preload:
+            for device in changed:
+                self._load(device, devices[device])
+        with self._lock:
+            self._manifest = devices
+            self._loaded = {key: pair for key, pair in self._loaded.items()
+                            if key[0] in devices and key[1] == devices[key[0]]["version"]}
+        return changed
+
+    def _write_manifest(self, devices):
+        tmp = os.path.join(self.path, MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"kind": self.kind, "features": self.features, "devices": devices}, f, indent = 2)
+        os.replace(tmp, os.path.join(self.path, MANIFEST))
+
+    def __bool__(self):
+        return bool(self._manifest)
+
+    def __len__(self):
+        return len(self._manifest)
+
+    def devices(self):
+        return [device for device in self._manifest if device != FALLBACK]
+
+    def last_fitted(self):
+        """Unix time of the newest saved model, 0 if none."""
+        return max((entry["fitted_at"] for entry in self._manifest.values()), default = 0.0)
+
+    def version(self, device):
+        entry = self._manifest.get(device)
+        return entry["version"] if entry else 0
+
+    # --------- saving ----------
+    def publish(self, fitted):
+        """
+        Save {device: (scaler, model, rows)} as new versions and swap them into the
+        manifest in one replace. Devices not in fitted keep their current model.
+        """
+        os.makedirs(self.path, exist_ok = True)
+        with self._lock:
+            devices = dict(self._manifest)
+        now = time.time()
+        stale = []
+        for device, (scaler, model, rows) in fitted.items():
+            version = devices.get(device, {}).get("version", 0) + 1
+            name = f"{_file_stem(device)}.v{version}.joblib"
+            joblib.dump((scaler, model), os.path.join(self.path, name))
+            devices[device] = {"version": version, "file": name, "rows": int(rows), "fitted_at": now}
+            if version > KEEP_VERSIONS:
+                stale.append(f"{_file_stem(device)}.v{version - KEEP_VERSIONS}.joblib")
+        with self._lock:
+            for device, (scaler, model, rows) in fitted.items():
+                self._loaded[device, devices[device]["version"]] = (scaler, model)
+        self._write_manifest(devices)
+        with self._lock:
+            self._manifest = devices
+        for name in stale:
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+        return devices
+
+    def fit(self, fit_model, data, history_rows = HISTORY_ROWS, min_rows = MIN_DEVICE_ROWS, fallback = None):
+        """
+        Fit every device with at least min_rows rows, plus the fallback (on the tail
+        of data, or on the fallback rows if given), then publish them.
+        """
+        fitted = {}
+        fallback = data if fallback is None else fallback
+        if len(fallback) >= 2:
+            train = fallback.iloc[-history_rows:]
+            fitted[FALLBACK] = fit_model(train, self.features) + (len(train),)
+        for device, rows in data.groupby(self.key, sort = False):
+            if len(rows) >= min_rows:
+                train = rows.iloc[-history_rows:]
+                fitted[device] = fit_model(train, self.features) + (len(train),)
+        if fitted:
+            self.publish(fitted)
+        return fitted
+
+    # --------- scoring ----------
+    def get(self, device):
+        """(scaler, model) for device, its fallback, or None; loads from disk on first use."""
+        entry = self._manifest.get(device)
+        if entry is None:
+            if device == FALLBACK:
+                return None
+            return self.get(FALLBACK)
+        pair = self._loaded.get((device, entry["version"]))
+        if pair is None:
+            pair = self._load(device, entry)
+        return pair
+
+    def _load(self, device, entry):
+        pair = tuple(joblib.load(os.path.join(self.path, entry["file"])))
+        with self._lock:
+            self._loaded[device, entry["version"]] = pair
+        self.loads += 1
+        return pair
+
+    def score(self, data):
+        """Decision scores aligned with data's rows; NaN where no model covers the device."""
+        scores = np.full(len(data), np.nan)
+        if data.empty:
+            return scores
+        X = data[self.features].to_numpy(dtype = float)
+        for device, positions in data.groupby(self.key, sort = False).indices.items():
+            pair = self.get(device)
+            if pair is not None:
+                scaler, model = pair
+                scores[positions] = model.decision_function(scaler.transform(X[positions]))
+        return scores
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "devices": len(self.devices()),
+            "fallback": FALLBACK in self._manifest,
+            "loaded": len(self._loaded),
+            "loads": self.loads,
+        }
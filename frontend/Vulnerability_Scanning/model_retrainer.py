@@ -0,0 +1,216 @@
+# This file keeps the saved per-device baselines current while the detector runs.
+# Rows scored as normal go into a per-device reservoir sample, so anomalies are
+# never trained on and memory stays fixed however long the capture runs. A refit
+# is due every RETRAIN_SECONDS, or sooner when a device drifts, meaning the mean
+# of its recent features moves more than DRIFT_Z training standard deviations
+# away from what its model was fit on.
+#
+# The fit runs in a separate low-priority process. It writes the new versions
+# and manifest through ModelRegistry.publish. The scoring side then calls
+# reload(preload=True): new models are unpickled first, then the manifest is
+# swapped in one assignment. A batch is scored wholly by the old models or
+# wholly by the new ones, and no fit ever runs on the scoring thread.
+
+#------------ Imports ----------
+import multiprocessing as mp
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from model_registry import FALLBACK, MIN_DEVICE_ROWS, ModelRegistry
+
+# CONFIG
+RETRAIN_SECONDS = 600 # scheduled refit interval
+DRIFT_MIN_SECONDS = 60 # a drifted device waits at least this long after the last fit
+RESERVOIR_ROWS = 2000 # normal rows sampled per device between fits
+MAX_RESERVOIR_DEVICES = 1024 # devices sampled; later ones only feed the fallback sample
+DRIFT_Z = 2.0 # mean shift, in training standard deviations, that counts as drift
+DRIFT_ALPHA = 0.05 # EWMA weight of each new batch in the drift estimate
+WORKER_NICE = 10 # keep the fit off the capture and scoring cores' priority
+
+
+class Reservoir:
+    """Uniform sample (Algorithm R) of at most capacity rows out of everything add()ed."""
+    __slots__ = ("capacity", "rows", "seen")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.rows = []
+        self.seen = 0
+
+    def add(self, rows):
+        for row in rows:
+            self.seen += 1
+            if len(self.rows) < self.capacity:
+                self.rows.append(row)
+            else:
+                slot = random.randrange(self.seen)
+                if slot < self.capacity:
+                    self.rows[slot] = row
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def _fit_job(kind, features, key, root, fit_model, data, fallback):
+    # runs in the worker process; publish() writes the new versions and swaps the manifest
+    registry = ModelRegistry.load(kind, features, key, root)
+    fitted = registry.fit(fit_model, data, min_rows = MIN_DEVICE_ROWS, fallback = fallback)
+    return sorted(fitted, key = str)
+
+
+def _lower_priority():
+    try:
+        os.nice(WORKER_NICE)
+    except OSError:
+        pass
+
+
+class Retrainer:
+    """
+    observe() every scored block; maybe_retrain() starts a background fit when one
+    is due, and the fitted models are swapped into the registry as soon as it ends.
+    close() waits for a running fit.
+    """
+
+    def __init__(self, registry, fit_model, threshold, interval = RETRAIN_SECONDS,
+                 reservoir_rows = RESERVOIR_ROWS, drift_z = DRIFT_Z):
+        self.registry = registry
+        self.fit_model = fit_model
+        self.threshold = threshold
+        self.interval = interval
+        self.reservoir_rows = reservoir_rows
+        self.drift_z = drift_z
+
+        self._reservoirs = {}
+        self._fallback = Reservoir(reservoir_rows)
+        self._drift = {} # device -> EWMA of its standardized feature means
+        self.drifted = set()
+        self.last_fit = registry.last_fitted()
+        self._pool = None
+        self._job = None
+        self._lock = threading.RLock() # the done callback runs inline if the fit already finished
+
+        self.fits = 0
+        self.failed_fits = 0
+        self.swapped_devices = 0
+        self.last_fit_seconds = 0.0
+
+    # --------- sampling ----------
+    def observe(self, data, scores):
+        """Sample the rows scored normal and update each device's drift estimate."""
+        scored = ~np.isnan(scores)
+        normal = data[scored & (scores >= self.threshold)]
+        if normal.empty:
+            return
+        registry = self.registry
+        features = registry.features
+        X = normal[features].to_numpy(dtype = float)
+        for device, positions in normal.groupby(registry.key, sort = False).indices.items():
+            rows = [(device,) + tuple(x) for x in X[positions]]
+            self._fallback.add(rows)
+            reservoir = self._reservoirs.get(device)
+            if reservoir is None and len(self._reservoirs) < MAX_RESERVOIR_DEVICES:
+                reservoir = self._reservoirs[device] = Reservoir(self.reservoir_rows)
+            if reservoir is not None:
+                reservoir.add(rows)
+
+            pair = registry.get(device)
+            if pair is None:
+                continue
+            scaler = pair[0]
+            shift = (X[positions].mean(axis = 0) - scaler.mean_) / scaler.scale_
+            drift = self._drift.get(device)
+            drift = shift if drift is None else drift + DRIFT_ALPHA * (shift - drift)
+            self._drift[device] = drift
+            if np.abs(drift).max() > self.drift_z:
+                self.drifted.add(device)
+
+    def _training_rows(self):
+        """(device rows, fallback rows) as DataFrames; devices short of MIN_DEVICE_ROWS keep their model."""
+        columns = [self.registry.key] + self.registry.features
+        rows = []
+        for reservoir in self._reservoirs.values():
+            if len(reservoir) >= MIN_DEVICE_ROWS:
+                rows.extend(reservoir.rows)
+        return pd.DataFrame(rows, columns = columns), pd.DataFrame(self._fallback.rows, columns = columns)
+
+    # --------- scheduling ----------
+    def due(self, now = None):
+        now = time.time() if now is None else now
+        if not self._fallback.seen:
+            return False
+        if now - self.last_fit >= self.interval:
+            return True
+        return bool(self.drifted) and now - self.last_fit >= DRIFT_MIN_SECONDS
+
+    def maybe_retrain(self, now = None):
+        """Start a background fit if one is due and none is running. Returns True if it started."""
+        with self._lock:
+            if self._job is not None or not self.due(now):
+                return False
+            data, fallback = self._training_rows()
+            if self._pool is None:
+                # spawn, not fork: the capture and detector threads may hold locks at fork time
+                self._pool = ProcessPoolExecutor(max_workers = 1, mp_context = mp.get_context("spawn"),
+                                                 initializer = _lower_priority)
+            registry = self.registry
+            reason = "drift: " + ", ".join(sorted(map(str, self.drifted))) if self.drifted else "schedule"
+            print(f"Retraining {registry.kind} baselines on {len(data)} + {len(fallback)} normal rows ({reason})...")
+            # the reservoirs restart, so the next fit sees only traffic since this one
+            self._reservoirs = {}
+            self._fallback = Reservoir(self.reservoir_rows)
+            self.drifted = set()
+            self.last_fit = time.time() if now is None else now
+            started = time.monotonic()
+            self._job = self._pool.submit(_fit_job, registry.kind, registry.features, registry.key,
+                                          os.path.dirname(registry.path), self.fit_model, data, fallback)
+            self._job.add_done_callback(lambda job: self._swap(job, started))
+            return True
+
+    def _swap(self, job, started):
+        # runs on the pool's callback thread, so unpickling the new models never blocks scoring
+        try:
+            job.result()
+        except Exception as exc:
+            self.failed_fits += 1
+            print(f"Background retrain failed: {exc!r}")
+        else:
+            changed = self.registry.reload(preload = True)
+            for device in changed:
+                self._drift.pop(device, None)
+            if FALLBACK in changed:
+                self._drift.clear()
+            self.fits += 1
+            self.swapped_devices += len(changed)
+        self.last_fit_seconds = time.monotonic() - started
+        with self._lock:
+            self._job = None
+
+    def close(self, wait = True):
+        """Let a running fit finish (and swap in) before shutting the worker down."""
+        job = self._job
+        if job is not None and wait:
+            try:
+                job.result()
+            except Exception:
+                pass
+        if self._pool is not None:
+            self._pool.shutdown(wait = wait)
+            self._pool = None
+
+    def stats(self):
+        return {
+            "fits": self.fits,
+            "failed_fits": self.failed_fits,
+            "swapped_devices": self.swapped_devices,
+            "last_fit_seconds": round(self.last_fit_seconds, 3),
+            "running": self._job is not None,
+            "sampled_devices": len(self._reservoirs),
+            "drifted": len(self.drifted),
+        }
@@ -4,40 +4,84 @@
 #
 # This file is to detect real data from a network to feed ML model to anoamly detection
 
-from scapy.all import sniff, IP
+from scapy.all import sniff, IP, conf
 from datetime import datetime
+import argparse
 import csv
 import os
 import time
 import socket
-from collections import defaultdict, deque
+import sys
+
+from record_writer import RecordWriter, install_signal_handlers
+from packet_store import STORE_DIR, PacketStore
+from shm_ring import SharedRing
+from rate_tracker import RateTracker
+from flow_aggregator import FLOW_HEADER, FLOW_WINDOW, FlowAggregator
+from raw_capture import BACKENDS, open_capture
+from pcap_replay import open_replay
+from capture_filter import DEFAULT_PROFILE, FILTER_PROFILES, attach_filter, build_expression, compile_filter
 
 
 CSV_FILE = "packet_data.csv"
+FLOW_CSV_FILE = "flow_data.csv"
+
+CSV_HEADER = [
+    "timestamp", 
+    "src_ip", 
+    "dst_ip", 
+    "packet_size", 
+    "packet_frequency"
+]
+
+# buffered writer: the file stays open and rows are flushed in batches
+csv_writer = None
 
 # create file if needed
-if not os.path.exists(CSV_FILE):
-    with open(CSV_FILE, "w", newline = "") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "timestamp", 
-            "src_ip", 
-            "dst_ip", 
-            "packet_size", 
-            "packet_frequency"
-        ])
+def init_csv():
+    global csv_writer
+    if csv_writer is None:
+        csv_writer = RecordWriter(CSV_FILE, CSV_HEADER)
+    return csv_writer
         
+# flow mode: packets are aggregated per 5-tuple and written one row per flow per window
+flow_aggregator = None
+flow_writer = None
+FLOW_IDLE_CHECK = 1.0 # seconds without a packet before ended windows are closed anyway
+
+def init_flow_csv(window = FLOW_WINDOW):
+    global flow_aggregator, flow_writer
+    if flow_aggregator is None:
+        flow_aggregator = FlowAggregator(window)
+        flow_writer = RecordWriter(FLOW_CSV_FILE, FLOW_HEADER)
+    return flow_writer
+
+# columnar store: typed rows appended into memory-mapped segments, with retention
+packet_store = None
+
+def init_store():
+    global packet_store
+    if packet_store is None:
+        packet_store = PacketStore(STORE_DIR)
+    return packet_store
+
+# live channel to a detector in another process (streaming_pipeline.py --ring NAME)
+feature_ring = None
+
+def init_ring(name):
+    global feature_ring
+    if feature_ring is None:
+        feature_ring = SharedRing.attach(name)
+    return feature_ring
+
 def save_to_csv(timestamp, src_ip, dst_ip, packet_size, packet_frequency):
-    with open(CSV_FILE, "a", newline = "") as f:
-        writer = csv.writer(f)
-        
-        writer.writerow([
-            timestamp,
-            src_ip,
-            dst_ip,
-            packet_size,
-            packet_frequency
-        ])
+    (csv_writer or init_csv()).write([
+        timestamp,
+        src_ip,
+        dst_ip,
+        packet_size,
+        packet_frequency
+    ])
 
 def get_hostname(ip):
     try:
@@ -45,34 +89,48 @@ def get_hostname(ip):
     except:
         return None
         
-# Store recent packet timestamps per IP
-packet_times = defaultdict(deque)
-
 # window size in seconds for frequency calculation
 TIME_WINDOW = 10
 
-def process_packet(packet):
-    if not packet.haslayer(IP):
-        return
-        
-    ip_layer = packet[IP]
-    
-    src_ip = ip_layer.src
-    dst_ip = ip_layer.dst
-    packet_size = len(packet)
-    
-    now = time.time() # for math
-    timestamp = datetime.now().isoformat() # for csv
-    
-    # track packet times for frequency
-    packet_times[src_ip].append(now)
+# Per-IP packet counts in 1s buckets over the window; idle IPs are evicted and
+# the table is capped, so spoofed-source floods cannot exhaust memory
+rate_tracker = RateTracker(window = TIME_WINDOW)
+
+# smaller packets still count toward frequency but are not recorded
+MIN_PACKET_SIZE = 60
+
+def update_frequency(src_ip, now):
+    return rate_tracker.update(src_ip, now)
+
+def extract_features(src_ip, dst_ip, packet_size, now):
+    """Feature row (now, src, dst, size, frequency) for one packet, or None if it is filtered out."""
+    frequency = update_frequency(src_ip, now)
     
-    # remove old timestamps tside window
-    while packet_times[src_ip] and packet_times[src_ip][0] < now - TIME_WINDOW:
-        packet_times[src_ip].popleft()
+    if packet_size < MIN_PACKET_SIZE:
+        return None
         
-    frequency = len(packet_times[src_ip]) / TIME_WINDOW
+    #if packet_size > 2000:
+     #   return
+    return (now, src_ip, dst_ip, packet_size, frequency)
+
+def handle_packet(now, src_ip, dst_ip, packet_size, protocol = 0, src_port = 0, dst_port = 0):
+    if flow_aggregator is not None:
+        rows = flow_aggregator.add(now, src_ip, dst_ip, packet_size, protocol, src_port, dst_port)
+        if rows:
+            flow_writer.write_rows(rows)
+        return
     
+    features = extract_features(src_ip, dst_ip, packet_size, now)
+    if features is not None:
+        save_features(features)
+
+def flush_idle_flows():
+    """Quiet link: write the flow windows that have ended by now."""
+    rows = flow_aggregator.flush_due(time.time())
+    if rows:
+        flow_writer.write_rows(rows)
+
+def save_features(features):
     #data = {
         #"ip": src_ip,
         #"packet_size": pkt_size,
@@ -80,25 +138,191 @@ def process_packet(packet):
         #"frequency": frequency
     #}
     
-    if packet_size < 60:
+    if feature_ring is not None:
+        feature_ring.push(*features)
+        if packet_store is None and csv_writer is None:
+            return # --store none: the ring is the only sink
+    if packet_store is not None:
+        packet_store.append(*features)
         return
-        
-    #if packet_size > 2000:
-     #   return
+    now, src_ip, dst_ip, packet_size, frequency = features
+    timestamp = datetime.fromtimestamp(now).isoformat() # for csv
     save_to_csv(timestamp, src_ip, dst_ip, packet_size, frequency) #data)
     #print(json.dumps(data))
+
+def process_packet(packet):
+    if not packet.haslayer(IP):
+        return
+        
+    ip_layer = packet[IP]
+    transport = ip_layer.payload
+    # the capture timestamp, not the time we got round to it: rates and flow windows run in event time
+    handle_packet(
+        float(packet.time), ip_layer.src, ip_layer.dst, len(packet), ip_layer.proto,
+        getattr(transport, "sport", 0), getattr(transport, "dport", 0)
+    )
     
-def start_sniffer(interface = None):
-    print("Starting packet capture...")
+def scapy_capture_args(interface, bpf_filter):
+    """
+    sniff()/AsyncSniffer keyword arguments for a filtered scapy capture. On Linux the
+    filter is compiled here (libpcap, tcpdump, or the built-in ip/default programs) and
+    attached to scapy's own socket: scapy would shell out to tcpdump to compile it,
+    which a bare Pi image does not have. Close args["opened_socket"] when done.
+    """
+    if not bpf_filter or not sys.platform.startswith("linux"):
+        return {"iface": interface, "filter": bpf_filter or None}
+    # compile first, so a custom expression with no compiler fails before any socket opens
+    program = compile_filter(bpf_filter, interface)
+    listen = conf.L2listen(iface = interface)
+    try:
+        attach_filter(listen.ins, program)
+    except Exception:
+        listen.close()
+        raise
+    return {"opened_socket": listen}
+
+def start_sniffer(interface = None, backend = "scapy", bpf_filter = None, workers = 1, flows = False,
+                  store = "columnar", ring = None, replay = None, speed = 0.0):
+    if flows:
+        writer = init_flow_csv()
+    elif store == "columnar":
+        writer = init_store()
+    elif store == "csv":
+        writer = init_csv()
+    else:
+        if not ring:
+            raise ValueError("store 'none' leaves the ring as the only sink; pass a ring name")
+        writer = None
+    if ring and not flows:
+        init_ring(ring)
+    # run_anomaly_pipeline stops the sniffer with SIGTERM; flush what is buffered first
+    install_signal_handlers()
+    if replay:
+        print(f"Replaying {len(replay)} capture file(s) (speed: {speed or 'max'}, filter: {bpf_filter or 'none'})...")
+    else:
+        print(f"Starting packet capture ({backend} x{workers}, filter: {bpf_filter or 'none'})...")
     
     # If interface is None, Scapy auto-selects (works on laptop & Pi)
     
-    sniff(
-        iface = interface,
-        prn = process_packet,
-        store = False
-    )
+    capture = None
+    fanout_rows = None
+    try:
+        if replay:
+            # saved pcap/pcapng files through the same feature path; ends at the last packet
+            capture = open_replay(replay, bpf_filter, speed)
+            for packet in capture.packets():
+                handle_packet(*packet)
+        elif backend == "scapy":
+            scapy_args = scapy_capture_args(interface, bpf_filter)
+            try:
+                if flows:
+                    # keep one socket across the timed sniffs, so nothing is missed between them
+                    if "opened_socket" not in scapy_args:
+                        scapy_args = {"opened_socket": conf.L2listen(**scapy_args)}
+                    while True:
+                        sniff(prn = process_packet, store = False, timeout = FLOW_IDLE_CHECK, **scapy_args)
+                        flush_idle_flows()
+                else:
+                    sniff(prn = process_packet, store = False, **scapy_args)
+            finally:
+                if "opened_socket" in scapy_args:
+                    scapy_args["opened_socket"].close()
+        elif workers > 1:
+            # PACKET_FANOUT workers own per-source state and send back finished feature rows
+            from fanout_capture import FanoutCapture
+            capture = FanoutCapture(workers, backend, interface, bpf_filter, flows = flows).start()
+            fanout_rows = writer.write if flows else save_features
+            for row in capture.rows():
+                fanout_rows(row)
+        else:
+            # raw/mmap read AF_PACKET directly (None = all interfaces)
+            capture = open_capture(backend, interface, bpf_filter)
+            # in flow mode, None marks FLOW_IDLE_CHECK seconds without a frame
+            for packet in capture.packets(idle_timeout = FLOW_IDLE_CHECK if flows else None):
+                if packet is None:
+                    flush_idle_flows()
+                else:
+                    handle_packet(*packet)
+    finally:
+        if fanout_rows is not None:
+            # let the workers flush their last batches (and open flows) before exiting
+            capture.stop()
+            for row in capture.rows():
+                fanout_rows(row)
+        if capture is not None:
+            print(f"{'Replay' if replay else 'Kernel capture'} stats: {capture.kernel_stats()}")
+        if flow_aggregator is not None and fanout_rows is None:
+            writer.write_rows(flow_aggregator.flush())
+            print(f"Flow aggregator stats: {flow_aggregator.stats()}")
+        elif not flows:
+            print(f"Rate tracker stats: {rate_tracker.stats()}")
+        if feature_ring is not None:
+            # also tells the detector no more records are coming
+            print(f"Shared ring stats: {feature_ring.close()}")
+        if writer is not None:
+            print(f"Sniffer writer stats: {writer.close()}")
     
     
+def parse_args():
+    parser = argparse.ArgumentParser(description = f"Capture packet features to {STORE_DIR}/ or packet_data.csv.")
+    parser.add_argument("--interface", default = None, help = "Capture interface.")
+    parser.add_argument(
+        "--backend",
+        choices = ["scapy"] + sorted(BACKENDS),
+        default = "scapy",
+        help = "scapy: full dissection. raw/mmap: AF_PACKET socket / PACKET_MMAP ring (Linux, root)."
+    )
+    parser.add_argument(
+        "--filter",
+        choices = sorted(FILTER_PROFILES),
+        default = DEFAULT_PROFILE,
+        help = "Kernel capture filter profile."
+    )
+    parser.add_argument("--bpf", default = None, help = "Extra tcpdump-style filter ANDed with the profile.")
+    parser.add_argument(
+        "--workers",
+        type = int,
+        default = 1,
+        help = "Capture processes in a PACKET_FANOUT group (raw/mmap backends only)."
+    )
+    parser.add_argument(
+        "--flows",
+        action = "store_true",
+        help = f"Write one row per flow per {FLOW_WINDOW}s window to {FLOW_CSV_FILE} instead of one row per packet."
+    )
+    parser.add_argument(
+        "--store",
+        choices = ["columnar", "csv", "none"],
+        default = "columnar",
+        help = f"columnar: rolling memory-mapped store in {STORE_DIR}/. csv: append to {CSV_FILE}. none: --ring only."
+    )
+    parser.add_argument(
+        "--ring",
+        default = None,
+        metavar = "NAME",
+        help = "Also publish feature records to the shared-memory ring of streaming_pipeline.py --ring NAME."
+    )
+    parser.add_argument(
+        "--pcap",
+        nargs = "+",
+        default = None,
+        metavar = "FILE",
+        help = "Replay saved pcap/pcapng files instead of capturing live (no root needed)."
+    )
+    parser.add_argument(
+        "--speed",
+        type = float,
+        default = 0.0,
+        help = "With --pcap: 0 replays as fast as possible, 1.0 at the original timing, 2.0 twice as fast."
+    )
+    args = parser.parse_args()
+    if args.backend == "scapy" and args.workers > 1:
+        parser.error("--workers needs --backend raw or mmap (scapy captures in one process)")
+    return args
+
 if __name__ == "__main__":
-    start_sniffer()
+    args = parse_args()
+    start_sniffer(
+        args.interface, args.backend, build_expression(args.filter, args.bpf),
+        max(1, args.workers), args.flows, args.store, args.ring, args.pcap, args.speed
+    )
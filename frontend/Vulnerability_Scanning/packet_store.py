@@ -0,0 +1,280 @@
+# This file is a rolling, columnar store for per-packet feature rows.
+# Rows are fixed-size NumPy records (float64 timestamp, IPv4 addresses as
+# uint32, uint32 size, float32 frequency). They go into preallocated .npy
+# segments that are memory-mapped, so an append is one record assignment into
+# the mapping: no CSV formatting, no file growth and no rewrites.
+#
+# Readers map the same segment files read-only and select time ranges with
+# array masks, with no parsing. Whole segments outside the range are skipped
+# using their oldest/newest timestamps. Retention deletes the oldest sealed
+# segments once they are RETENTION_SECONDS older than the newest row, or once
+# the store is larger than MAX_BYTES.
+#
+# A segment's row count is not stored: rows fill a segment in order and an
+# unused slot has ts == 0, so the count is recovered from the mapping itself.
+# That also lets another process (anomaly_detection_alg) read while the
+# sniffer writes.
+
+#------------ Imports ----------
+import glob
+import os
+import socket
+import struct
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# CONFIG
+STORE_DIR = "packet_store" # relative to the working directory, like packet_data.csv
+SEGMENT_ROWS = 1 << 16 # rows per segment file (1.5 MiB each)
+RETENTION_SECONDS = 24 * 3600 # sealed segments this much older than the newest row are deleted
+MAX_BYTES = 256 * 1024 * 1024 # ...and the oldest ones past this total size
+
+PACKET_DTYPE = np.dtype([
+    ("ts", "<f8"),
+    ("src_ip", "<u4"),
+    ("dst_ip", "<u4"),
+    ("packet_size", "<u4"),
+    ("packet_frequency", "<f4"),
+])
+
+_SEGMENT_GLOB = "seg-*.npy"
+_ip = struct.Struct("!I")
+
+
+def ip_to_int(ip):
+    try:
+        return _ip.unpack(socket.inet_aton(ip))[0]
+    except OSError:
+        return 0 # not an IPv4 address; the sniffer only records IPv4
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(_ip.pack(int(value)))
+
+
+def decode_ips(values):
+    # few distinct addresses per block, so convert each once
+    unique, inverse = np.unique(values, return_inverse = True)
+    return np.array([int_to_ip(v) for v in unique], dtype = object)[inverse]
+
+
+class _Segment:
+    __slots__ = ("path", "seq", "data", "rows", "min_ts", "max_ts")
+
+    def __init__(self, path, data):
+        self.path = path
+        self.seq = int(os.path.basename(path)[4:-4])
+        self.data = data
+        self.rows = 0
+        self.min_ts = self.max_ts = None
+        self.refresh()
+
+    def refresh(self):
+        """Recount rows (including any another process appended) and the time bounds."""
+        if self.rows >= len(self.data):
+            return
+        empty = np.flatnonzero(self.data["ts"][self.rows:] == 0)
+        self.rows += int(empty[0]) if len(empty) else len(self.data) - self.rows
+        if self.rows:
+            # fanout workers interleave slightly, so the bounds are min/max, not first/last
+            ts = self.data["ts"][:self.rows]
+            self.min_ts = float(ts.min())
+            self.max_ts = float(ts.max())
+
+
+class PacketStore:
+    """
+    append(ts, src_ip, dst_ip, packet_size, packet_frequency) adds one row;
+    read(start, end) returns the rows in [start, end) as a DataFrame with the
+    packet_data.csv columns (plus the numeric ts). readonly stores only read.
+    """
+
+    def __init__(self, path = STORE_DIR, segment_rows = SEGMENT_ROWS, retention_seconds = RETENTION_SECONDS,
+                 max_bytes = MAX_BYTES, readonly = False):
+        self.path = path
+        self.segment_rows = segment_rows
+        self.retention_seconds = retention_seconds
+        self.max_bytes = max_bytes
+        self.readonly = readonly
+        self._segments = []
+        self._active = None
+        self._ip_cache = {}
+        self.rows_appended = 0
+        self.segments_dropped = 0
+
+        if not readonly:
+            os.makedirs(path, exist_ok = True)
+        self._scan()
+        if not readonly:
+            if self._segments and self._segments[-1].rows < len(self._segments[-1].data):
+                self._active = self._segments[-1]
+            self.apply_retention()
+
+    # --------- segments ----------
+    def _scan(self):
+        names = sorted(glob.glob(os.path.join(self.path, _SEGMENT_GLOB)))
+        # the writer's retention may have deleted segments this reader still maps
+        present = set(names)
+        self._segments = [segment for segment in self._segments if segment.path in present]
+        known = {segment.path for segment in self._segments}
+        for name in names:
+            if name in known:
+                continue
+            try:
+                data = np.load(name, mmap_mode = "r" if self.readonly else "r+")
+            except (OSError, ValueError):
+                continue # being created right now, or truncated
+            if data.dtype != PACKET_DTYPE:
+                continue
+            self._segments.append(_Segment(name, data))
+        self._segments.sort(key = lambda segment: segment.seq)
+
+    def _roll(self):
+        seq = self._segments[-1].seq + 1 if self._segments else 1
+        name = os.path.join(self.path, f"seg-{seq:08d}.npy")
+        tmp = name + ".tmp"
+        data = np.lib.format.open_memmap(tmp, mode = "w+", dtype = PACKET_DTYPE, shape = (self.segment_rows,))
+        data.flush()
+        # readers only glob finished names, so they never map a half-created file
+        os.replace(tmp, name)
+        self._active = _Segment(name, data)
+        self._segments.append(self._active)
+        self.apply_retention()
+
+    def apply_retention(self, now = None):
+        """
+        Delete sealed segments past the age or size limit (the active one always stays).
+        Age is measured from the newest row by default, so a replayed capture with
+        old timestamps is kept like live traffic.
+        """
+        if now is None:
+            newest = [segment.max_ts for segment in self._segments if segment.max_ts is not None]
+            now = max(newest) if newest else time.time()
+        sealed = [segment for segment in self._segments if segment is not self._active]
+        total = sum(segment.data.nbytes for segment in self._segments)
+        for segment in sealed:
+            too_old = segment.max_ts is not None and now - segment.max_ts > self.retention_seconds
+            if not too_old and total <= self.max_bytes:
+                break
+            self._segments.remove(segment)
+            total -= segment.data.nbytes
+            del segment.data
+            try:
+                os.remove(segment.path)
+            except OSError:
+                pass
+            self.segments_dropped += 1
+
+    # --------- writing ----------
+    def _ip(self, ip):
+        value = self._ip_cache.get(ip)
+        if value is None:
+            if len(self._ip_cache) > 65536:
+                self._ip_cache.clear()
+            value = self._ip_cache[ip] = ip_to_int(ip)
+        return value
+
+    def append(self, ts, src_ip, dst_ip, packet_size, packet_frequency):
+        segment = self._active
+        if segment is None or segment.rows >= len(segment.data):
+            self._roll()
+            segment = self._active
+        n = segment.rows
+        segment.data[n] = (ts, self._ip(src_ip), self._ip(dst_ip), packet_size, packet_frequency)
+        if n == 0:
+            segment.min_ts = segment.max_ts = ts
+        elif ts > segment.max_ts:
+            segment.max_ts = ts
+        elif ts < segment.min_ts:
+            segment.min_ts = ts
+        segment.rows = n + 1
+        self.rows_appended += 1
+
+    def write(self, features):
+        """Feature tuple (ts, src, dst, size, frequency), as extract_features returns it."""
+        self.append(*features)
+
+    def write_rows(self, rows):
+        for features in rows:
+            self.append(*features)
+
+    def flush(self):
+        if self._active is not None:
+            self._active.data.flush()
+
+    def close(self):
+        self.flush()
+        return self.stats()
+
+    # --------- reading ----------
+    def read_array(self, start = None, end = None):
+        """Structured array of the rows with start <= ts < end (either bound may be None)."""
+        if self.readonly:
+            self._scan()
+        parts = []
+        for segment in self._segments:
+            if self.readonly:
+                segment.refresh()
+            if not segment.rows:
+                continue
+            # the bounds skip whole segments; the mask makes the exact cut inside the rest
+            if start is not None and segment.max_ts < start:
+                continue
+            if end is not None and segment.min_ts >= end:
+                continue
+            rows = segment.data[:segment.rows]
+            if start is not None or end is not None:
+                ts = rows["ts"]
+                mask = np.ones(len(rows), dtype = bool)
+                if start is not None:
+                    mask &= ts >= start
+                if end is not None:
+                    mask &= ts < end
+                rows = rows[mask]
+            parts.append(np.array(rows))
+        if not parts:
+            return np.empty(0, dtype = PACKET_DTYPE)
+        return np.concatenate(parts)
+
+    def read(self, start = None, end = None, timestamps = True):
+        """
+        DataFrame of the rows in [start, end). timestamps=False leaves out the ISO
+        timestamp column, which is the slow part of a large read; the numeric ts stays.
+        """
+        rows = self.read_array(start, end)
+        data = {}
+        if timestamps:
+            data["timestamp"] = [datetime.fromtimestamp(ts).isoformat() for ts in rows["ts"]]
+        return pd.DataFrame(dict(data, **{
+            "src_ip": decode_ips(rows["src_ip"]),
+            "dst_ip": decode_ips(rows["dst_ip"]),
+            "packet_size": rows["packet_size"].astype(np.int64),
+            "packet_frequency": rows["packet_frequency"].astype(np.float64),
+            "ts": rows["ts"],
+        }))
+
+    def __len__(self):
+        return sum(segment.rows for segment in self._segments)
+
+    def last_modified(self):
+        """mtime of the most recently written segment, or None for an empty store."""
+        mtimes = []
+        for segment in self._segments:
+            try:
+                mtimes.append(os.path.getmtime(segment.path))
+            except OSError:
+                pass # dropped by the writer's retention since the scan
+        return max(mtimes, default = None)
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "segments": len(self._segments),
+            "rows": len(self),
+            "rows_appended": self.rows_appended,
+            "segments_dropped": self.segments_dropped,
+            "bytes": sum(segment.data.nbytes for segment in self._segments),
+        }
@@ -0,0 +1,307 @@
+# This file replays saved captures (pcap or pcapng) through the capture stage,
+# so a recorded incident or a benchmark trace goes through the same feature
+# extraction and detectors as live traffic, with no interface and no root.
+#
+# Files are memory-mapped and walked record by record with struct, the same way
+# raw_capture reads the kernel's ring. A packet is decoded from the mapped
+# bytes and never copied into a Python object. PcapReplay yields the same
+# (timestamp, src_ip, dst_ip, packet_size, protocol, src_port, dst_port) tuples
+# as the live backends. packet_size is the original wire length as an Ethernet
+# frame, so captures taken on a raw-IP, Linux "cooked" or loopback link give
+# the same sizes the live sniffer would see.
+#
+# speed 0 replays as fast as the pipeline takes packets and keeps the file's
+# timestamps. speed 1.0 releases packets at their original spacing (2.0 twice
+# as fast, and so on) and stamps them with the time they are released, as a
+# live capture would. The capture filter is compiled as usual and run in
+# userspace (capture_filter.run_filter), since there is no socket to attach
+# it to.
+
+#------------ Imports ----------
+import mmap
+import struct
+import threading
+import time
+
+from capture_filter import compile_filter, run_filter
+from raw_capture import ETH_HEADER, decode_ipv4, ipv4_offset
+
+# pcap-savefile(5), https://www.tcpdump.org/linktypes.html
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER = 0x1A2B3C4D
+PCAPNG_IDB = 1
+PCAPNG_PB = 2 # obsolete Packet Block
+PCAPNG_SPB = 3
+PCAPNG_EPB = 6
+IDB_TSRESOL = 9
+IDB_TSOFFSET = 14
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL2 = 276
+
+# CONFIG
+PACE_MAX_SLEEP = 0.5 # seconds per wait while pacing, so stop() is noticed on long gaps
+
+# linktype -> bytes of link header before the network layer
+LINK_HEADERS = {
+    LINKTYPE_NULL: 4,
+    LINKTYPE_RAW: 0,
+    LINKTYPE_IPV4: 0,
+    LINKTYPE_LINUX_SLL: 16,
+    LINKTYPE_LINUX_SLL2: 20,
+}
+
+# stands in for the Ethernet header the filter programs expect; the group bit of
+# the first byte is set for packets a cooked capture saw as broadcast/multicast
+_ETH_UNICAST = bytes(12) + b"\x08\x00"
+_ETH_GROUP = b"\x01" + bytes(11) + b"\x08\x00"
+_ethertype = struct.Struct("!H")
+_AF_INET = (2, 2 << 24) # BSD loopback family, in either byte order
+
+
+class PcapError(Exception):
+    pass
+
+
+def _ip_offset(linktype, frame):
+    """Offset of the IPv4 header for this link type, or -1."""
+    if linktype == LINKTYPE_ETHERNET:
+        return ipv4_offset(frame)
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        return 0
+    if linktype == LINKTYPE_LINUX_SLL:
+        return 16 if len(frame) >= 16 and _ethertype.unpack_from(frame, 14)[0] == 0x0800 else -1
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return 20 if len(frame) >= 20 and _ethertype.unpack_from(frame, 0)[0] == 0x0800 else -1
+    if linktype == LINKTYPE_NULL:
+        return 4 if len(frame) >= 4 and struct.unpack_from("=I", frame, 0)[0] in _AF_INET else -1
+    return -1
+
+
+def _is_group(linktype, frame):
+    # sll_pkttype / sll2_pkttype: 1 broadcast, 2 multicast
+    if linktype == LINKTYPE_LINUX_SLL:
+        return frame[1] in (1, 2)
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return len(frame) > 10 and frame[10] in (1, 2)
+    return False
+
+
+def _pcap_records(view):
+    """(ts, linktype, frame, wire_len) for each record of a classic pcap file."""
+    magic = struct.unpack_from("<I", view, 0)[0]
+    if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+        order = "<"
+    else:
+        order = ">"
+        magic = struct.unpack_from(">I", view, 0)[0]
+    scale = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+    linktype = struct.unpack_from(order + "I", view, 20)[0] & 0xFFFF
+    unpack_record = struct.Struct(order + "IIII").unpack_from
+    size = len(view)
+    offset = 24
+    while offset + 16 <= size:
+        sec, frac, caplen, wire_len = unpack_record(view, offset)
+        start = offset + 16
+        offset = start + caplen
+        if offset > size:
+            raise PcapError(f"truncated record at byte {start - 16}")
+        yield sec + frac * scale, linktype, view[start:offset], wire_len
+
+
+def _tsresol(value):
+    return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+
+
+def _pcapng_records(view):
+    """(ts, linktype, frame, wire_len) for each packet of a pcapng file, across sections."""
+    size = len(view)
+    offset = 0
+    order = "<"
+    interfaces = [] # (linktype, ts scale, ts offset) per interface of the current section
+    ts = 0.0 # simple packet blocks carry no timestamp; they get the previous one
+    while offset + 12 <= size:
+        block_type = struct.unpack_from(order + "I", view, offset)[0]
+        if block_type == PCAPNG_SHB:
+            magic = struct.unpack_from("<I", view, offset + 8)[0]
+            order = "<" if magic == PCAPNG_BYTE_ORDER else ">"
+            interfaces = []
+        length = struct.unpack_from(order + "I", view, offset + 4)[0]
+        if length < 12 or length % 4 or offset + length > size:
+            raise PcapError(f"bad block length {length} at byte {offset}")
+        body = offset + 8
+        end = offset + length - 4
+
+        if block_type == PCAPNG_IDB:
+            linktype, _, _ = struct.unpack_from(order + "HHI", view, body)
+            scale, ts_offset = 1e-6, 0
+            option = body + 8
+            while option + 4 <= end:
+                code, option_len = struct.unpack_from(order + "HH", view, option)
+                if code == 0:
+                    break
+                if code == IDB_TSRESOL and option_len >= 1:
+                    scale = _tsresol(view[option + 4])
+                elif code == IDB_TSOFFSET and option_len >= 8:
+                    ts_offset = struct.unpack_from(order + "q", view, option + 4)[0]
+                option += 4 + (option_len + 3) // 4 * 4
+            interfaces.append((linktype, scale, ts_offset))
+        elif block_type in (PCAPNG_EPB, PCAPNG_PB):
+            if block_type == PCAPNG_EPB:
+                interface, high, low, caplen, wire_len = struct.unpack_from(order + "IIIII", view, body)
+            else:
+                interface, _, high, low, caplen, wire_len = struct.unpack_from(order + "HHIIII", view, body)
+            if interface >= len(interfaces):
+                raise PcapError(f"packet for undeclared interface {interface} at byte {offset}")
+            linktype, scale, ts_offset = interfaces[interface]
+            ts = ((high << 32) | low) * scale + ts_offset
+            data = body + 20
+            yield ts, linktype, view[data:min(data + caplen, end)], wire_len
+        elif block_type == PCAPNG_SPB:
+            if not interfaces:
+                raise PcapError(f"simple packet block before any interface at byte {offset}")
+            linktype, _, _ = interfaces[0]
+            wire_len = struct.unpack_from(order + "I", view, body)[0]
+            data = body + 4
+            yield ts, linktype, view[data:min(data + wire_len, end)], wire_len
+        # name resolution, statistics and custom blocks carry nothing we score
+        offset += length
+
+
+def open_file(path):
+    """Map a capture file read-only; returns (mmap, view, record generator)."""
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            raise PcapError(f"{path} is empty")
+    view = memoryview(mapped)
+    if bytes(view[:2]) == b"\x1f\x8b":
+        raise PcapError(f"{path} is gzip-compressed; decompress it first")
+    if len(view) >= 24 and struct.unpack_from("<I", view, 0)[0] in (
+            PCAP_MAGIC_US, PCAP_MAGIC_NS, 0xD4C3B2A1, 0x4D3CB2A1):
+        return mapped, view, _pcap_records(view)
+    if len(view) >= 12 and struct.unpack_from("<I", view, 0)[0] == PCAPNG_SHB:
+        return mapped, view, _pcapng_records(view)
+    raise PcapError(f"{path} is not a pcap or pcapng file")
+
+
+class PcapReplay:
+    """
+    Drop-in for the raw_capture backends: packets() yields the same tuples, stop()
+    ends a replay early and kernel_stats() reports replay counters (and the
+    packets per second the consumer took them at) instead of socket drops.
+    """
+
+    def __init__(self, paths, program = None, speed = 0.0):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.program = program
+        self.speed = speed
+        self.received = 0
+        self.decoded = 0
+        self.filtered = 0
+        self.skipped = 0
+        self.errors = []
+        self._stop = threading.Event()
+        self._started = None
+        self._finished = None
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def done(self):
+        return self._finished is not None
+
+    def _pace(self, ts, clock):
+        """Wait until ts is due on the replay clock; returns the release timestamp."""
+        if clock[0] is None:
+            clock[0], clock[1] = ts, time.time()
+        due = clock[1] + max(0.0, ts - clock[0]) / self.speed
+        while not self._stop.is_set():
+            delay = due - time.time()
+            if delay <= 0:
+                break
+            self._stop.wait(min(delay, PACE_MAX_SLEEP))
+        return due
+
+    def _file_packets(self, path):
+        mapped, view, records = open_file(path)
+        program = self.program
+        clock = [None, None] # first file timestamp, wall time it was released at
+        try:
+            for ts, linktype, frame, wire_len in records:
+                if self._stop.is_set():
+                    return
+                self.received += 1
+                offset = _ip_offset(linktype, frame)
+                if offset < 0:
+                    self.skipped += 1
+                    continue
+                if linktype != LINKTYPE_ETHERNET:
+                    # as the live sniffer would have seen it on Ethernet
+                    wire_len += ETH_HEADER - LINK_HEADERS[linktype]
+                if program:
+                    if linktype == LINKTYPE_ETHERNET:
+                        accept = run_filter(program, frame, wire_len)
+                    else:
+                        header = _ETH_GROUP if _is_group(linktype, frame) else _ETH_UNICAST
+                        accept = run_filter(program, header + bytes(frame[offset:]), wire_len)
+                    if not accept:
+                        self.filtered += 1
+                        continue
+                fields = decode_ipv4(frame, offset)
+                if fields is None:
+                    self.skipped += 1
+                    continue
+                if self.speed:
+                    ts = self._pace(ts, clock)
+                self.decoded += 1
+                yield (ts, fields[0], fields[1], wire_len) + fields[2:]
+        except PcapError as e:
+            # keep what was read; a capture cut off mid-write is still worth scoring
+            self.errors.append(f"{path}: {e}")
+            print(f"Replay stopped early: {path}: {e}")
+        finally:
+            records.close()
+            frame = None
+            view.release()
+            mapped.close()
+
+    def packets(self):
+        self._started = time.perf_counter()
+        self._finished = None
+        try:
+            for path in self.paths:
+                if self._stop.is_set():
+                    break
+                yield from self._file_packets(path)
+        finally:
+            self._finished = time.perf_counter()
+
+    def kernel_stats(self):
+        start = self._started
+        elapsed = ((self._finished or time.perf_counter()) - start) if start is not None else 0.0
+        stats = {
+            "replay_files": len(self.paths),
+            "replay_packets": self.received,
+            "replay_decoded": self.decoded,
+            "replay_filtered": self.filtered,
+            "replay_skipped": self.skipped,
+            "replay_seconds": round(elapsed, 3),
+            "replay_packets_per_sec": round(self.received / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        if self.errors:
+            stats["replay_errors"] = self.errors
+        return stats
+
+
+def open_replay(paths, bpf_filter = None, speed = 0.0):
+    """bpf_filter is a tcpdump expression, compiled as for a live capture and run per packet."""
+    return PcapReplay(paths, compile_filter(bpf_filter), speed)
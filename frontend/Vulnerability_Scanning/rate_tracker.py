@@ -0,0 +1,112 @@
+# This file tracks packets-per-second per source IP in bounded memory.
+# Each source keeps a small ring of per-bucket packet counts covering the
+# frequency window instead of one timestamp per packet. Sources are kept in LRU
+# order and dropped once idle past the TTL. A hard cap on tracked sources stops a
+# port scan or spoofed-source flood from growing the table. Sources arriving while
+# the table is full share one overflow counter, whose (very high) rate is what
+# they get reported, so a flood still stands out to the detector.
+
+#------------ Imports ----------
+from collections import OrderedDict
+
+# CONFIG
+WINDOW_SECONDS = 10 # frequency window, same as network_sniffer.TIME_WINDOW
+BUCKET_SECONDS = 1.0 # counting granularity inside the window
+SOURCE_TTL = 60 # seconds of silence before a source is forgotten
+MAX_SOURCES = 4096 # hard cap on individually tracked sources
+EVICT_PER_UPDATE = 4 # idle sources expired per update, so eviction cost stays flat
+
+
+class _BucketRing:
+    """Packet counts for the last n buckets; slot = bucket % n."""
+    __slots__ = ("counts", "last_bucket", "total")
+
+    def __init__(self, n, bucket):
+        self.counts = [0] * n
+        self.last_bucket = bucket
+        self.total = 0
+
+    def add(self, bucket):
+        counts = self.counts
+        n = len(counts)
+        gap = bucket - self.last_bucket
+        if gap > 0:
+            if gap >= n:
+                for i in range(n):
+                    counts[i] = 0
+                self.total = 0
+            else:
+                # clear the slots the window slid past
+                for b in range(self.last_bucket + 1, bucket + 1):
+                    self.total -= counts[b % n]
+                    counts[b % n] = 0
+            self.last_bucket = bucket
+        elif gap <= -n:
+            # older than the whole window (late packet): nothing left to count it in
+            return self.total
+        counts[bucket % n] += 1
+        self.total += 1
+        return self.total
+
+
+class RateTracker:
+    """update(src_ip, ts) -> packets per second over the last window for that source."""
+
+    def __init__(self, window = WINDOW_SECONDS, bucket_seconds = BUCKET_SECONDS,
+                 ttl = SOURCE_TTL, max_sources = MAX_SOURCES):
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.n_buckets = max(1, int(round(window / bucket_seconds)))
+        self.ttl_buckets = max(self.n_buckets, int(ttl / bucket_seconds))
+        self.max_sources = max_sources
+
+        self._sources = OrderedDict() # src_ip -> _BucketRing, least recently seen first
+        self._overflow = None
+        self.evicted = 0
+        self.overflow_packets = 0
+
+    def _expire(self, bucket, limit):
+        sources = self._sources
+        while sources and limit:
+            ring = next(iter(sources.values()))
+            if bucket - ring.last_bucket <= self.ttl_buckets:
+                break
+            sources.popitem(last = False)
+            self.evicted += 1
+            limit -= 1
+
+    def update(self, src_ip, ts):
+        bucket = int(ts // self.bucket_seconds)
+        self._expire(bucket, EVICT_PER_UPDATE)
+
+        sources = self._sources
+        ring = sources.get(src_ip)
+        if ring is not None:
+            sources.move_to_end(src_ip)
+        elif len(sources) < self.max_sources:
+            ring = sources[src_ip] = _BucketRing(self.n_buckets, bucket)
+        else:
+            # full of sources seen within the TTL: count this one in the shared overflow ring
+            self.overflow_packets += 1
+            if self._overflow is None:
+                self._overflow = _BucketRing(self.n_buckets, bucket)
+            ring = self._overflow
+        return ring.add(bucket) / self.window
+
+    def expire(self, ts):
+        """Drop every source idle past the TTL (the per-update sweep is capped)."""
+        self._expire(int(ts // self.bucket_seconds), -1)
+
+    def __len__(self):
+        return len(self._sources)
+
+    def __contains__(self, src_ip):
+        return src_ip in self._sources
+
+    def stats(self):
+        return {
+            "sources": len(self._sources),
+            "max_sources": self.max_sources,
+            "evicted": self.evicted,
+            "overflow_packets": self.overflow_packets,
+        }
@@ -0,0 +1,262 @@
+# This file is a lightweight Linux capture backend for the sniffer.
+# Instead of scapy dissecting every packet into objects, it reads frames from an
+# AF_PACKET socket (or a PACKET_MMAP ring shared with the kernel) and pulls the
+# fields the features need - IPv4 addresses, protocol, ports and frame length -
+# straight out of the bytes with struct.
+#
+# Both backends yield (timestamp, src_ip, dst_ip, packet_size, protocol, src_port,
+# dst_port) tuples; ports are 0 for non-TCP/UDP packets and fragments. An optional
+# BPF program (see capture_filter) is attached before the first frame is read.
+# packets(idle_timeout) also yields None whenever that many seconds pass with no
+# frame, so a caller can ship batches and close windows while the link is quiet.
+# Needs root (or CAP_NET_RAW).
+
+#------------ Imports ----------
+import mmap
+import select
+import socket
+import struct
+import threading
+import time
+
+from capture_filter import KernelStats, attach_filter, compile_filter
+
+# linux/if_packet.h, linux/if_ether.h
+ETH_P_ALL = 0x0003
+ETH_P_IP = 0x0800
+ETH_P_8021Q = 0x8100
+ETH_P_8021AD = 0x88A8
+SOL_PACKET = 263
+SO_TIMESTAMPNS = 35 # asm-generic/socket.h; the cmsg type is the same (SCM_TIMESTAMPNS)
+PACKET_RX_RING = 5
+PACKET_VERSION = 10
+TPACKET_V2 = 1
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+
+# CONFIG
+SNAPLEN = 128 # bytes copied per frame on the plain socket; headers fit easily
+SOCKET_RCVBUF = 4 * 1024 * 1024 # queue for the plain socket; the default drops bursts
+POLL_TIMEOUT = 0.5 # seconds between stop checks while the link is idle
+RING_FRAME_SIZE = 2048 # one frame slot per packet (TPACKET_ALIGNMENT multiple)
+RING_BLOCK_SIZE = 1 << 20 # must be a multiple of the page size
+RING_BLOCK_NR = 8 # 8 MiB ring -> 4096 frame slots
+
+ETH_HEADER = 14
+VLAN_TAG = 4
+IPV4_SRC = 12 # offset of the source address inside the IPv4 header
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+# struct tpacket2_hdr: status, len, snaplen, mac, net, sec, nsec, vlan_tci, vlan_tpid
+TPACKET2_HDR = struct.Struct("IIIHHIIHH")
+# struct timespec: tv_sec, tv_nsec
+TIMESPEC = struct.Struct("qq")
+
+_ethertype = struct.Struct("!H")
+_ports = struct.Struct("!HH")
+_inet_ntoa = socket.inet_ntoa
+
+
+def ipv4_offset(frame):
+    """Offset of the IPv4 header in an Ethernet frame (after up to two VLAN tags), or -1."""
+    if len(frame) < ETH_HEADER + 20:
+        return -1
+    offset = 12
+    ethertype = _ethertype.unpack_from(frame, offset)[0]
+    while ethertype in (ETH_P_8021Q, ETH_P_8021AD) and offset < 12 + 2 * VLAN_TAG:
+        offset += VLAN_TAG
+        ethertype = _ethertype.unpack_from(frame, offset)[0]
+    if ethertype != ETH_P_IP:
+        return -1
+    return offset + 2
+
+
+def decode_ipv4(buf, ip_offset):
+    """
+    (src_ip, dst_ip, protocol, src_port, dst_port) from the IPv4 header at ip_offset,
+    or None if it is not IPv4. Ports are read only from first fragments of TCP/UDP.
+    """
+    if len(buf) < ip_offset + 20 or buf[ip_offset] >> 4 != 4:
+        return None
+    start = ip_offset + IPV4_SRC
+    protocol = buf[ip_offset + 9]
+    src_port = dst_port = 0
+    if protocol in (IPPROTO_TCP, IPPROTO_UDP) and not _ethertype.unpack_from(buf, ip_offset + 6)[0] & 0x1FFF:
+        transport = ip_offset + (buf[ip_offset] & 0x0F) * 4
+        if len(buf) >= transport + 4:
+            src_port, dst_port = _ports.unpack_from(buf, transport)
+    return (_inet_ntoa(buf[start:start + 4]), _inet_ntoa(buf[start + 4:start + 8]),
+            protocol, src_port, dst_port)
+
+
+def _drain(sock):
+    while True:
+        try:
+            sock.recv(1, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            return
+
+
+class _PacketSocket:
+    """Socket setup, filter and kernel counters shared by both backends."""
+
+    def __init__(self, interface = None, program = None, fanout = None):
+        self.interface = interface
+        self.program = program
+        self.fanout = fanout # callable(sock) that joins a PACKET_FANOUT group once bound
+        self.received = 0
+        self._stop = threading.Event()
+        self._sock = None
+        self._kernel = KernelStats()
+
+    def stop(self):
+        self._stop.set()
+
+    def _open_socket(self):
+        if self.interface:
+            # bind with protocol 0 first so nothing is queued before the filter is in place
+            sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+            attach_filter(sock, self.program)
+            sock.bind((self.interface, ETH_P_ALL))
+        else:
+            # bind() needs an interface name, so to listen on all of them the protocol is
+            # given at creation; frames queued before the filter was attached are discarded
+            sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+            attach_filter(sock, self.program)
+            if self.program:
+                _drain(sock)
+        if self.fanout is not None:
+            self.fanout(sock)
+        self._sock = sock
+        return sock
+
+    def _close_socket(self):
+        if self._sock is not None:
+            self._kernel.poll(self._sock)
+            self._sock.close()
+            self._sock = None
+
+    def kernel_stats(self):
+        if self._sock is not None:
+            self._kernel.poll(self._sock)
+        return self._kernel.as_dict()
+
+
+class RawSocketCapture(_PacketSocket):
+    """
+    One recvmsg_into() per frame into a reused buffer; MSG_TRUNC reports the real
+    length and SO_TIMESTAMPNS the time the kernel received the frame.
+    """
+
+    def __init__(self, interface = None, program = None, fanout = None, snaplen = SNAPLEN):
+        super().__init__(interface, program, fanout)
+        self.snaplen = snaplen
+
+    def packets(self, idle_timeout = None):
+        buf = bytearray(self.snaplen)
+        view = memoryview(buf)
+        sock = self._open_socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_RCVBUF)
+        # stamp frames when the kernel received them, not when they are dequeued, so a
+        # backlog in the socket buffer keeps its real spacing (as tp_sec/tp_nsec do for mmap)
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        sock.settimeout(idle_timeout or POLL_TIMEOUT)
+        ancbufsize = socket.CMSG_SPACE(TIMESPEC.size)
+        unpack_timespec = TIMESPEC.unpack_from
+        buffers = [buf]
+        try:
+            while not self._stop.is_set():
+                try:
+                    size, ancdata, _, _ = sock.recvmsg_into(buffers, ancbufsize, socket.MSG_TRUNC)
+                except socket.timeout:
+                    if idle_timeout:
+                        yield None
+                    continue
+                self.received += 1
+                frame = view[:min(size, self.snaplen)]
+                offset = ipv4_offset(frame)
+                if offset < 0:
+                    continue
+                fields = decode_ipv4(frame, offset)
+                if fields is None:
+                    continue
+                ts = None
+                for level, kind, data in ancdata:
+                    if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS and len(data) >= TIMESPEC.size:
+                        sec, nsec = unpack_timespec(data)
+                        ts = sec + nsec / 1e9
+                yield (ts if ts is not None else time.time(), fields[0], fields[1], size) + fields[2:]
+        finally:
+            self._close_socket()
+
+
+class MmapRingCapture(_PacketSocket):
+    """
+    TPACKET_V2 receive ring: the kernel writes frames straight into memory shared
+    with this process, so reading a packet costs no syscall while the ring has data.
+    Frames are handed back to the kernel by resetting their status word.
+    """
+
+    def __init__(self, interface = None, program = None, fanout = None, frame_size = RING_FRAME_SIZE,
+                 block_size = RING_BLOCK_SIZE, block_nr = RING_BLOCK_NR):
+        super().__init__(interface, program, fanout)
+        self.frame_size = frame_size
+        self.block_size = block_size
+        self.block_nr = block_nr
+        self.frame_nr = (block_size // frame_size) * block_nr
+
+    def _setup(self):
+        sock = self._open_socket()
+        sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V2)
+        # struct tpacket_req: block_size, block_nr, frame_size, frame_nr
+        req = struct.pack("IIII", self.block_size, self.block_nr, self.frame_size, self.frame_nr)
+        sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+        ring = mmap.mmap(sock.fileno(), self.block_size * self.block_nr,
+                         mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        return sock, ring
+
+    def packets(self, idle_timeout = None):
+        sock, ring = self._setup()
+        view = memoryview(ring)
+        poller = select.poll()
+        poller.register(sock.fileno(), select.POLLIN | select.POLLERR)
+        unpack_hdr = TPACKET2_HDR.unpack_from
+        frame_size = self.frame_size
+        frame_nr = self.frame_nr
+        index = 0
+        try:
+            while not self._stop.is_set():
+                base = index * frame_size
+                status, length, snaplen, mac, net, sec, nsec, _, _ = unpack_hdr(ring, base)
+                if not status & TP_STATUS_USER:
+                    if not poller.poll((idle_timeout or POLL_TIMEOUT) * 1000) and idle_timeout:
+                        yield None
+                    continue
+
+                # tp_net already points past the link header and any VLAN tags;
+                # decode_ipv4 rejects non-IPv4 payloads by their version nibble
+                fields = None
+                if net >= mac and snaplen >= net - mac + 20:
+                    fields = decode_ipv4(view[base:base + mac + snaplen], net)
+                if fields is not None:
+                    yield (sec + nsec / 1e9, fields[0], fields[1], length) + fields[2:]
+
+                struct.pack_into("I", ring, base, TP_STATUS_KERNEL)
+                self.received += 1
+                index = (index + 1) % frame_nr
+        finally:
+            view.release()
+            ring.close()
+            self._close_socket()
+
+
+BACKENDS = {
+    "raw": RawSocketCapture,
+    "mmap": MmapRingCapture,
+}
+
+
+def open_capture(backend, interface = None, bpf_filter = None, fanout = None):
+    """bpf_filter is a tcpdump expression, compiled here and attached in the kernel."""
+    return BACKENDS[backend](interface, compile_filter(bpf_filter, interface), fanout)
@@ -0,0 +1,194 @@
+# This file is a buffered CSV writer shared by the sniffer and the anomaly log.
+# The file stays open; rows collect in memory and go to disk in one write when
+# FLUSH_ROWS rows are pending, FLUSH_INTERVAL seconds have passed, the file is
+# rotated, or the process exits (atexit / SIGTERM / SIGINT).
+
+#------------ Imports ----------
+import atexit
+import csv
+import io
+import os
+import signal
+import sys
+import threading
+import time
+
+# CONFIG
+FLUSH_ROWS = 500 # rows buffered before a flush
+FLUSH_INTERVAL = 1.0 # seconds a row may sit in the buffer
+MAX_BYTES = 50 * 1024 * 1024 # rotate once the file grows past this
+BACKUP_COUNT = 3 # rotated files kept as name.1 .. name.N
+
+_open_writers = []
+_registry_lock = threading.Lock()
+
+
+class RecordWriter:
+    """Keeps one CSV file open and writes rows to it in batches."""
+
+    def __init__(self, path, header = None, flush_rows = FLUSH_ROWS, flush_interval = FLUSH_INTERVAL,
+                 max_bytes = MAX_BYTES, backup_count = BACKUP_COUNT):
+        self.path = path
+        self.header = header
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+        self._lock = threading.RLock()
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer)
+        self._pending = 0
+        self._first_pending = None
+        self._file = None
+        self._size = 0
+        self._closed = False
+
+        self.records_written = 0
+        self.flushes = 0
+        self.rotations = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+
+        self._open()
+        with _registry_lock:
+            _open_writers.append(self)
+
+        # time-based flushes still happen when no new rows arrive
+        self._wakeup = threading.Event()
+        self._timer = threading.Thread(target = self._flush_loop, daemon = True)
+        self._timer.start()
+
+    # --------- file handling ----------
+    def _open(self):
+        self._file = open(self.path, "a", newline = "")
+        self._size = self._file.tell()
+        if self._size == 0 and self.header:
+            self._file.write(self._row_text(self.header))
+            self._file.flush()
+            self._size = self._file.tell()
+
+    @staticmethod
+    def _row_text(row):
+        buf = io.StringIO()
+        csv.writer(buf).writerow(row)
+        return buf.getvalue()
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        self._open()
+
+    # --------- writing ----------
+    def write(self, row):
+        self.write_rows([row])
+
+    def write_rows(self, rows):
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"write to closed RecordWriter({self.path})")
+            before = self._pending
+            for row in rows:
+                self._csv.writerow(row)
+                self._pending += 1
+            if self._pending and before == 0:
+                self._first_pending = time.monotonic()
+            if self._pending >= self.flush_rows:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending or self._file is None:
+            return
+        start = time.perf_counter()
+        data = self._buffer.getvalue()
+        if self.max_bytes and self._size > 0 and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        self._buffer.seek(0)
+        self._buffer.truncate()
+
+        elapsed = time.perf_counter() - start
+        self.records_written += self._pending
+        self.flushes += 1
+        self.flush_seconds_total += elapsed
+        self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+        self._pending = 0
+        self._first_pending = None
+
+    def _flush_loop(self):
+        while not self._wakeup.wait(self.flush_interval / 2):
+            with self._lock:
+                if self._first_pending is not None and time.monotonic() - self._first_pending >= self.flush_interval:
+                    self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return self.stats()
+            self._flush_locked()
+            self._closed = True
+            self._wakeup.set()
+            self._file.close()
+            self._file = None
+        with _registry_lock:
+            if self in _open_writers:
+                _open_writers.remove(self)
+        return self.stats()
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "records_written": self.records_written,
+            "buffered": self._pending,
+            "flushes": self.flushes,
+            "rotations": self.rotations,
+            "flush_ms_avg": round(1000 * self.flush_seconds_total / self.flushes, 3) if self.flushes else 0.0,
+            "flush_ms_max": round(1000 * self.flush_seconds_max, 3),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def close_all():
+    """Flush and close every open writer; safe to call more than once."""
+    with _registry_lock:
+        writers = list(_open_writers)
+    for writer in writers:
+        writer.close()
+
+
+def _on_signal(signum, frame):
+    # exit through SystemExit: finally blocks can still write their last rows,
+    # then atexit flushes and closes every writer
+    sys.exit(128 + signum)
+
+
+def install_signal_handlers():
+    """Flush buffered rows when the pipeline terminates this process (SIGTERM) or on Ctrl+C."""
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            signal.signal(sig, _on_signal)
+        except ValueError:
+            # only the main thread may install handlers; atexit still covers normal exits
+            pass
+
+
+atexit.register(close_all)
@@ -15,9 +15,70 @@ def parse_args():
         default=RUN_DURATION_DEFAULT,
         help="Packet capture duration in seconds."
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--mode",
+        choices=["batch", "stream", "ring"],
+        default="batch",
+        help="batch: capture to CSV, then score. stream: score in memory while capturing. "
+             "ring: sniffer process feeds the detector through shared memory."
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["scapy", "raw", "mmap"],
+        default="scapy",
+        help="Capture backend. raw/mmap read an AF_PACKET socket / PACKET_MMAP ring (Linux, root)."
+    )
+    parser.add_argument(
+        "--filter",
+        choices=["all", "ip", "default", "no-mgmt"],
+        default="default",
+        help="Kernel capture filter profile (see capture_filter.py)."
+    )
+    parser.add_argument(
+        "--bpf",
+        default=None,
+        help="Extra tcpdump-style capture filter ANDed with the profile."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Capture processes in a PACKET_FANOUT group (raw/mmap backends only)."
+    )
+    parser.add_argument(
+        "--flows",
+        action="store_true",
+        help="Aggregate traffic into per-flow rows and score those instead of single packets."
+    )
+    parser.add_argument(
+        "--detector",
+        choices=["forest", "ewma"],
+        default="forest",
+        help="forest: per-device Isolation Forests. ewma: lightweight streaming z-scores (Raspberry Pi)."
+    )
+    parser.add_argument(
+        "--pcap",
+        nargs="+",
+        default=None,
+        metavar="FILE",
+        help="Replay saved pcap/pcapng files instead of capturing live; runs until the last packet."
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0.0,
+        help="With --pcap: 0 replays as fast as possible, 1.0 at the original timing."
+    )
+    args = parser.parse_args()
+    if args.backend == "scapy" and args.workers > 1:
+        parser.error("--workers needs --backend raw or mmap (scapy captures in one process)")
+    return args
+
+def replay_args(replay, speed):
+    return ["--pcap"] + [os.path.abspath(path) for path in replay] + ["--speed", str(speed)] if replay else []
 
-def run_pipeline(run_duration):
+def run_pipeline(run_duration, backend="scapy", filter_profile="default", bpf=None, workers=1, flows=False,
+                 detector="forest", replay=None, speed=0.0):
     start_time = time.time()
 
 #while time.time() - start_time < RUN_DURATION:
@@ -25,22 +86,31 @@ def run_pipeline(run_duration):
 # start sniffer
     print("Starting sniffer...")
     sniffer = subprocess.Popen(
-        [sys.executable, "network_sniffer.py"],
+        [sys.executable, "network_sniffer.py", "--backend", backend, "--filter", filter_profile,
+         "--workers", str(workers)]
+        + (["--bpf", bpf] if bpf else [])
+        + (["--flows"] if flows else [])
+        + replay_args(replay, speed),
         cwd=SCRIPT_DIR
     )
 
-#time to collect packets
-    time.sleep(run_duration)
-
-#stop sniffer
-    print("Stopping sniffer...")
-    sniffer.terminate()
-    sniffer.wait()
+#time to collect packets (a replay ends by itself once the files are read)
+    if replay:
+        sniffer.wait()
+    else:
+        time.sleep(run_duration)
+        #stop sniffer
+        print("Stopping sniffer...")
+        sniffer.terminate()
+        sniffer.wait()
 
 #run anomaly detection
     print("Running ML detection...")
     subprocess.run(
-        [sys.executable, "anomaly_detection_alg.py"],
+        [sys.executable, "anomaly_detection_alg.py", "--detector", detector]
+        # score just this capture; the packet store keeps earlier runs for training.
+        # A full-speed replay keeps the file's timestamps, so there is no recent range to cut
+        + (["--flows"] if flows else [] if replay and not speed else ["--since", str(time.time() - start_time)]),
         check=True,
         cwd=SCRIPT_DIR
     )
@@ -54,9 +124,78 @@ def run_pipeline(run_duration):
     )
     
     print("Pipeline complete.")
+
+def run_stream_pipeline(run_duration, backend="scapy", filter_profile="default", bpf=None, workers=1, flows=False,
+                        detector="forest", replay=None, speed=0.0):
+#sniffer, features and detector run in this process; anomalies.csv fills as they happen
+    os.chdir(SCRIPT_DIR)
+    sys.path.insert(0, SCRIPT_DIR)
+    from streaming_pipeline import run_streaming
+    from capture_filter import build_expression
+    run_streaming(None if replay else run_duration, backend=backend, bpf_filter=build_expression(filter_profile, bpf),
+                  workers=workers, flows=flows, detector=detector, replay=replay, speed=speed)
+
+#convert to json
+    print("Converting to JSON...")
+    subprocess.run(
+        [sys.executable, "CSVtoJSON.py"],
+        check=True,
+        cwd=SCRIPT_DIR
+    )
+
+    print("Pipeline complete.")
     
+def run_ring_pipeline(run_duration, backend="scapy", filter_profile="default", bpf=None, workers=1,
+                      detector="forest", replay=None, speed=0.0):
+#detector in this process, sniffer in its own; features cross over a shared-memory ring
+    os.chdir(SCRIPT_DIR)
+    sys.path.insert(0, SCRIPT_DIR)
+    from streaming_pipeline import StreamingPipeline
+    ring = f"vigil-{os.getpid()}"
+    pipeline = StreamingPipeline(detector=detector, ring=ring)
+    pipeline.start()
+
+    print("Starting sniffer...")
+    sniffer = subprocess.Popen(
+        [sys.executable, "network_sniffer.py", "--backend", backend, "--filter", filter_profile,
+         "--workers", str(workers), "--ring", ring]
+        + (["--bpf", bpf] if bpf else [])
+        + replay_args(replay, speed),
+        cwd=SCRIPT_DIR
+    )
+    try:
+        if replay:
+            sniffer.wait()
+        else:
+            time.sleep(run_duration)
+    except KeyboardInterrupt:
+        pass
+
+    print("Stopping sniffer...")
+    sniffer.terminate()
+    sniffer.wait()
+    print(f"Stream stats: {pipeline.stop()}")
+
+#convert to json
+    print("Converting to JSON...")
+    subprocess.run(
+        [sys.executable, "CSVtoJSON.py"],
+        check=True,
+        cwd=SCRIPT_DIR
+    )
+
+    print("Pipeline complete.")
+
 if __name__ == "__main__":
     args = parse_args()
     duration = max(1, int(args.duration or RUN_DURATION_DEFAULT))
-    run_pipeline(duration)
+    if args.mode == "ring":
+        run_ring_pipeline(duration, args.backend, args.filter, args.bpf, max(1, args.workers), args.detector,
+                          args.pcap, args.speed)
+    elif args.mode == "stream":
+        run_stream_pipeline(duration, args.backend, args.filter, args.bpf, max(1, args.workers), args.flows,
+                            args.detector, args.pcap, args.speed)
+    else:
+        run_pipeline(duration, args.backend, args.filter, args.bpf, max(1, args.workers), args.flows, args.detector,
+                     args.pcap, args.speed)
 
@@ -0,0 +1,96 @@
+#This file checkpoints a scan run to an append-only JSON-lines log so an
+#interrupted run can be resumed with the same run id. Each finished device is
+#one line; the final report is rebuilt from the log, not from memory.
+
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RUNS_DIR = os.path.join(BASE_DIR, "scan_runs")
+
+
+def new_run_id():
+	return "scan_" + uuid.uuid4().hex[:8]
+
+
+def device_key(device):
+	#MAC survives DHCP churn between restarts; fall back to IP for devices without one
+	return (device.get("mac") or device.get("ip") or "").lower()
+
+
+class ScanCheckpoint:
+	"""Append-only per-run log: one run_started record, one record per device, one run_finished."""
+
+	def __init__(self, run_id = None, runs_dir = RUNS_DIR):
+		self.run_id = run_id or new_run_id()
+		self.path = os.path.join(runs_dir, f"{self.run_id}.jsonl")
+		self.started_at = None
+		self.finished = False
+		self.completed = {} # device key -> scan result, in completion order
+		self._torn_tail = False
+		os.makedirs(runs_dir, exist_ok = True)
+		self._load()
+
+	def _load(self):
+		if not os.path.exists(self.path):
+			return
+		if os.path.getsize(self.path) > 0:
+			with open(self.path, "rb") as f:
+				f.seek(-1, os.SEEK_END)
+				self._torn_tail = f.read(1) != b"\n"
+		with open(self.path, "r") as f:
+			for line in f:
+				try:
+					record = json.loads(line)
+				except ValueError:
+					#a crash mid-write leaves a torn last line; that device simply reruns
+					continue
+				#so does a line that parses but is not a record of ours
+				if not isinstance(record, dict):
+					continue
+				kind = record.get("type")
+				if kind == "run_started" and self.started_at is None:
+					self.started_at = record.get("scannedAt")
+				elif kind == "device":
+					key = record.get("key")
+					if isinstance(key, str) and "result" in record:
+						self.completed[key] = record["result"]
+				elif kind == "run_finished":
+					self.finished = True
+
+	def _append(self, record):
+		with open(self.path, "a") as f:
+			#make sure a torn line from a previous crash does not swallow this record
+			if self._torn_tail:
+				f.write("\n")
+				self._torn_tail = False
+			f.write(json.dumps(record) + "\n")
+			f.flush()
+			os.fsync(f.fileno())
+
+	@property
+	def resumed(self):
+		return self.started_at is not None
+
+	def start(self):
+		if self.started_at is None:
+			self.started_at = datetime.now(timezone.utc).isoformat()
+			self._append({"type": "run_started", "runId": self.run_id, "scannedAt": self.started_at})
+
+	def is_done(self, device):
+		return device_key(device) in self.completed
+
+	def record_device(self, device, result):
+		key = device_key(device)
+		self.completed[key] = result
+		self._append({"type": "device", "key": key, "result": result})
+
+	def finish(self):
+		if not self.finished:
+			self.finished = True
+			self._append({"type": "run_finished", "finishedAt": datetime.now(timezone.utc).isoformat()})
+
+	def results(self):
+		return list(self.completed.values())
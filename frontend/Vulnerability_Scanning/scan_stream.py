@@ -0,0 +1,114 @@
+#This file streams scan results as newline-delimited JSON: one "device" record
+#as soon as each device finishes, then one "summary" record at the end.
+#assemble_report() rebuilds the usual scan_result.json payload from a stream.
+
+import json
+import sys
+
+SCHEMA_VERSION = "1.0.0"
+SEVERITY_ORDER = {"LOW": 1, "MEDIUM": 2, "HIGH": 3, "CRITICAL": 4}
+
+
+class NdjsonReportWriter:
+	"""Writes one JSON object per line to a file, or to stdout when target is '-'."""
+
+	def __init__(self, target, scan_id, scan_name = "Static Scan", scanned_at = None):
+		self.scan_id = scan_id
+		self.scan_name = scan_name
+		self.scanned_at = scanned_at
+		self.device_count = 0
+		self.finding_count = 0
+		self.risk_level = "LOW"
+		if target == "-":
+			#scanner modules print progress to stdout, so the caller routes those to stderr
+			self._f = sys.__stdout__
+			self._owns_file = False
+		else:
+			self._f = open(target, "w")
+			self._owns_file = True
+
+	def _write(self, record):
+		self._f.write(json.dumps(record, separators = (",", ":")) + "\n")
+		self._f.flush()
+
+	def device(self, device_entry):
+		self.device_count += 1
+		self.finding_count += device_entry.get("findingCount", 0)
+		if SEVERITY_ORDER.get(device_entry.get("riskLevel"), 0) > SEVERITY_ORDER[self.risk_level]:
+			self.risk_level = device_entry["riskLevel"]
+		self._write({"type": "device", "scanId": self.scan_id, "device": device_entry})
+
+	def summary(self, status = "COMPLETE"):
+		self._write({
+			"type": "summary",
+			"schemaVersion": SCHEMA_VERSION,
+			"scanId": self.scan_id,
+			"scanName": self.scan_name,
+			"scannedAt": self.scanned_at,
+			"status": status,
+			"deviceCount": self.device_count,
+			"findingCount": self.finding_count,
+			"riskLevel": self.risk_level,
+		})
+
+	def close(self):
+		if self._owns_file:
+			self._f.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+def read_ndjson(source):
+	"""Yield records from a path or an iterable of lines; partial trailing lines are skipped."""
+	lines = open(source, "r") if isinstance(source, str) else source
+	try:
+		for line in lines:
+			line = line.strip()
+			if not line:
+				continue
+			try:
+				yield json.loads(line)
+			except ValueError:
+				continue
+	finally:
+		if isinstance(source, str):
+			lines.close()
+
+
+def assemble_report(records):
+	"""
+	Rebuild the scan_result.json shape ({"schemaVersion", "scanDetailsResponse"})
+	from device/summary records. Without a summary the scan is reported as RUNNING,
+	so a consumer can render a partial stream.
+	"""
+	devices = []
+	summary = None
+	scan_id = None
+	for record in records:
+		kind = record.get("type")
+		if kind == "device":
+			devices.append(record["device"])
+			scan_id = scan_id or record.get("scanId")
+		elif kind == "summary":
+			summary = record
+
+	summary = summary or {}
+	return {
+		"schemaVersion": summary.get("schemaVersion", SCHEMA_VERSION),
+		"scanDetailsResponse": {
+			"scanId": summary.get("scanId", scan_id),
+			"scanName": summary.get("scanName", "Static Scan"),
+			"scannedAt": summary.get("scannedAt"),
+			"status": summary.get("status", "RUNNING"),
+			"devices": devices,
+		}
+	}
+
+
+if __name__ == "__main__":
+	#usage: python scan_stream.py scan_result.ndjson > scan_result.json
+	print(json.dumps(assemble_report(read_ndjson(sys.argv[1] if len(sys.argv) > 1 else sys.stdin)), indent = 4))
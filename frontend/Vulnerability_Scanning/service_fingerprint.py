@@ -0,0 +1,310 @@
+#This file grabs service banners after the port scan and turns them into
+#(vendor, product, version) tuples so CVE matching can tell versions apart.
+#Results are cached per (MAC, port) with a TTL so repeat scans skip unchanged services.
+
+import json
+import os
+import re
+import socket
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CACHE_FILE = os.path.join(BASE_DIR, "fingerprint_cache.json")
+
+# CONFIG
+FINGERPRINT_TIMEOUT = 3 # seconds per banner grab
+FINGERPRINT_WORKERS = 16 # concurrent banner grabs per device
+CACHE_TTL = 24 * 60 * 60 # seconds before a cached fingerprint is re-probed
+MAX_BANNER = 8192
+
+HTTP_SERVICES = ("http", "http-alt", "http-proxy")
+HTTPS_SERVICES = ("https", "https-alt")
+
+#known banner patterns -> (vendor, product); version is group 1 when present.
+#Names are anchored on word boundaries so "Boa" does not match inside "Dashboard".
+KNOWN_PRODUCTS = [
+	(re.compile(r"\bOpenSSH[_-]([\w.]+)", re.I), "openbsd", "openssh"),
+	(re.compile(r"\bdropbear(?:[_-]([\w.]+)|\b)", re.I), "dropbear_ssh_project", "dropbear_ssh"),
+	(re.compile(r"\bApache\b(?:/([\d.]+))?", re.I), "apache", "http_server"),
+	(re.compile(r"\bnginx\b(?:/([\d.]+))?", re.I), "nginx", "nginx"),
+	(re.compile(r"\blighttpd\b(?:/([\d.]+))?", re.I), "lighttpd", "lighttpd"),
+	(re.compile(r"\bBoa\b(?:/([\d.]+\w*))?", re.I), "boa", "boa"),
+	(re.compile(r"\bmini_httpd\b(?:/([\d.]+))?", re.I), "acme", "mini_httpd"),
+	(re.compile(r"\bmicro_httpd\b", re.I), "acme", "micro_httpd"),
+	(re.compile(r"\bGoAhead-(?:Webs|http)\b(?:/([\d.]+))?", re.I), "embedthis", "goahead"),
+	(re.compile(r"\bMiniUPnPd\b(?:/([\d.]+))?", re.I), "miniupnp_project", "miniupnpd"),
+	(re.compile(r"\bMicrosoft-IIS\b(?:/([\d.]+))?", re.I), "microsoft", "internet_information_services"),
+	(re.compile(r"\bvsFTPd\s+([\d.]+)", re.I), "vsftpd_project", "vsftpd"),
+	(re.compile(r"\bProFTPD\s+([\d.]+\w*)", re.I), "proftpd", "proftpd"),
+	(re.compile(r"\bPure-FTPd\b", re.I), "pureftpd", "pure-ftpd"),
+	(re.compile(r"\bFileZilla Server\b\s*([\d.]+)?", re.I), "filezilla-project", "filezilla_server"),
+	(re.compile(r"\bBusyBox\s+v([\d.]+)", re.I), "busybox", "busybox"),
+	(re.compile(r"\bHikvision-Webs\b", re.I), "hikvision", "webs"),
+	(re.compile(r"\bDahua Rtsp Server\b", re.I), "dahua", "rtsp_server"),
+	(re.compile(r"\bGStreamer RTSP server\b", re.I), "gstreamer_project", "gstreamer"),
+	(re.compile(r"\bH264DVR\b\s*([\d.]+)?", re.I), "xiongmai", "h264dvr"),
+	(re.compile(r"\blive555\b(?:\s+Streaming Media)?\s*v?([\d.]+)?", re.I), "live555", "streaming_media"),
+]
+
+#fallback for "Product/1.2.3" style strings we have no explicit pattern for. Only applied to
+#software fields (SSH ident, Server: header): status lines and greetings are free text
+GENERIC_PRODUCT = re.compile(r"\b([A-Za-z][\w.-]*)[/ ]v?(\d[\w.-]*)")
+SSH_IDENT = re.compile(r"SSH-[\d.]+-(\S+)")
+HTTP_SERVER = re.compile(r"^Server:\s*(.+?)\s*$", re.I | re.M)
+HTTP_TITLE = re.compile(r"<title[^>]*>(.*?)</title>", re.I | re.S)
+TELNET_IAC = re.compile(rb"\xff[\xfb-\xfe].|\xff\xfa.*?\xff\xf0|\xff[\xf0-\xfa]", re.S)
+
+
+def normalize_banner(text, generic = False):
+	"""
+	Map a banner string to a (vendor, product, version) tuple; unknown parts are None.
+	generic also tries GENERIC_PRODUCT, whose vendor is unknown.
+	"""
+	if not text:
+		return (None, None, None)
+
+	for pattern, vendor, product in KNOWN_PRODUCTS:
+		match = pattern.search(text)
+		if match:
+			version = match.group(1) if match.groups() else None
+			return (vendor, product, version)
+
+	match = GENERIC_PRODUCT.search(text) if generic else None
+	if match:
+		return (None, match.group(1).lower(), match.group(2))
+	return (None, None, None)
+
+
+def to_cpe(vendor, product, version):
+	"""Build a CPE 2.3 style application string, '*' for an unknown version; None without a vendor."""
+	if not vendor or not product:
+		return None
+	return "cpe:2.3:a:{}:{}:{}".format(vendor, product, version or "*")
+
+
+def _recv_some(sock, limit = MAX_BANNER):
+	chunks = []
+	total = 0
+	while total < limit:
+		try:
+			data = sock.recv(limit - total)
+		except socket.timeout:
+			break
+		if not data:
+			break
+		chunks.append(data)
+		total += len(data)
+	return b"".join(chunks)
+
+
+def _connect(ip, port, timeout, use_tls = False):
+	sock = socket.create_connection((ip, port), timeout = timeout)
+	if use_tls:
+		ctx = ssl.create_default_context()
+		ctx.check_hostname = False
+		ctx.verify_mode = ssl.CERT_NONE
+		sock = ctx.wrap_socket(sock, server_hostname = ip)
+	return sock
+
+
+def grab_ssh(ip, port, timeout = FINGERPRINT_TIMEOUT):
+	with _connect(ip, port, timeout) as sock:
+		line = sock.recv(256).decode(errors = "ignore").strip()
+	match = SSH_IDENT.search(line)
+	return line, (match.group(1) if match else "")
+
+
+def grab_http(ip, port, timeout = FINGERPRINT_TIMEOUT, use_tls = False):
+	request = (
+		"GET / HTTP/1.0\r\n"
+		f"Host: {ip}\r\n"
+		"User-Agent: Vigil-IoT\r\n\r\n"
+	)
+	with _connect(ip, port, timeout, use_tls) as sock:
+		sock.sendall(request.encode())
+		raw = _recv_some(sock).decode(errors = "ignore")
+
+	server = HTTP_SERVER.search(raw)
+	title = HTTP_TITLE.search(raw)
+	banner = server.group(1) if server else ""
+	#the title is reported but never matched: page text makes false CPEs
+	extra = {"title": " ".join(title.group(1).split())[:120] if title else None}
+	return banner, banner, extra
+
+
+def grab_greeting(ip, port, timeout = FINGERPRINT_TIMEOUT):
+	"""FTP and Telnet both announce themselves on connect; telnet option bytes are stripped."""
+	with _connect(ip, port, timeout) as sock:
+		raw = _recv_some(sock, 1024)
+	text = TELNET_IAC.sub(b"", raw).decode(errors = "ignore").strip()
+	return text, text
+
+
+def grab_rtsp(ip, port, timeout = FINGERPRINT_TIMEOUT):
+	request = (
+		f"OPTIONS rtsp://{ip}:{port}/ RTSP/1.0\r\n"
+		"CSeq: 1\r\n"
+		"User-Agent: Vigil-IoT\r\n\r\n"
+	)
+	with _connect(ip, port, timeout) as sock:
+		sock.sendall(request.encode())
+		raw = sock.recv(2048).decode(errors = "ignore")
+	server = HTTP_SERVER.search(raw)
+	banner = server.group(1) if server else ""
+	return banner, banner
+
+
+def fingerprint_service(ip, port, service, timeout = FINGERPRINT_TIMEOUT):
+	"""Probe one open port and return its fingerprint dict (never raises)."""
+	service = (service or "").lower()
+	extra = {}
+	generic = True #greetings are free text; the other probes return a software field
+	try:
+		if service == "ssh" or port == 22:
+			banner, text = grab_ssh(ip, port, timeout)
+		elif service in HTTPS_SERVICES or port in (443, 8443):
+			banner, text, extra = grab_http(ip, port, timeout, use_tls = True)
+		elif service in HTTP_SERVICES or port in (80, 8000, 8080):
+			banner, text, extra = grab_http(ip, port, timeout)
+		elif service in ("ftp", "telnet") or port in (21, 23):
+			banner, text = grab_greeting(ip, port, timeout)
+			generic = False
+		elif service == "rtsp" or port == 554:
+			banner, text = grab_rtsp(ip, port, timeout)
+		else:
+			return None
+	except (OSError, ssl.SSLError) as e:
+		return {"port": port, "service": service, "error": str(e)}
+
+	vendor, product, version = normalize_banner(text, generic)
+	result = {
+		"port": port,
+		"service": service,
+		"banner": banner[:256],
+		"vendor": vendor,
+		"product": product,
+		"version": version,
+		"cpe": to_cpe(vendor, product, version),
+	}
+	result.update(extra)
+	return result
+
+
+class FingerprintCache:
+	"""JSON-backed fingerprint cache keyed on (MAC, port) with a TTL per entry."""
+
+	def __init__(self, path = CACHE_FILE, ttl = CACHE_TTL):
+		self.path = path
+		self.ttl = ttl
+		self.entries = {}
+		self.dirty = False
+		self._load()
+
+	def _load(self):
+		if not self.path or not os.path.exists(self.path):
+			return
+		try:
+			with open(self.path, "r") as f:
+				self.entries = json.load(f)
+		except (OSError, ValueError) as e:
+			print(f"[WARN] Ignoring unreadable fingerprint cache: {e}")
+			self.entries = {}
+
+	@staticmethod
+	def _key(mac, port):
+		return f"{mac.lower()}|{port}"
+
+	def get(self, mac, port, service, now = None):
+		if not mac:
+			return None
+		entry = self.entries.get(self._key(mac, port))
+		if not entry:
+			return None
+		now = time.time() if now is None else now
+		#a changed nmap service name means the port was re-purposed, so re-probe it
+		if now - entry.get("cached_at", 0) > self.ttl or entry["result"].get("service") != (service or "").lower():
+			return None
+		return entry["result"]
+
+	def put(self, mac, port, result, now = None):
+		if not mac or result is None or "error" in result:
+			return
+		self.entries[self._key(mac, port)] = {
+			"cached_at": time.time() if now is None else now,
+			"result": result,
+		}
+		self.dirty = True
+
+	def save(self):
+		if not self.dirty or not self.path:
+			return
+		now = time.time()
+		self.entries = {k: v for k, v in self.entries.items() if now - v.get("cached_at", 0) <= self.ttl}
+		tmp_path = self.path + ".tmp"
+		with open(tmp_path, "w") as f:
+			json.dump(self.entries, f)
+		os.replace(tmp_path, self.path)
+		self.dirty = False
+
+
+_default_cache = None
+
+def get_default_cache():
+	global _default_cache
+	if _default_cache is None:
+		_default_cache = FingerprintCache()
+	return _default_cache
+
+
+def fingerprint_services(ip, tcp_results, mac = None, cache = None, timeout = FINGERPRINT_TIMEOUT):
+	"""
+	Fingerprint every open TCP port concurrently. Each entry in tcp_results gets
+	vendor/product/version/cpe keys added in place; the list of fingerprints is returned.
+	"""
+	cache = get_default_cache() if cache is None else cache
+	open_entries = [e for e in tcp_results if isinstance(e, dict) and e.get("state") == "open"]
+
+	fingerprints = {}
+	to_probe = []
+	for entry in open_entries:
+		cached = cache.get(mac, entry["port"], entry.get("service"))
+		if cached is not None:
+			fingerprints[entry["port"]] = dict(cached, cached = True)
+		else:
+			to_probe.append(entry)
+
+	if to_probe:
+		workers = min(FINGERPRINT_WORKERS, len(to_probe))
+		with ThreadPoolExecutor(max_workers = workers) as pool:
+			probed = pool.map(
+				lambda e: fingerprint_service(ip, e["port"], e.get("service"), timeout),
+				to_probe
+			)
+			for entry, result in zip(to_probe, probed):
+				if result is None:
+					continue
+				fingerprints[entry["port"]] = result
+				cache.put(mac, entry["port"], result)
+		try:
+			cache.save()
+		except OSError as e:
+			print(f"[WARN] Could not save fingerprint cache: {e}")
+
+	for entry in open_entries:
+		fp = fingerprints.get(entry["port"])
+		if fp and "error" not in fp:
+			entry["vendor"] = fp.get("vendor")
+			entry["product"] = fp.get("product")
+			entry["version"] = fp.get("version")
+			entry["cpe"] = fp.get("cpe")
+
+	return [fingerprints[p] for p in sorted(fingerprints)]
+
+
+if __name__ == "__main__":
+	from pprint import pprint
+	target = "127.0.0.1"
+	sample = [{"protocol": "tcp", "port": p, "state": "open", "service": s} for p, s in ((22, "ssh"), (80, "http"))]
+	pprint(fingerprint_services(target, sample, cache = FingerprintCache(path = None)))
@@ -0,0 +1,231 @@
+# This file is a single-producer / single-consumer ring buffer in shared memory.
+# The capture process (network_sniffer --ring) writes fixed-size feature
+# records (packet_store.PACKET_DTYPE) straight into a NumPy view of a
+# multiprocessing.shared_memory block. The detector (streaming_pipeline --ring)
+# reads them through the same view, so there is no pickling, no pipe and no
+# file between capture and scoring.
+#
+# Layout: three 64-byte header lines, then `capacity` records.
+#   line 0  magic, capacity, record size       (fixed at creation)
+#   line 1  write index, claimed index, closed (written only by the producer)
+#   line 2  read index, records lost           (written only by the consumer)
+# Indices count records since creation and only grow; slot = index % capacity.
+# Each side writes only its own line, so no lock is needed. They sit on
+# separate cache lines so the two cores do not contend for one line.
+#
+# The producer never waits. When the consumer falls more than `capacity` behind,
+# the oldest records are overwritten. Before writing, the producer publishes
+# the index it is about to fill (claimed); after writing, it publishes the
+# write index. The consumer compares the claimed index with its read index. If
+# they are more than the capacity apart, slots it is reading may be mid-write,
+# so it counts those records as lost and skips ahead.
+
+#------------ Imports ----------
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from packet_store import PACKET_DTYPE, ip_to_int
+
+# CONFIG
+RING_CAPACITY = 1 << 16 # records (1.5 MiB of shared memory for feature records)
+ATTACH_TIMEOUT = 10 # seconds a producer waits for the detector to create the ring
+
+_MAGIC = 0x56494749 # "VIGI"
+_LINE = 8 # int64 slots per 64-byte header line
+_HEADER_BYTES = 3 * _LINE * 8
+_CAPACITY, _RECORD = 1, 2
+_WRITE, _CLAIM, _CLOSED = _LINE, _LINE + 1, _LINE + 2
+_READ, _LOST = 2 * _LINE, 2 * _LINE + 1
+
+
+class RingError(Exception):
+    pass
+
+
+class SharedRing:
+    """
+    SharedRing.create(name) on the consumer side, SharedRing.attach(name) on the
+    producer side. Producer: push() / push_many() / close_producer().
+    Consumer: peek() + advance() for zero-copy views, or pop() for a copy.
+    """
+
+    def __init__(self, shm, owner, dtype = PACKET_DTYPE):
+        self._shm = shm
+        self.owner = owner
+        self.dtype = np.dtype(dtype)
+        self._header = np.ndarray((3 * _LINE,), dtype = np.int64, buffer = shm.buf)
+        if self._header[0] != _MAGIC or self._header[_RECORD] != self.dtype.itemsize:
+            raise RingError(f"shared memory {shm.name!r} is not a ring of {self.dtype}")
+        self.capacity = int(self._header[_CAPACITY])
+        self.records = np.ndarray((self.capacity,), dtype = self.dtype, buffer = shm.buf, offset = _HEADER_BYTES)
+        self._ip_cache = {}
+        self.pushed = 0
+
+    @classmethod
+    def create(cls, name, capacity = RING_CAPACITY, dtype = PACKET_DTYPE):
+        dtype = np.dtype(dtype)
+        try:
+            shm = shared_memory.SharedMemory(name = name, create = True,
+                                             size = _HEADER_BYTES + capacity * dtype.itemsize)
+        except FileExistsError:
+            # left behind by a consumer that was killed; nobody else owns it
+            shared_memory.SharedMemory(name = name).unlink()
+            shm = shared_memory.SharedMemory(name = name, create = True,
+                                             size = _HEADER_BYTES + capacity * dtype.itemsize)
+        header = np.ndarray((3 * _LINE,), dtype = np.int64, buffer = shm.buf)
+        header[:] = 0
+        header[_CAPACITY] = capacity
+        header[_RECORD] = dtype.itemsize
+        header[0] = _MAGIC # last, so an attaching producer never sees a half-initialised header
+        return cls(shm, owner = True, dtype = dtype)
+
+    @classmethod
+    def attach(cls, name, dtype = PACKET_DTYPE, timeout = ATTACH_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                shm = shared_memory.SharedMemory(name = name)
+                ring = cls(shm, owner = False, dtype = dtype)
+                break
+            except (FileNotFoundError, RingError):
+                if time.monotonic() >= deadline:
+                    raise RingError(f"no ring {name!r} to attach to (start the detector first)")
+                time.sleep(0.1)
+        # the producer must not unlink the block when it exits; only the creator owns it.
+        # A multiprocessing child shares its parent's tracker and registration, so leave that alone
+        if mp.parent_process() is None:
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, "shared_memory")
+            except Exception:
+                pass
+        return ring
+
+    # --------- producer ----------
+    def push(self, ts, src_ip, dst_ip, packet_size, packet_frequency):
+        header = self._header
+        index = int(header[_WRITE])
+        header[_CLAIM] = index + 1
+        self.records[index % self.capacity] = (ts, self._ip(src_ip), self._ip(dst_ip), packet_size, packet_frequency)
+        # publish after the record is written; the consumer reads nothing past this index
+        header[_WRITE] = index + 1
+        self.pushed += 1
+
+    def push_many(self, rows):
+        """Write a block of records (structured array) with one index update."""
+        header = self._header
+        index = int(header[_WRITE])
+        n = len(rows)
+        if n > self.capacity:
+            rows = rows[-self.capacity:]
+            index += n - self.capacity
+            n = self.capacity
+        slot = index % self.capacity
+        first = min(n, self.capacity - slot)
+        header[_CLAIM] = index + n
+        self.records[slot:slot + first] = rows[:first]
+        self.records[:n - first] = rows[first:]
+        header[_WRITE] = index + n
+        self.pushed += n
+
+    def write(self, features):
+        """Feature tuple (ts, src, dst, size, frequency), as extract_features returns it."""
+        self.push(*features)
+
+    def write_rows(self, rows):
+        for features in rows:
+            self.push(*features)
+
+    def close_producer(self):
+        self._header[_CLOSED] = 1
+
+    def _ip(self, ip):
+        value = self._ip_cache.get(ip)
+        if value is None:
+            if len(self._ip_cache) > 65536:
+                self._ip_cache.clear()
+            value = self._ip_cache[ip] = ip_to_int(ip)
+        return value
+
+    # --------- consumer ----------
+    @property
+    def producer_closed(self):
+        return bool(self._header[_CLOSED])
+
+    def pending(self):
+        return int(self._header[_WRITE] - self._header[_READ])
+
+    def _skip_overrun(self):
+        header = self._header
+        read = int(header[_READ])
+        claim = int(header[_CLAIM])
+        if claim - read > self.capacity:
+            header[_LOST] += claim - read - self.capacity
+            header[_READ] = read = claim - self.capacity
+        return read
+
+    def peek(self, max_records):
+        """
+        Up to max_records unread records as zero-copy views (two when the block wraps).
+        The producer can overwrite them if it laps the reader before advance(); pop()
+        checks for that after copying.
+        """
+        read = self._skip_overrun()
+        n = min(max_records, int(self._header[_WRITE]) - read)
+        if n <= 0:
+            return []
+        slot = read % self.capacity
+        first = min(n, self.capacity - slot)
+        views = [self.records[slot:slot + first]]
+        if first < n:
+            views.append(self.records[:n - first])
+        return views
+
+    def advance(self, n):
+        self._header[_READ] += n
+
+    def pop(self, max_records):
+        """Copy out up to max_records unread records; records overwritten while copying are dropped."""
+        views = self.peek(max_records)
+        if not views:
+            return np.empty(0, dtype = self.dtype)
+        block = views[0].copy() if len(views) == 1 else np.concatenate(views)
+        n = len(block)
+        # the producer may have lapped us during the copy: the oldest slots then hold newer data
+        claim = int(self._header[_CLAIM])
+        read = int(self._header[_READ])
+        overwritten = max(0, claim - self.capacity - read)
+        if overwritten:
+            self._header[_LOST] += min(overwritten, n)
+            block = block[min(overwritten, n):]
+        self.advance(n)
+        return block
+
+    # --------- lifecycle ----------
+    def stats(self):
+        header = self._header
+        return {
+            "ring_capacity": self.capacity,
+            "ring_written": int(header[_WRITE]),
+            "ring_read": int(header[_READ]),
+            "ring_pending": int(header[_WRITE] - header[_READ]),
+            "ring_lost": int(header[_LOST]),
+        }
+
+    def close(self):
+        stats = self.stats()
+        if not self.owner:
+            self.close_producer()
+        # drop our numpy views before releasing the mapping
+        self._header = None
+        self.records = None
+        self._shm.close()
+        if self.owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+        return stats
@@ -0,0 +1,442 @@
+# This file runs the anomaly pipeline continuously, in one process:
+# capture -> feature extraction -> detector, connected by bounded in-memory
+# queues. The detector scores micro-batches (every BATCH_PACKETS packets or
+# BATCH_MS milliseconds, whichever comes first), so an anomaly is reported
+# well under a second after its packet arrives and no CSV sits in the hot path.
+#
+# With --ring NAME the capture runs in another process (network_sniffer.py
+# --ring NAME) and feature records arrive through a shared-memory ring buffer
+# (shm_ring.py), so capture and scoring use separate cores.
+#
+# With --pcap FILE saved captures are replayed through the same stages
+# (pcap_replay.py). Replay waits for queue space instead of dropping, runs until
+# the last packet has been scored and reports end-to-end packets per second.
+#
+# Usage: python streaming_pipeline.py --duration 120
+
+#------------ Imports ----------
+import argparse
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import network_sniffer
+import anomaly_detection_alg as alg
+from raw_capture import BACKENDS, open_capture
+from pcap_replay import open_replay
+from capture_filter import DEFAULT_PROFILE, FILTER_PROFILES, build_expression
+from fanout_capture import FanoutCapture
+from flow_aggregator import FLOW_HEADER, FlowAggregator
+from model_registry import MIN_DEVICE_ROWS
+from packet_store import decode_ips
+from shm_ring import SharedRing
+
+# CONFIG
+RAW_QUEUE_SIZE = 20000 # packets waiting for feature extraction
+FEATURE_QUEUE_SIZE = 20000 # feature rows waiting for the detector
+BATCH_PACKETS = 256 # score as soon as this many rows are pending...
+BATCH_MS = 200 # ...or this many milliseconds after the first pending row
+WARMUP_ROWS = alg.TRAIN_WINDOW # rows collected before the first model is fit, if none is saved
+WARMUP_MAX_ROWS = 20000 # ...or more, until one device has MIN_DEVICE_ROWS of its own, up to this
+RING_POLL_MS = 2 # detector sleep while the shared ring is empty
+
+COLUMNS = ['ts', 'src_ip', 'dst_ip', 'packet_size', 'packet_frequency']
+
+_STOP = object() # end-of-stream marker passed down the queues
+
+
+def print_alerts(alerts):
+    """Default alert sink: one JSON line per anomaly on stdout, plus the usual anomalies.csv row."""
+    rows = alerts.to_dict('records')
+    alg.log_anomalies(rows, alerts['score'].tolist())
+    for row in rows:
+        print(json.dumps({
+            "timestamp": row['timestamp'],
+            "src_ip": row['src_ip'],
+            "dst_ip": row['dst_ip'],
+            "packet_size": int(row['packet_size']),
+            "packet_frequency": float(row['packet_frequency']),
+            "score": float(row['score']),
+            "latency_ms": round(row['latency_ms'], 1) if pd.notna(row['latency_ms']) else None,
+        }), flush = True)
+
+
+class StreamingPipeline:
+    """
+    Three stages on their own threads. Capture never blocks: when the raw queue is
+    full the packet is dropped and counted, so a slow detector sheds load instead of
+    stalling the sniffer. Other capture sources can feed packets in through submit().
+    """
+
+    def __init__(self, interface = None, backend = "scapy", bpf_filter = None, workers = 1, flows = False,
+                 detector = "forest", on_alerts = print_alerts, batch_packets = BATCH_PACKETS, batch_ms = BATCH_MS,
+                 warmup_rows = WARMUP_ROWS, ring = None, replay = None, speed = 0.0):
+        self.interface = interface
+        self.backend = backend
+        self.bpf_filter = bpf_filter
+        self.workers = workers
+        self.on_alerts = on_alerts
+        self.batch_packets = batch_packets
+        self.batch_ms = batch_ms
+        self.warmup_rows = warmup_rows
+        # flow mode: the feature stage aggregates packets and the detector scores flow rows
+        self.flows = flows
+        self.aggregator = FlowAggregator() if flows else None
+        # shared-memory ring written by a separate capture process (packet mode only)
+        if ring and flows:
+            raise ValueError("the shared ring carries packet feature records; flow mode captures in-process")
+        if ring and replay:
+            raise ValueError("replay the files in the capture process (network_sniffer.py --pcap) when using a ring")
+        self.ring_name = ring
+        self._ring = None
+        self._ring_stop = threading.Event()
+        # saved pcap/pcapng files replayed instead of a live capture
+        self.replay = replay
+        self.speed = speed
+
+        self.raw_queue = queue.Queue(maxsize = RAW_QUEUE_SIZE)
+        self.feature_queue = queue.Queue(maxsize = FEATURE_QUEUE_SIZE)
+        # forest: saved per-device baselines, not ready until the warmup fit if none were trained yet
+        self.detector = alg.get_detector(detector, flows)
+        self._warmup = []
+        self._sniffer = None
+        self._scapy_args = {}
+        self._capture = None
+        self._capture_thread = None
+        self._threads = []
+        self._started = None
+        self.stats = {
+            "captured": 0,
+            "dropped": 0,
+            "features": 0,
+            "scored": 0,
+            "batches": 0,
+            "anomalies": 0,
+            "max_latency_ms": 0.0,
+        }
+
+    # --------- capture ----------
+    def submit(self, ts, src_ip, dst_ip, packet_size, protocol = 0, src_port = 0, dst_port = 0):
+        """Hand one packet to the pipeline; returns False if it had to be dropped."""
+        try:
+            self.raw_queue.put_nowait((ts, src_ip, dst_ip, packet_size, protocol, src_port, dst_port))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["captured"] += 1
+        return True
+
+    def _on_packet(self, packet):
+        if packet.haslayer(network_sniffer.IP):
+            ip_layer = packet[network_sniffer.IP]
+            transport = ip_layer.payload
+            self.submit(float(packet.time), ip_layer.src, ip_layer.dst, len(packet), ip_layer.proto,
+                        getattr(transport, "sport", 0), getattr(transport, "dport", 0))
+
+    def _raw_capture_stage(self):
+        submit = self.submit
+        for packet in self._capture.packets():
+            submit(*packet)
+
+    def _replay_stage(self):
+        # a file can wait for the detector: block on a full queue rather than drop
+        put = self.raw_queue.put
+        stats = self.stats
+        for packet in self._capture.packets():
+            put(packet)
+            stats["captured"] += 1
+
+    def _fanout_stage(self):
+        # workers already extracted features, so their rows skip the feature stage
+        for batch in self._capture.batches():
+            self.stats["captured"] += len(batch)
+            for features in batch:
+                try:
+                    self.feature_queue.put_nowait(features)
+                except queue.Full:
+                    self.stats["dropped"] += 1
+                    continue
+                self.stats["features"] += 1
+
+    def _start_capture(self):
+        if self.replay:
+            print(f"Replaying {len(self.replay)} capture file(s) (speed: {self.speed or 'max'})...")
+            self._capture = open_replay(self.replay, self.bpf_filter, self.speed)
+            thread = threading.Thread(target = self._replay_stage, daemon = True)
+            thread.start()
+            self._capture_thread = thread
+            return
+        print(f"Starting packet capture ({self.backend} x{self.workers})...")
+        if self.backend == "scapy":
+            from scapy.all import AsyncSniffer
+            self._scapy_args = network_sniffer.scapy_capture_args(self.interface, self.bpf_filter)
+            self._sniffer = AsyncSniffer(prn = self._on_packet, store = False, **self._scapy_args)
+            self._sniffer.start()
+            return
+        if self.workers > 1:
+            self._capture = FanoutCapture(self.workers, self.backend, self.interface, self.bpf_filter,
+                                          flows = self.flows).start()
+            target = self._fanout_stage
+        else:
+            self._capture = open_capture(self.backend, self.interface, self.bpf_filter)
+            target = self._raw_capture_stage
+        thread = threading.Thread(target = target, daemon = True)
+        thread.start()
+        self._capture_thread = thread
+
+    # --------- features ----------
+    def _put_rows(self, rows):
+        for row in rows:
+            self.stats["features"] += 1
+            self.feature_queue.put(row)
+
+    def _feature_stage(self):
+        aggregator = self.aggregator
+        while True:
+            try:
+                # flow windows must close on a quiet link too, so wake up periodically and
+                # let the watermark move on with the wall clock while nothing arrives
+                item = self.raw_queue.get(timeout = 1 if aggregator else None)
+            except queue.Empty:
+                self._put_rows(aggregator.flush_due(time.time()))
+                continue
+            if item is _STOP:
+                if aggregator:
+                    self._put_rows(aggregator.flush())
+                self.feature_queue.put(_STOP)
+                return
+            if aggregator:
+                self._put_rows(aggregator.add(*item))
+                continue
+            features = network_sniffer.extract_features(item[1], item[2], item[3], item[0])
+            if features is not None:
+                self._put_rows((features,))
+
+    # --------- detector ----------
+    def _next_batch(self):
+        """Block for the first row, then gather until the batch is full or BATCH_MS has passed."""
+        first = self.feature_queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.batch_ms / 1000
+        while len(batch) < self.batch_packets:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.feature_queue.get(timeout = remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _score(self, batch):
+        self._score_frame(pd.DataFrame(batch, columns = FLOW_HEADER if self.flows else COLUMNS))
+
+    def _score_frame(self, data):
+        detector = self.detector
+        if not detector.ready:
+            self._warmup.append(data)
+            warmup = pd.concat(self._warmup)
+            self._warmup = [warmup]
+            if len(warmup) < self.warmup_rows:
+                return
+            # devices with fewer than MIN_DEVICE_ROWS rows only get the fallback model, so keep
+            # collecting until the busiest device has a baseline of its own (or the cap is hit)
+            if len(warmup) < WARMUP_MAX_ROWS and warmup['src_ip'].value_counts().max() < MIN_DEVICE_ROWS:
+                return
+            detector.fit(warmup.iloc[-WARMUP_MAX_ROWS:])
+            self._warmup = []
+            print("Scoring live traffic...")
+            return
+
+        if self.flows:
+            # a flow row is known once its window closes; alerts carry the packet columns
+            window = self.aggregator.window
+            data = alg.flows_as_packets(data, window).assign(ts = data['window_start'] + window)
+        else:
+            data = alg.filter_packets(data)
+        scores = detector.score(data)
+        self.stats["scored"] += len(data)
+        self.stats["batches"] += 1
+        # forest refits run in another process and swap in between batches
+        detector.observe(data, scores)
+
+        flagged = scores < detector.threshold
+        anomalies = data[flagged].assign(score = scores[flagged])
+        # cooldowns run on the packets' own timestamps, so a replay alerts like the live traffic did
+        alerts = alg.apply_cooldown(anomalies)
+        if alerts.empty:
+            return
+
+        now = time.time()
+        # a full-speed replay keeps the file's timestamps, so there is no latency to measure
+        timed = not self.replay or self.speed
+        alerts = alerts.assign(
+            timestamp = [datetime.fromtimestamp(ts).isoformat() for ts in alerts['ts']],
+            latency_ms = (now - alerts['ts']) * 1000 if timed else np.nan,
+        )
+        self.stats["anomalies"] += len(alerts)
+        if timed:
+            self.stats["max_latency_ms"] = max(self.stats["max_latency_ms"], float(alerts['latency_ms'].max()))
+        self.on_alerts(alerts)
+
+    def _detector_stage(self):
+        done = False
+        while not done:
+            batch, done = self._next_batch()
+            if batch:
+                self._score(batch)
+
+    def _next_ring_block(self):
+        """Like _next_batch, but polling the shared ring; returns a structured array."""
+        ring = self._ring
+        poll = RING_POLL_MS / 1000
+        while True:
+            block = ring.pop(self.batch_packets)
+            if len(block):
+                break
+            if self._ring_stop.is_set() or ring.producer_closed:
+                return block, True
+            time.sleep(poll)
+        parts = [block]
+        have = len(block)
+        deadline = time.monotonic() + self.batch_ms / 1000
+        while have < self.batch_packets and time.monotonic() < deadline:
+            more = ring.pop(self.batch_packets - have)
+            if len(more):
+                parts.append(more)
+                have += len(more)
+            else:
+                time.sleep(poll)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts), False
+
+    def _ring_detector_stage(self):
+        done = False
+        while not done:
+            block, done = self._next_ring_block()
+            if not len(block):
+                continue
+            self.stats["captured"] += len(block)
+            self.stats["features"] += len(block)
+            self._score_frame(pd.DataFrame({
+                'ts': block['ts'],
+                'src_ip': decode_ips(block['src_ip']),
+                'dst_ip': decode_ips(block['dst_ip']),
+                'packet_size': block['packet_size'].astype(np.int64),
+                'packet_frequency': block['packet_frequency'].astype(np.float64),
+            }))
+
+    # --------- lifecycle ----------
+    def start(self, capture = True):
+        self._started = time.perf_counter()
+        if self.ring_name:
+            # the capture process attaches to this ring; features arrive already extracted
+            self._ring = SharedRing.create(self.ring_name)
+            print(f"Reading feature records from shared ring {self.ring_name!r}...")
+            thread = threading.Thread(target = self._ring_detector_stage, daemon = True)
+            thread.start()
+            self._threads.append(thread)
+            return
+        for target in (self._feature_stage, self._detector_stage):
+            thread = threading.Thread(target = target, daemon = True)
+            thread.start()
+            self._threads.append(thread)
+        if capture:
+            self._start_capture()
+
+    def stop(self):
+        """Stop capturing, then let the queued packets drain through the detector."""
+        if self._sniffer is not None:
+            self._sniffer.stop()
+            self._sniffer = None
+            if "opened_socket" in self._scapy_args:
+                self._scapy_args["opened_socket"].close()
+        if self._capture is not None:
+            self._capture.stop()
+            self._capture_thread.join()
+            self.stats.update(self._capture.kernel_stats())
+            self._capture = None
+        if self._ring is not None:
+            # score what the producer already wrote, then release the ring
+            self._ring_stop.set()
+        else:
+            self.raw_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._ring is not None:
+            self.stats.update(self._ring.close())
+            self._ring = None
+        self.detector.close()
+        self.stats["detector"] = self.detector.stats()
+        # end to end: from start() until the last queued packet was scored
+        elapsed = time.perf_counter() - self._started
+        self.stats["elapsed_s"] = round(elapsed, 3)
+        self.stats["packets_per_sec"] = round(self.stats["captured"] / elapsed, 1) if elapsed > 0 else 0.0
+        return self.stats
+
+    def run(self, duration = None):
+        self.start()
+        try:
+            if self.replay:
+                # until the files run out (or the duration, if one was given)
+                self._capture_thread.join(duration)
+            elif duration is None:
+                while True:
+                    time.sleep(1)
+            else:
+                time.sleep(duration)
+        except KeyboardInterrupt:
+            pass
+        return self.stop()
+
+
+def run_streaming(duration = None, interface = None, backend = "scapy", bpf_filter = None, workers = 1,
+                  flows = False, detector = "forest", ring = None, replay = None, speed = 0.0):
+    stats = StreamingPipeline(interface = interface, backend = backend, bpf_filter = bpf_filter,
+                              workers = workers, flows = flows, detector = detector, ring = ring,
+                              replay = replay, speed = speed).run(duration)
+    print(f"Stream stats: {json.dumps(stats)}")
+    return stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Continuous in-memory sniffer -> detector pipeline.")
+    parser.add_argument("--duration", type = int, default = None, help = "Seconds to run (default: until Ctrl+C).")
+    parser.add_argument("--interface", default = None, help = "Capture interface (default: scapy's choice).")
+    parser.add_argument("--backend", choices = ["scapy"] + sorted(BACKENDS), default = "scapy",
+                        help = "Capture backend; raw/mmap read AF_PACKET directly (Linux, root).")
+    parser.add_argument("--filter", choices = sorted(FILTER_PROFILES), default = DEFAULT_PROFILE,
+                        help = "Kernel capture filter profile.")
+    parser.add_argument("--bpf", default = None, help = "Extra tcpdump-style filter ANDed with the profile.")
+    parser.add_argument("--workers", type = int, default = 1,
+                        help = "Capture processes in a PACKET_FANOUT group (raw/mmap backends only).")
+    parser.add_argument("--flows", action = "store_true",
+                        help = "Score one feature row per flow per window instead of per packet.")
+    parser.add_argument("--detector", choices = alg.DETECTORS, default = "forest",
+                        help = "forest: per-device Isolation Forests. ewma: O(1) streaming z-scores for small hardware.")
+    parser.add_argument("--ring", default = None, metavar = "NAME",
+                        help = "Score feature records from network_sniffer.py --ring NAME instead of capturing here.")
+    parser.add_argument("--pcap", nargs = "+", default = None, metavar = "FILE",
+                        help = "Replay saved pcap/pcapng files instead of capturing live; stops after the last packet.")
+    parser.add_argument("--speed", type = float, default = 0.0,
+                        help = "With --pcap: 0 replays as fast as the detector keeps up, 1.0 at the original timing.")
+    args = parser.parse_args()
+    if args.backend == "scapy" and args.workers > 1:
+        parser.error("--workers needs --backend raw or mmap (scapy captures in one process)")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_streaming(args.duration, args.interface, args.backend, build_expression(args.filter, args.bpf),
+                  max(1, args.workers), args.flows, args.detector, args.ring, args.pcap, args.speed)
@@ -0,0 +1,74 @@
+# Tests for llm_helper's explanation cache and batching, run against a local
+# stand-in backend installed with set_backend(). No model or network is used.
+# Run with: python -m pytest test_llm_helper.py
+
+#------------ Imports ----------
+import pytest
+
+import llm_helper
+from llm_helper import ExplanationCache, explain_many, fallback_analysis
+
+
+class StubBackend:
+    """Records every batch it is asked for and answers with a fixed explanation (or reply)."""
+    name = "stub"
+
+    def __init__(self, reply = None):
+        self.calls = []
+        self.reply = reply
+
+    def explain(self, items):
+        self.calls.append(list(items))
+        if self.reply is not None:
+            return self.reply(items)
+        return [{
+            "severity": "HIGH",
+            "description": f"stub for {item['device']}",
+            "impact": "stub impact",
+            "recommendation": "stub recommendation",
+        } for item in items]
+
+
+@pytest.fixture
+def backend():
+    stub = StubBackend()
+    previous_backend = llm_helper.set_backend(stub)
+    previous_cache = llm_helper._default_cache
+    llm_helper.set_default_cache(ExplanationCache(path = None))
+    yield stub
+    llm_helper.set_backend(previous_backend)
+    llm_helper.set_default_cache(previous_cache)
+
+
+def test_same_band_hits_the_cache(backend):
+    # same device, and the same score / size / frequency bands
+    first = explain_many([(600, 20.0, -0.12, "10.0.0.5"), (700, 25.0, -0.13, "10.0.0.5")])
+    assert len(backend.calls) == 1 and len(backend.calls[0]) == 1
+    assert first[0] == first[1]
+
+    again = explain_many([(650, 30.0, -0.11, "10.0.0.5")])
+    assert len(backend.calls) == 1
+    assert again[0] == first[0]
+
+
+def test_misses_go_to_the_backend_in_one_batch(backend):
+    items = [(600, 20.0, -0.12, "10.0.0.5"), (600, 20.0, -0.12, "10.0.0.6"), (1400, 500.0, -0.25, "10.0.0.5")]
+    results = explain_many(items)
+    assert len(backend.calls) == 1
+    assert [item["device"] for item in backend.calls[0]] == ["10.0.0.5", "10.0.0.6", "10.0.0.5"]
+    assert [r["description"] for r in results] == ["stub for 10.0.0.5", "stub for 10.0.0.6", "stub for 10.0.0.5"]
+
+
+@pytest.mark.parametrize("reply", [
+    lambda items: [{"severity": "HIGH"} for _ in items], # fields missing
+    lambda items: [], # wrong length
+    lambda items: 1 / 0, # backend error
+])
+def test_invalid_reply_falls_back(backend, reply):
+    backend.reply = reply
+    result = explain_many([(1400, 500.0, -0.25, "10.0.0.5")])
+    assert result == [fallback_analysis(1400, 500.0, -0.25)]
+
+    # a fallback answer is not cached, so the next report asks the backend again
+    explain_many([(1400, 500.0, -0.25, "10.0.0.5")])
+    assert len(backend.calls) == 2
@@ -0,0 +1,71 @@
+# Live capture tests for raw_capture: a UDP datagram sent over loopback must come
+# back out of each backend. They open AF_PACKET sockets, so they only run as root
+# on Linux. Run with: python -m pytest test_raw_capture.py
+
+#------------ Imports ----------
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+from raw_capture import open_capture
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux") or os.geteuid() != 0,
+    reason = "AF_PACKET capture needs Linux and root",
+)
+
+PAYLOAD = b"vigil-capture-test" * 4 # keeps the frame above the default profile's size floor
+
+
+def capture_udp(backend, interface, bpf_filter, timeout = 5.0):
+    """Start a capture, send one UDP datagram to loopback, return the matching packet tuple."""
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    port = receiver.getsockname()[1]
+    capture = open_capture(backend, interface, bpf_filter)
+    found = []
+    started = threading.Event()
+
+    def run():
+        packets = capture.packets()
+        started.set()
+        for packet in packets:
+            if packet[6] == port:
+                found.append(packet)
+                break
+
+    thread = threading.Thread(target = run, daemon = True)
+    thread.start()
+    started.wait(timeout)
+    deadline = time.time() + timeout
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        # packets() opens the socket on first iteration, so keep sending until it sees one
+        while not found and time.time() < deadline:
+            sender.sendto(PAYLOAD, ("127.0.0.1", port))
+            thread.join(0.1)
+    finally:
+        capture.stop()
+        thread.join(timeout)
+        sender.close()
+        receiver.close()
+    assert found, f"{backend} capture saw no packet to port {port}"
+    return found[0]
+
+
+@pytest.mark.parametrize("backend", ["raw", "mmap"])
+@pytest.mark.parametrize("bpf_filter", [None, "ip"])
+def test_capture_on_all_interfaces(backend, bpf_filter):
+    ts, src, dst, size, protocol, sport, dport = capture_udp(backend, None, bpf_filter)
+    assert (src, dst, protocol) == ("127.0.0.1", "127.0.0.1", 17)
+    assert size == 14 + 20 + 8 + len(PAYLOAD)
+    assert abs(ts - time.time()) < 10
+
+
+@pytest.mark.parametrize("backend", ["raw", "mmap"])
+def test_capture_on_loopback(backend):
+    assert capture_udp(backend, "lo", "ip")[1] == "127.0.0.1"
@@ -1,6 +1,8 @@
-import socket
-import base64
-import time
+import asyncio
+import re
+
+from frontend.Vulnerability_Scanning.http_auth import probe_http_credentials
+from deviceDiscovery.rate_governor import get_governor
 
 
 DEFAULT_CREDENTIALS = {
@@ -31,31 +33,87 @@ DEFAULT_CREDENTIALS = {
     ]
 }
 
+# CONFIG
+READ_TIMEOUT = 5 # seconds to wait for a reply or prompt
+TOTAL_CONCURRENCY = 64 # open connections across the whole audit
+
+HTTP_SERVICES = ("http", "http-alt", "https", "https-alt")
+
+FTP_REPLY = re.compile(rb"^(\d{3}) ", re.M)
+
+TELNET_LOGIN_PROMPT = re.compile(rb"(login|username|user name)\s*:\s*$", re.I)
+TELNET_PASSWORD_PROMPT = re.compile(rb"password\s*:\s*$", re.I)
+TELNET_SHELL_PROMPT = re.compile(rb"[#$>%]\s*$")
+TELNET_FAILURE = re.compile(rb"incorrect|failed|denied|invalid", re.I)
+
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
 
-class WeakCredentialChecker:
 
-	def _try_connect(self, ip, port, timeout=3):
+class WeakCredentialChecker:
+	"""
+	Asyncio default-credential auditor. One event loop drives every host and
+	service at once; the shared rate governor decides how many checks each device
+	gets concurrently (and the connect timeout) from its measured RTT and loss,
+	and FTP/Telnet sessions are reused across credential attempts.
+	"""
+
+	def __init__(self, total_concurrency = TOTAL_CONCURRENCY, read_timeout = READ_TIMEOUT, governor = None):
+		self.total_concurrency = total_concurrency
+		self.read_timeout = read_timeout
+		self.governor = governor or get_governor()
+		self._reset_limits()
+
+	#semaphores belong to the loop that first waits on them, so every asyncio.run gets a fresh one
+	def _reset_limits(self):
+		self._total_limit = None
+
+	def _total(self):
+		if self._total_limit is None:
+			self._total_limit = asyncio.Semaphore(self.total_concurrency)
+		return self._total_limit
+
+	async def _try_connect(self, ip, port):
+		loop = asyncio.get_running_loop()
+		started = loop.time()
+		try:
+			conn = await asyncio.wait_for(
+				asyncio.open_connection(ip, port),
+				timeout = self.governor.timeout_for(ip)
+			)
+		except ConnectionRefusedError:
+			#a RST is a prompt answer, not loss
+			self.governor.record(ip, loop.time() - started, ok = True)
+			return None, None
+		except (OSError, asyncio.TimeoutError):
+			self.governor.record(ip, ok = False)
+			return None, None
+		self.governor.record(ip, loop.time() - started, ok = True)
+		return conn
+
+	@staticmethod
+	async def _close(writer):
+		if writer is None:
+			return
 		try:
-			s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-			s.settimeout(timeout)
-			s.connect((ip, port))
-			return s
-		except:
-			return None
+			writer.close()
+			await writer.wait_closed()
+		except (OSError, ConnectionError):
+			pass
 
 
-	def check_ssh(self, ip, port):
-		sock = self._try_connect(ip, port)
-		if not sock:
+	async def check_ssh(self, ip, port):
+		reader, writer = await self._try_connect(ip, port)
+		if not reader:
 			return {"service": "ssh", "result": "connection_failed"}
 
 		# Try banner read (some IoT SSH leaks info)
 		try:
-			banner = sock.recv(1024).decode(errors="ignore").strip()
-		except:
+			banner = await asyncio.wait_for(reader.readline(), timeout = self.read_timeout)
+			banner = banner.decode(errors = "ignore").strip()
+		except (OSError, asyncio.TimeoutError):
 			banner = ""
-
-		sock.close()
+		finally:
+			await self._close(writer)
 
 		if banner:
 			return {
@@ -68,129 +126,215 @@ class WeakCredentialChecker:
 			return {"service": "ssh", "result": "no_banner"}
 
 
-	def check_ftp(self, ip, port):
-		#results = []
-
-		for user, pwd in DEFAULT_CREDENTIALS["ftp"]:
-			try:
-				sock = self._try_connect(ip, port)
-				if not sock:
-					continue
-
-				resp = sock.recv(1024).decode(errors="ignore")
-
-				sock.sendall(f"USER {user}\r\n".encode())
-				resp_user = sock.recv(1024).decode(errors="ignore")
+	async def _ftp_reply(self, reader):
+		"""Read one (possibly multi-line) FTP reply and return its status code."""
+		data = b""
+		while True:
+			line = await asyncio.wait_for(reader.readline(), timeout = self.read_timeout)
+			if not line:
+				raise ConnectionError("ftp connection closed")
+			data += line
+			match = FTP_REPLY.match(line)
+			if match:
+				return int(match.group(1)), data
 
-				sock.sendall(f"PASS {pwd}\r\n".encode())
-				resp_pass = sock.recv(2048).decode(errors="ignore")
+	async def check_ftp(self, ip, port):
+		creds = list(DEFAULT_CREDENTIALS["ftp"])
+		reader = writer = None
+		retried = False
 
-				sock.close()
+		try:
+			while creds:
+				#one control connection serves every USER/PASS retry until the server drops it
+				if writer is None:
+					reader, writer = await self._try_connect(ip, port)
+					if not reader:
+						break
+					code, _ = await self._ftp_reply(reader)
+					if code != 220:
+						break
+
+				user, pwd = creds[0]
+				try:
+					writer.write(f"USER {user}\r\n".encode())
+					code, _ = await self._ftp_reply(reader)
+					if code == 331:
+						writer.write(f"PASS {pwd}\r\n".encode())
+						code, _ = await self._ftp_reply(reader)
+				except (OSError, ConnectionError, asyncio.TimeoutError):
+					#server hung up after earlier failures; give this pair one more go on a fresh connection
+					await self._close(writer)
+					reader = writer = None
+					if retried:
+						creds.pop(0)
+					retried = not retried
+					continue
 
-				if "230" in resp_pass:  # login success
+				creds.pop(0)
+				retried = False
+				if code == 230:  # login success
 					return {
 						"service": "ftp",
 						"weak_credential": (user, pwd),
 						"result": "login_success"
 					}
-
-			except Exception as e:
-				continue
+				if code == 421:
+					await self._close(writer)
+					reader = writer = None
+		except (OSError, ConnectionError, asyncio.TimeoutError):
+			pass
+		finally:
+			await self._close(writer)
 
 		return {"service": "ftp", "result": "no_weak_credentials"}
 
 
-	def check_telnet(self, ip, port):
-		for user, pwd in DEFAULT_CREDENTIALS["telnet"]:
+	async def _telnet_read_until(self, reader, writer, patterns):
+		"""
+		Read until one of the compiled patterns matches the tail of the stream,
+		answering option negotiation with refusals. Returns (index, text) or (None, text).
+		"""
+		buf = bytearray()
+		loop = asyncio.get_running_loop()
+		deadline = loop.time() + self.read_timeout
+		while True:
+			remaining = deadline - loop.time()
+			if remaining <= 0:
+				return None, bytes(buf)
 			try:
-				sock = self._try_connect(ip, port)
-				if not sock:
+				chunk = await asyncio.wait_for(reader.read(1024), timeout = remaining)
+			except asyncio.TimeoutError:
+				return None, bytes(buf)
+			if not chunk:
+				return None, bytes(buf)
+
+			i = 0
+			while i < len(chunk):
+				b = chunk[i]
+				if b == IAC and i + 1 < len(chunk):
+					cmd = chunk[i + 1]
+					if cmd in (DO, DONT, WILL, WONT) and i + 2 < len(chunk):
+						if cmd in (DO, WILL):
+							writer.write(bytes([IAC, WONT if cmd == DO else DONT, chunk[i + 2]]))
+						i += 3
+						continue
+					if cmd == SB:
+						end = chunk.find(bytes([IAC, SE]), i)
+						i = len(chunk) if end == -1 else end + 2
+						continue
+					i += 2
 					continue
+				buf.append(b)
+				i += 1
 
-				time.sleep(0.5)
-				sock.recv(1024)
+			tail = bytes(buf[-256:]).rstrip(b"\x00")
+			for index, pattern in enumerate(patterns):
+				if pattern.search(tail):
+					return index, bytes(buf)
 
-				sock.sendall(user.encode() + b"\n")
-				time.sleep(0.5)
-
-				sock.sendall(pwd.encode() + b"\n")
-				time.sleep(1)
-
-				data = sock.recv(2048).decode(errors="ignore")
-				sock.close()
-
-				if ">" in data or "#" in data or "$" in data:
+	async def check_telnet(self, ip, port):
+		reader = writer = None
+		try:
+			for user, pwd in DEFAULT_CREDENTIALS["telnet"]:
+				if writer is None:
+					reader, writer = await self._try_connect(ip, port)
+					if not reader:
+						break
+					hit, _ = await self._telnet_read_until(reader, writer, [TELNET_LOGIN_PROMPT])
+					if hit is None:
+						break
+
+				writer.write(user.encode() + b"\r\n")
+				hit, _ = await self._telnet_read_until(reader, writer, [TELNET_PASSWORD_PROMPT, TELNET_SHELL_PROMPT])
+				if hit == 1:
+					#account has no password at all
 					return {
 						"service": "telnet",
-						"weak_credential": (user, pwd),
+						"weak_credential": (user, ""),
 						"result": "login_success"
-				}
-
-			except:
-				continue
+					}
+				if hit == 0:
+					writer.write(pwd.encode() + b"\r\n")
+					hit, _ = await self._telnet_read_until(
+						reader, writer,
+						[TELNET_LOGIN_PROMPT, TELNET_FAILURE, TELNET_SHELL_PROMPT]
+					)
+					if hit == 2:
+						return {
+							"service": "telnet",
+							"weak_credential": (user, pwd),
+							"result": "login_success"
+						}
+				if hit != 0:
+					#no fresh login prompt on this session, start over on a new one
+					await self._close(writer)
+					reader = writer = None
+		except (OSError, ConnectionError):
+			pass
+		finally:
+			await self._close(writer)
 
 		return {"service": "telnet", "result": "no_weak_credentials"}
 
 
-	def check_http(self, ip, port):
-		for user, pwd in DEFAULT_CREDENTIALS["http"]:
-			try:
-				sock = self._try_connect(ip, port)
-				if not sock:
-					continue
+	async def check_http(self, ip, port, service = "http"):
+		#the prober is blocking socket code (it needs TLS session resumption, which asyncio
+		#streams do not expose), so it runs in a worker thread under this host's limits
+		return await asyncio.to_thread(
+			probe_http_credentials,
+			ip, port, DEFAULT_CREDENTIALS["http"],
+			service = service,
+			timeout = self.read_timeout
+		)
+
 
-				creds = f"{user}:{pwd}".encode()
-				token = base64.b64encode(creds).decode()
+	async def check_async(self, ip, port, service):
+		service = service.lower()
 
-				http_req = (
-					"GET / HTTP/1.1\r\n"
-					f"Host: {ip}\r\n"
-					f"Authorization: Basic {token}\r\n"
-					"Connection: close\r\n\r\n"
-				)
+		if service == "ssh":
+			check = self.check_ssh
+		elif service == "ftp":
+			check = self.check_ftp
+		elif service == "telnet":
+			check = self.check_telnet
+		elif service in HTTP_SERVICES:
+			check = lambda ip, port: self.check_http(ip, port, service)
+		else:
+			return {"service": service, "result": "not_supported"}
 
-				sock.sendall(http_req.encode())
-				resp = sock.recv(4096).decode(errors="ignore")
-				sock.close()
+		async with self.governor.async_slot(ip), self._total():
+			result = await check(ip, port)
+		result.setdefault("port", port)
+		return result
 
-				if "200 OK" in resp:
-					return {
-						"service": "http",
-						"weak_credential": (user, pwd),
-						"result": "login_success"
-					}
+	async def scan_async(self, ip, identified_services):
+		tasks = []
+		for svc in identified_services:
+			port = svc.get("port")
+			service = svc.get("service")
 
-			except:
+			if port is None or service is None:
 				continue
+			tasks.append(self.check_async(ip, port, service))
+		return list(await asyncio.gather(*tasks))
 
-		return {"service": "http", "result": "no_weak_credentials"}
+	async def scan_hosts_async(self, targets):
+		ips = list(targets)
+		results = await asyncio.gather(*(self.scan_async(ip, targets[ip]) for ip in ips))
+		return dict(zip(ips, results))
 
 
 	def check(self, ip, port, service):
-		service = service.lower()
+		self._reset_limits()
+		return asyncio.run(self.check_async(ip, port, service))
 
-		if service == "ssh":
-			return self.check_ssh(ip, port)
-		if service == "ftp":
-			return self.check_ftp(ip, port)
-		if service == "telnet":
-			return self.check_telnet(ip, port)
-		if service in ("http", "http-alt", "https", "https-alt"):
-			return self.check_http(ip, port)
-
-		return {"service": service, "result": "not_supported"}
-        
 	def scan(self, ip, identified_services = None):
 		if identified_services is None:
 			return {"error": "No service list provided"}
-		results = []
-		
-		for svc in identified_services:
-			port = svc.get("port")
-			service = svc.get("service")
-			
-			if port is None or service is None:
-				continue
-			result = self.check(ip, port, service)
-			results.append(result)
-		return results
+		self._reset_limits()
+		return asyncio.run(self.scan_async(ip, identified_services))
+
+	def scan_hosts(self, targets):
+		"""Audit many devices at once. targets maps ip -> service list (same shape scan() takes)."""
+		self._reset_limits()
+		return asyncio.run(self.scan_hosts_async(targets))